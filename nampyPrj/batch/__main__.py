@@ -0,0 +1,7 @@
+import sys
+
+from nampyPrj.batch.batch import cli
+
+
+if __name__ == '__main__':
+    sys.exit(cli())
@@ -0,0 +1,277 @@
+import argparse
+import csv
+import inspect
+import json
+import math
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from functools import lru_cache
+
+import numpy as np
+from sympy import symbols, sympify, lambdify
+
+from nampyPrj.integral.integral import (trapezoidal, midpoint, midpoint_double, midpoint_double2,
+                                        midpoint_triple)
+from nampyPrj.integral.integral_vec import trapezoidal_vec, midpoint_vec
+from nampyPrj.root.root import (root_NewtonRaphson, root_Newton_system, root_secant,
+                                root_bisection, root_brent, RootResult)
+from nampyPrj.ode.ode import ode_FE, ode_system_FE, ode_system_BE, ode_RK4
+from nampyPrj.convergence.tolerance import trapezoidal_tol, midpoint_tol, ToleranceResult
+
+# Routines available to the jobs, with their function arguments and the variables of the
+# expressions given for them. A list of expressions defines a system: its first variable is
+# a vector with components named u0, u1, ...
+METHODS = {
+    'trapezoidal': (trapezoidal, {'f': 'x'}),
+    'midpoint': (midpoint, {'f': 'x'}),
+    'trapezoidal_vec': (trapezoidal_vec, {'f': 'x'}),
+    'midpoint_vec': (midpoint_vec, {'f': 'x'}),
+    'trapezoidal_tol': (trapezoidal_tol, {'f': 'x'}),
+    'midpoint_tol': (midpoint_tol, {'f': 'x'}),
+    'midpoint_double': (midpoint_double, {'f': 'x y'}),
+    'midpoint_double2': (midpoint_double2, {'f': 'x y'}),
+    'midpoint_triple': (midpoint_triple, {'g': 'x y z'}),
+    'root_NewtonRaphson': (root_NewtonRaphson, {'f': 'x', 'dfdx': 'x'}),
+    'root_Newton_system': (root_Newton_system, {'F': 'x'}),
+    'root_secant': (root_secant, {'f': 'x'}),
+    'root_bisection': (root_bisection, {'f': 'x'}),
+    'root_brent': (root_brent, {'f': 'x'}),
+    'ode_FE': (ode_FE, {'f': 'u t'}),
+    'ode_system_FE': (ode_system_FE, {'f': 'u t'}),
+    'ode_system_BE': (ode_system_BE, {'f': 'u t'}),
+    'ode_RK4': (ode_RK4, {'f': 'u t'}),
+}
+
+# Columns of the CSV output
+FIELDS = ['id', 'method', 'status', 'time', 'value', 'estimated_error', 'iterations',
+          'converged', 't', 'points', 'message']
+
+
+@lru_cache(maxsize=256)
+def _function(expression, variables):
+    """ Python function of an expression string (or tuple of strings for a system) of the
+    variables. Compiled once per process """
+    names = variables.split()
+    if isinstance(expression, tuple):
+        components = ['%s%d' % (names[0], i) for i in range(len(expression))]
+        compiled = lambdify(symbols(' '.join(components + names[1:]), seq=True),
+                            [sympify(e) for e in expression], 'numpy')
+
+        def function(u, *args):
+            return compiled(*u, *args)
+        return function
+    expr = sympify(expression)
+    compiled = lambdify(symbols(variables, seq=True), expr, 'numpy')
+    if expr.free_symbols:
+        return compiled
+
+    def constant(*args):
+        # The vectorized routines expect an array of the shape of the points
+        return compiled(*args) + np.zeros(np.shape(args[0]))
+    return constant
+
+
+def _summary(result):
+    """ JSON-serializable summary of the result of a routine """
+    if isinstance(result, RootResult):
+        return {'value': np.asarray(result.root).tolist(), 'iterations': result.iterations,
+                'converged': result.converged}
+    if isinstance(result, ToleranceResult):
+        summary = {'value': np.asarray(result.value).tolist(), 'estimated_error': result.error,
+                   'converged': result.converged}
+        if result.t is not None:
+            summary['value'] = np.asarray(result.value)[-1].tolist()
+            summary['t'] = float(result.t[-1])
+        return summary
+    if isinstance(result, tuple):
+        # ODE solution: final state
+        u, t = result[0], result[-1]
+        return {'value': np.asarray(u)[-1].tolist(), 't': float(t[-1]), 'points': len(t)}
+    return {'value': np.asarray(result).tolist()}
+
+
+def run_job(job):
+    """
+    Run one job and return its record: id, method, status ('ok' or 'error'), wall time of
+    the routine, and the summary of the result or the error message
+
+    :param dict job: Method name, expressions of the function arguments and other arguments
+                     of the routine by name
+    """
+    record = {'id': job.get('id'), 'method': job.get('method'), 'status': 'ok'}
+    try:
+        routine, functions = METHODS[job['method']]
+        kwargs = {}
+        for name, value in job.items():
+            if name in ('id', 'method'):
+                continue
+            # Expressions (a number is a constant) are compiled, other values (e.g.
+            # dfdx='autodiff') are passed as is
+            if name in functions and isinstance(value, (str, list, int, float)) \
+                    and value != 'autodiff':
+                value = _function(tuple(value) if isinstance(value, list) else str(value),
+                                  functions[name])
+            kwargs[name] = value
+        if 'full_output' in inspect.signature(routine).parameters:
+            kwargs.setdefault('full_output', True)
+        start = time.perf_counter()
+        result = routine(**kwargs)
+        record['time'] = time.perf_counter() - start
+        record.update(_summary(result))
+    except Exception as e:
+        record.update({'status': 'error', 'message': '%s: %s' % (type(e).__name__, e)})
+    return record
+
+
+def _run_chunk(jobs):
+    return [run_job(job) for job in jobs]
+
+
+def _cell(text, expression=False):
+    """ Value of a CSV cell: JSON (numbers, lists, booleans) or plain string. An expression
+    stays a string, even if it is a number, unless it is a list (system) """
+    if expression and not text.lstrip().startswith('['):
+        return text
+    try:
+        return json.loads(text)
+    except ValueError:
+        return text
+
+
+def read_jobs(path):
+    """
+    Read the jobs of a JSON or CSV file. A JSON file holds a list of jobs, or an object with
+    the list 'jobs' and the arguments 'defaults' shared by all of them. A CSV file holds one
+    job per row, the columns are the arguments (empty cells are omitted). Jobs without an id
+    are numbered in order
+
+    :param str path: .json or .csv file
+    """
+    with open(path, newline='') as file:
+        if path.lower().endswith('.csv'):
+            jobs = []
+            for row in csv.DictReader(file):
+                functions = METHODS.get(row.get('method'), (None, {}))[1]
+                jobs.append({k: _cell(v, k in functions) for k, v in row.items() if v != ''})
+        else:
+            data = json.load(file)
+            if isinstance(data, dict):
+                defaults = data.get('defaults', {})
+                jobs = [dict(defaults, **job) for job in data['jobs']]
+            else:
+                jobs = data
+    for i, job in enumerate(jobs):
+        job.setdefault('id', i)
+        if job.get('method') not in METHODS:
+            raise ValueError('unknown method %r of job %r' % (job.get('method'), job['id']))
+    return jobs
+
+
+class _Writer:
+    """ Stream of records to a JSON lines or CSV file """
+    def __init__(self, file, csv_format):
+        self.file = file
+        self.csv = csv.DictWriter(file, FIELDS) if csv_format else None
+        if self.csv is not None:
+            self.csv.writeheader()
+
+    def write(self, record):
+        if self.csv is not None:
+            self.csv.writerow({k: json.dumps(v) if isinstance(v, list) else v
+                               for k, v in record.items()})
+        else:
+            self.file.write(json.dumps(record) + '\n')
+
+
+def run_batch(jobs, file=None, csv_format=False, processes=None, chunksize=None, executor=None,
+              verbose=False):
+    """
+    Run the jobs on a process pool. The jobs are sent in chunks, to amortize the cost of the
+    inter-process communication for short jobs, and the records are written to file as
+    soon as their chunk completes (so not in the order of the jobs)
+
+    :param list jobs: Jobs (see run_job and read_jobs)
+    :param file: Text file receiving the records. If None they are not written
+    :param bool csv_format: Write CSV instead of JSON lines
+    :param int processes: Number of worker processes. If None the number of CPUs
+    :param int chunksize: Number of jobs per task. If None about 4 tasks per process
+    :param executor: concurrent.futures executor running the chunks. If None a process pool
+                     is created
+    :param bool verbose: Print each record on stderr
+    :return: Summary: number of jobs and of failures, wall time, throughput [jobs/s], total
+             and per-method time of the jobs
+    """
+    workers = processes or os.cpu_count() or 1
+    chunksize = chunksize or max(1, math.ceil(len(jobs) / (4 * workers)))
+    writer = _Writer(file, csv_format) if file is not None else None
+    methods = {}
+    failed = 0
+    start = time.perf_counter()
+    pool = executor if executor is not None else ProcessPoolExecutor(processes)
+    try:
+        futures = [pool.submit(_run_chunk, jobs[i:i + chunksize])
+                   for i in range(0, len(jobs), chunksize)]
+        for future in as_completed(futures):
+            for record in future.result():
+                if writer is not None:
+                    writer.write(record)
+                if record['status'] == 'ok':
+                    count, total = methods.get(record['method'], (0, 0.0))
+                    methods[record['method']] = count + 1, total + record['time']
+                else:
+                    failed += 1
+                if verbose:
+                    print('%-8s %-20s %-5s %12.6f s  %s' % (
+                        record['id'], record['method'], record['status'], record.get('time', 0),
+                        record.get('message', record.get('value'))), file=sys.stderr)
+            if file is not None:
+                file.flush()
+    finally:
+        if executor is None:
+            pool.shutdown()
+    wall_time = time.perf_counter() - start
+    return {'jobs': len(jobs), 'failed': failed, 'wall_time': wall_time,
+            'throughput': len(jobs) / wall_time if wall_time > 0 else float('inf'),
+            'job_time': sum(total for count, total in methods.values()),
+            'methods': {name: {'jobs': count, 'time': total, 'mean_time': total / count}
+                        for name, (count, total) in sorted(methods.items())}}
+
+
+def main(argv=None):
+    """ Command line entry point of the batch runner """
+    parser = argparse.ArgumentParser(description='Run a batch of nampyPrj jobs')
+    parser.add_argument('jobs', help='JSON or CSV job file')
+    parser.add_argument('-o', '--output',
+                        help='output file, CSV if it ends with .csv, otherwise JSON lines '
+                             '(default: JSON lines on stdout)')
+    parser.add_argument('-p', '--processes', type=int, help='worker processes (default: CPUs)')
+    parser.add_argument('-c', '--chunksize', type=int, help='jobs per task')
+    parser.add_argument('-v', '--verbose', action='store_true',
+                        help='print each record on stderr')
+    parser.add_argument('-q', '--quiet', action='store_true', help='do not print the summary')
+    args = parser.parse_args(argv)
+
+    jobs = read_jobs(args.jobs)
+    if args.output:
+        with open(args.output, 'w', newline='') as file:
+            summary = run_batch(jobs, file, args.output.lower().endswith('.csv'),
+                                args.processes, args.chunksize, verbose=args.verbose)
+    else:
+        summary = run_batch(jobs, sys.stdout, False, args.processes, args.chunksize,
+                            verbose=args.verbose)
+    if not args.quiet:
+        print('%d jobs (%d failed) in %.3f s: %.1f jobs/s, %.3f s in the routines' % (
+            summary['jobs'], summary['failed'], summary['wall_time'], summary['throughput'],
+            summary['job_time']), file=sys.stderr)
+        for name, m in summary['methods'].items():
+            print('%-20s %6d jobs  %12.6f s per job' % (name, m['jobs'], m['mean_time']),
+                  file=sys.stderr)
+    return summary
+
+
+def cli(argv=None):
+    """ Console script of the batch runner: runs main and returns the exit status, 1 if a
+    job failed """
+    return 0 if main(argv)['failed'] == 0 else 1
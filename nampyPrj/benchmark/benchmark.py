@@ -0,0 +1,336 @@
+import argparse
+import json
+import platform
+import sys
+import time
+import tracemalloc
+from math import exp, cos, pi
+
+import numpy as np
+
+from nampyPrj.integral.integral import (trapezoidal, midpoint, midpoint_double, midpoint_double2,
+                                        midpoint_triple, MonteCarlo_double)
+from nampyPrj.integral.integral_vec import trapezoidal_vec, midpoint_vec
+from nampyPrj.root.root import (root_NewtonRaphson, root_Newton_system, root_secant,
+                                root_bisection, root_brent)
+from nampyPrj.root.root_vec import root_polynomial, root_scan
+from nampyPrj.ode.ode import (ode_FE, ode_system_FE, ode_system_BE, ode_EulerCromer, ode_RK2,
+                              ode_Stormer)
+
+SIZES = {
+    'quick': {'1d': [100, 1000], '2d': [10, 20], '3d': [5, 10], 'root': [1, 10],
+              'ode': [100, 1000], 'ensemble': [1000, 10000]},
+    'full': {'1d': [100, 1000, 10000, 100000], '2d': [10, 40, 160], '3d': [5, 10, 20],
+             'root': [1, 10, 100], 'ode': [100, 1000, 10000, 100000],
+             'ensemble': [1000, 10000, 100000]},
+}
+
+# Pairs of (baseline, candidate) implementations compared in the report
+COMPARED_PAIRS = [('trapezoidal', 'trapezoidal_vec'), ('midpoint', 'midpoint_vec'),
+                  ('trapezoidal_vec_float64', 'trapezoidal_vec_float32'),
+                  ('ode_system_FE_float64', 'ode_system_FE_float32'),
+                  ('ode_system_FE_float64', 'ode_system_FE_float32_compensated')]
+
+
+class Counted:
+    """
+    Callable wrapper counting the evaluations of a function and the number of points
+    evaluated (an array argument counts as many points as it has elements)
+
+    :param f: Function
+    """
+    def __init__(self, f):
+        self.f = f
+        self.calls = 0
+        self.points = 0
+
+    def __call__(self, *args):
+        self.calls += 1
+        self.points += int(np.size(args[0])) if args else 1
+        return self.f(*args)
+
+
+def measure(run, repeat=3, memory=False):
+    """
+    Best wall time of run() over repeat runs. The function evaluations are counted on the
+    last run and, if memory is True, the peak of the traced memory is measured on a separate run
+
+    :param run: Function without arguments returning (value, Counted functions)
+    :param int repeat: Number of timed runs
+    :param bool memory: Measure the peak memory
+    """
+    best = float('inf')
+    for i in range(repeat):
+        start = time.perf_counter()
+        value, counters = run()
+        best = min(best, time.perf_counter() - start)
+    record = {'time': best,
+              'calls': sum(c.calls for c in counters),
+              'points': sum(c.points for c in counters)}
+    if memory:
+        tracemalloc.start()
+        run()
+        record['peak_memory'] = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+    return value, record
+
+
+def _integral_cases(sizes):
+    f = lambda t: 3 * t ** 2 * np.exp(t ** 3)
+    f_scalar = lambda t: 3 * t ** 2 * exp(t ** 3)
+    exact = exp(1) - 1
+    cases = []
+    for name, method, g in [('trapezoidal', trapezoidal, f_scalar),
+                            ('midpoint', midpoint, f_scalar),
+                            ('trapezoidal_vec', trapezoidal_vec, f),
+                            ('midpoint_vec', midpoint_vec, f)]:
+        for n in sizes['1d']:
+            def run(method=method, g=g, n=n):
+                c = Counted(g)
+                return method(c, 0, 1, n), [c]
+            cases.append((name, n, run, exact))
+
+    g2 = lambda x, y: 2 * x + y
+    exact2 = 9.0  # integral of 2x + y over [0, 2]x[2, 3]
+    for name, method in [('midpoint_double', midpoint_double),
+                         ('midpoint_double2', midpoint_double2)]:
+        for n in sizes['2d']:
+            def run(method=method, n=n):
+                c = Counted(g2)
+                return method(c, 0, 2, 2, 3, n, n), [c]
+            cases.append((name, n, run, exact2))
+
+    g3 = lambda x, y, z: 2 * x + y - 4 * z
+    exact3 = 15.0  # integral of 2x + y - 4z over [0, 2]x[2, 3]x[-1, 2]
+    for n in sizes['3d']:
+        def run(n=n):
+            c = Counted(g3)
+            return midpoint_triple(c, 0, 2, 2, 3, -1, 2, n, n, n), [c]
+        cases.append(('midpoint_triple', n, run, exact3))
+
+    for n in sizes['2d']:
+        def run(n=n):
+            np.random.seed(0)
+            c = Counted(lambda x, y: 1)
+            g = Counted(lambda x, y: 1 - x ** 2 - y ** 2)
+            return MonteCarlo_double(c, g, -1, 1, -1, 1, n), [c, g]
+        cases.append(('MonteCarlo_double', n, run, pi))
+    return cases
+
+
+def _root_cases(sizes):
+    f = lambda x: x ** 2 - 9
+    dfdx = lambda x: 2 * x
+    cases = []
+    for m in sizes['root']:
+        # m is the number of independent problems solved in the case
+        def run(m=m):
+            c, d = Counted(f), Counted(dfdx)
+            for i in range(m):
+                x = root_NewtonRaphson(c, 1000 + i, d, 1E-10, 100)[0]
+            return x, [c, d]
+        cases.append(('root_NewtonRaphson', m, run, 3.0))
+
+        def run(m=m):
+            c = Counted(f)
+            for i in range(m):
+                x = root_NewtonRaphson(c, 1000 + i, 'autodiff', 1E-10, 100)[0]
+            return x, [c]
+        cases.append(('root_NewtonRaphson_autodiff', m, run, 3.0))
+
+        def run(m=m):
+            c = Counted(f)
+            for i in range(m):
+                x = root_secant(c, 1000 + i, 999 + i, 1E-10, 100)[0]
+            return x, [c]
+        cases.append(('root_secant', m, run, 3.0))
+
+        def run(m=m):
+            c = Counted(f)
+            for i in range(m):
+                x = root_bisection(c, 0, 1000 + i, 1E-10)[0]
+            return x, [c]
+        cases.append(('root_bisection', m, run, 3.0))
+
+        def run(m=m):
+            c = Counted(f)
+            for i in range(m):
+                x = root_brent(c, 0, 1000 + i, 1E-12)[0]
+            return x, [c]
+        cases.append(('root_brent', m, run, 3.0))
+
+        def run(m=m):
+            F = Counted(lambda u: [u[0] ** 2 + u[1] ** 2 - 4, u[0] - u[1]])
+            for i in range(m):
+                x = root_Newton_system(F, [1 + i, 0.5], 'autodiff', 1E-10)[0]
+            return x[0], [F]
+        cases.append(('root_Newton_system', m, run, np.sqrt(2)))
+
+        # All the roots of sin in [0.5, 10*m + 0.5] in one batched pass
+        def run(m=m):
+            c = Counted(np.sin)
+            return len(root_scan(c, 0.5, 10 * m + 0.5, 100 * m, 1E-12)), [c]
+        cases.append(('root_scan', m, run, len(np.arange(1, (10 * m + 0.5) / pi))))
+
+        # The 10*m roots of unity, all on the unit circle
+        def run(m=m):
+            coefficients = np.zeros(10 * m + 1)
+            coefficients[[0, -1]] = 1, -1
+            return np.abs(root_polynomial(coefficients, 'aberth')).max(), []
+        cases.append(('root_polynomial', m, run, 1.0))
+    return cases
+
+
+def _ode_cases(sizes):
+    cases = []
+    T = 1.0
+    for Nt in sizes['ode']:
+        dt = T / Nt
+
+        def run(dt=dt):
+            c = Counted(lambda u, t: -u)
+            return ode_FE(c, 1.0, dt, T)[0][-1], [c]
+        cases.append(('ode_FE', Nt, run, exp(-1)))
+
+        def run(dt=dt):
+            c = Counted(lambda u, t: [u[1], -u[0]])
+            return ode_system_FE(c, [1.0, 0.0], dt, T)[0][-1, 0], [c]
+        cases.append(('ode_system_FE', Nt, run, cos(1)))
+
+        if Nt <= 10000:
+            def run(dt=dt):
+                c = Counted(lambda u, t: [u[1], -u[0]])
+                return ode_system_BE(c, [1.0, 0.0], dt, T)[0][-1, 0], [c]
+            cases.append(('ode_system_BE', Nt, run, cos(1)))
+
+        def run(dt=dt):
+            f, s, F = Counted(lambda v: 0), Counted(lambda u: u), Counted(lambda t: 0)
+            return ode_EulerCromer(f, s, F, 1, T, 1.0, 0.0, dt)[0][-1], [f, s, F]
+        cases.append(('ode_EulerCromer', Nt, run, cos(1)))
+
+        def run(dt=dt):
+            return ode_RK2(1.0, 1.0, dt, T)[0][-1], []
+        cases.append(('ode_RK2', Nt, run, cos(1)))
+
+        def run(dt=dt):
+            return ode_Stormer(1.0, 1.0, dt, T)[0][-1], []
+        cases.append(('ode_Stormer', Nt, run, cos(1)))
+    return cases
+
+
+def _precision_cases(sizes):
+    cases = []
+    f = lambda t: 3 * t ** 2 * np.exp(t ** 3)
+    for n in sizes['1d']:
+        for label, dtype, acc_dtype in [('float64', np.float64, np.float64),
+                                        ('float32', np.float32, np.float64),
+                                        ('float32_acc32', np.float32, np.float32)]:
+            def run(n=n, dtype=dtype, acc_dtype=acc_dtype):
+                return trapezoidal_vec(f, 0, 1, n, dtype, acc_dtype), []
+            cases.append(('trapezoidal_vec_' + label, n, run, exp(1) - 1))
+
+    # Ensemble of m harmonic oscillators, the error is measured against the float64 run. Only
+    # the final state is kept, the memory is the one of the solver
+    g = lambda u, t: np.column_stack((u[:, 1], -u[:, 0]))
+    dt, T = 0.001, 1.0
+    for m in sizes['ensemble']:
+        U0 = np.column_stack((np.ones(m), np.zeros(m)))
+        reference = ode_system_FE(g, U0, dt, T, save_every=1000)[0][-1, 0, 0]
+        for label, dtype, compensated in [('float64', np.float64, False),
+                                          ('float32', np.float32, False),
+                                          ('float32_compensated', np.float32, True)]:
+            def run(U0=U0, dtype=dtype, compensated=compensated):
+                c = Counted(g)
+                u = ode_system_FE(c, U0, dt, T, dtype=dtype, compensated=compensated,
+                                  save_every=1000)[0]
+                return u[-1, 0, 0], [c]
+            cases.append(('ode_system_FE_' + label, m, run, reference))
+    return cases
+
+
+GROUPS = {'integral': _integral_cases, 'root': _root_cases, 'ode': _ode_cases,
+          'precision': _precision_cases}
+
+
+def run_benchmarks(groups=('integral', 'root', 'ode', 'precision'), sizes='quick', repeat=3,
+                   verbose=False):
+    """
+    Run the benchmark cases and collect the results in a JSON-serializable dictionary.
+    Every record holds the best wall time, the number of function calls and of evaluated
+    points, and the absolute error; the ODE and precision records also hold the peak
+    traced memory
+
+    :param groups: Names of the benchmark groups ('integral', 'root', 'ode', 'precision')
+    :param str sizes: 'quick' or 'full'
+    :param int repeat: Number of timed runs per case
+    :param bool verbose: Print each record on stderr
+    """
+    results = []
+    for group in groups:
+        for name, size, run, exact in GROUPS[group](SIZES[sizes]):
+            value, record = measure(run, repeat, memory=group in ('ode', 'precision'))
+            record.update({'group': group, 'name': name, 'size': size,
+                           'value': float(value), 'error': abs(float(value) - exact)})
+            results.append(record)
+            if verbose:
+                print('%-10s %-34s %8d %12.6f s %10d calls  error %.3e' %
+                      (group, name, size, record['time'], record['calls'], record['error']),
+                      file=sys.stderr)
+    return {'metadata': _metadata(sizes, repeat), 'results': results,
+            'comparisons': compare(results)}
+
+
+def compare(results):
+    """ Speedup of the candidate implementations over their baselines (loop vs vectorized,
+    float64 vs float32) """
+    times = {(r['name'], r['size']): r['time'] for r in results}
+    comparisons = []
+    for baseline, candidate in COMPARED_PAIRS:
+        for (name, size), t in sorted(times.items()):
+            if name == baseline and (candidate, size) in times:
+                comparisons.append({'baseline': baseline, 'candidate': candidate, 'size': size,
+                                    'speedup': t / times[(candidate, size)]})
+    return comparisons
+
+
+def _metadata(sizes, repeat):
+    try:
+        from importlib.metadata import version
+        package_version = version('nampyPrj')
+    except Exception:
+        package_version = 'unknown'
+    return {'package_version': package_version, 'python': platform.python_version(),
+            'numpy': np.__version__, 'machine': platform.machine(),
+            'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'), 'sizes': sizes, 'repeat': repeat}
+
+
+def main(argv=None):
+    """ Command line entry point of the benchmark suite """
+    parser = argparse.ArgumentParser(description='Benchmark the nampyPrj solvers')
+    parser.add_argument('-g', '--groups', nargs='+', choices=sorted(GROUPS),
+                        default=sorted(GROUPS), help='benchmark groups to run')
+    parser.add_argument('-s', '--sizes', choices=sorted(SIZES), default='quick',
+                        help='problem sizes')
+    parser.add_argument('-r', '--repeat', type=int, default=3, help='timed runs per case')
+    parser.add_argument('-o', '--output', help='JSON output file (default: print to stdout)')
+    parser.add_argument('-q', '--quiet', action='store_true',
+                        help='do not print the records on stderr')
+    args = parser.parse_args(argv)
+
+    report = run_benchmarks(args.groups, args.sizes, args.repeat, verbose=not args.quiet)
+    if not args.quiet:
+        for c in report['comparisons']:
+            print('%s vs %s, n = %d: speedup %.1fx' % (c['candidate'], c['baseline'], c['size'],
+                                                       c['speedup']), file=sys.stderr)
+    if args.output:
+        with open(args.output, 'w') as file:
+            json.dump(report, file, indent=2)
+    else:
+        print(json.dumps(report, indent=2))
+    return report
+
+
+def cli(argv=None):
+    """ Console script of the benchmark suite: runs main and returns the exit status """
+    main(argv)
+    return 0
@@ -0,0 +1,201 @@
+import time
+from numbers import Integral
+
+from numpy import asarray, full, nan, log, isnan, abs as np_abs, max as np_max, float64
+from nampyPrj.integral.integral_vec import _trapezoidal_levels
+
+
+class ConvergenceResult:
+    r"""
+    Result of a convergence study on a sequence of refinement levels.
+
+    Without the exact solution the error of level i is estimated by Richardson extrapolation
+
+    .. math ::
+        E_i \approx \frac{\| Q_i - Q_{i-1} \|}{r^p - 1}, \quad r = h_{i-1}/h_i
+
+    with the expected order p if given, otherwise the observed one.
+
+    :param h: Resolution of each level (step size, or 1/n for a number of subdivisions)
+    :param list values: Computed quantity at each level (scalar or array)
+    :param errors: Error of each level (exact one if known, otherwise Richardson estimate,
+                   nan when it cannot be estimated)
+    :param orders: Observed order of convergence at each level (nan for the first levels)
+    :param list extrapolated: Richardson extrapolated value at each level (None for the first)
+    :param times: Elapsed time of each level [s]
+    :param bool exact_errors: True if errors are exact, False if they are estimates
+    """
+    def __init__(self, h, values, errors, orders, extrapolated, times, exact_errors):
+        self.h = h
+        self.values = values
+        self.errors = errors
+        self.orders = orders
+        self.extrapolated = extrapolated
+        self.times = times
+        self.exact_errors = exact_errors
+
+    def resolution_for(self, tol):
+        """
+        Largest (cheapest) resolution h meeting the tolerance: the coarsest level whose error
+        is below tol, otherwise the extrapolation of the finest error with the observed order
+
+        :param float tol: Error tolerance
+        """
+        for h, error in zip(self.h, self.errors):
+            if error <= tol:
+                return h
+        order = self.orders[-1]
+        if isnan(order) or isnan(self.errors[-1]) or order <= 0:
+            return None
+        return self.h[-1]*(tol/self.errors[-1])**(1/order)
+
+    def __repr__(self):
+        return 'ConvergenceResult(levels=%d, errors=%r, orders=%r)' % (
+            len(self.h), list(self.errors), list(self.orders))
+
+
+def _norm(x):
+    return float(np_max(np_abs(asarray(x, dtype=float64))))
+
+
+def _timed(solve, level):
+    """ Value and elapsed time of solve(level) (module-level, so it can be sent to worker
+    processes) """
+    start = time.perf_counter()
+    value = solve(level)
+    return value, time.perf_counter() - start
+
+
+def _analyse(h, values, times, exact=None, order=None):
+    """ Errors, observed orders and Richardson extrapolation of a refinement sequence """
+    m = len(h)
+    h = asarray(h, dtype=float64)
+    errors = full(m, nan)
+    orders = full(m, nan)
+    extrapolated = [None]*m
+    differences = full(m, nan)
+    for i in range(1, m):
+        differences[i] = _norm(asarray(values[i]) - asarray(values[i-1]))
+    if exact is not None:
+        for i in range(m):
+            errors[i] = _norm(asarray(values[i]) - asarray(exact))
+        for i in range(1, m):
+            orders[i] = log(errors[i-1]/errors[i]) / log(h[i-1]/h[i])
+    else:
+        for i in range(2, m):
+            orders[i] = log(differences[i-1]/differences[i]) / log(h[i-1]/h[i])
+    for i in range(1, m):
+        p = order if order is not None else orders[i]
+        if isnan(p):
+            continue
+        factor = 1 / ((h[i-1]/h[i])**p - 1)
+        extrapolated[i] = asarray(values[i]) + factor*(asarray(values[i]) - asarray(values[i-1]))
+        if exact is None:
+            errors[i] = factor*differences[i]
+    return ConvergenceResult(h, values, errors, orders, extrapolated, asarray(times),
+                             exact is not None)
+
+
+def convergence_study(solve, levels, exact=None, order=None, executor=None):
+    """
+    Convergence study of any solver. solve(level) returns the computed quantity (scalar or
+    array) at a refinement level. The levels are independent and can run on an executor.
+
+    .. code ::
+
+        study = convergence_study(lambda n: trapezoidal(f, 0, 1, n), [10, 20, 40, 80])
+        print(study.orders, study.errors)
+        n = 1 / study.resolution_for(1E-8)
+
+    :param solve: Function of the level
+    :param levels: Numbers of subdivisions (integers, h = 1/n) or step sizes (floats)
+    :param exact: Exact quantity. If None the errors are estimated by Richardson extrapolation
+    :param float order: Expected order of convergence, used for the Richardson estimates.
+                        If None the observed order
+    :param executor: concurrent.futures executor running the levels (with a process pool solve
+                     must be picklable). If None they run serially
+    :return: ConvergenceResult
+    """
+    levels = list(levels)
+    if executor is None:
+        results = [_timed(solve, level) for level in levels]
+    else:
+        results = list(executor.map(_timed, [solve]*len(levels), levels))
+    h = [1.0/level if isinstance(level, Integral) else float(level) for level in levels]
+    return _analyse(h, [value for value, elapsed in results],
+                    [elapsed for value, elapsed in results], exact, order)
+
+
+def integral_convergence(f, a, b, n=2, levels=10, exact=None):
+    """
+    Convergence study of the composite trapezoidal method on nested grids n, 2n, 4n, ...
+    The finer grids reuse the values of the coarser ones (see trapezoidal_refined), so the
+    whole study costs the evaluations of the finest grid, and the time of a level is the time
+    of its refinement. The Richardson extrapolations are the Romberg (Simpson's rule) values.
+
+    :param f: Vectorized function
+    :param float a: Lower interval bound
+    :param float b: Upper interval bound
+    :param int n: Number of subdivisions of the coarsest grid
+    :param int levels: Number of grids
+    :param float exact: Exact integral. If None the errors are estimated
+    :return: ConvergenceResult
+    """
+    values, subdivisions, times = [], [], []
+    refinements = _trapezoidal_levels(f, a, b, n)
+    for level in range(levels):
+        start = time.perf_counter()
+        value, n = next(refinements)
+        times.append(time.perf_counter() - start)
+        values.append(value)
+        subdivisions.append(n)
+    return _analyse([(b - a)/float(k) for k in subdivisions], values, times, exact, order=2)
+
+
+def _whole_steps(dt, T, t0=0.0):
+    """ Time step closest to dt dividing [t0, T] into a whole number of steps, so that the
+    grids of the refinement levels dt/2**i nest exactly """
+    return (T - t0) / max(1, int(round((T - t0) / dt)))
+
+
+def _ode_level(arguments):
+    """ Solution and time points of one level of ode_convergence """
+    solver, f, U0, dt, T, save_every, kwargs = arguments
+    return solver(f, U0, dt, T, save_every=save_every, **kwargs)
+
+
+def ode_convergence(solver, f, U0, dt, T, levels=4, exact=None, order=None, executor=None,
+                    **kwargs):
+    """
+    Convergence study of an ODE solver with the time steps dt, dt/2, dt/4, ...
+    dt is adjusted so that [t0, T] is a whole number of steps. Every level stores its solution
+    on the grid of the coarsest one only (save_every), so the trajectories are compared at
+    the same times and the memory does not grow with the refinement. The levels are
+    independent and can run on an executor.
+
+    :param solver: ODE solver with the signature of ode_system_FE (e.g. ode_FE, ode_RK4)
+    :param f: Right-hand side
+    :param U0: Initial value
+    :param float dt: Time step of the coarsest level
+    :param float T: Final time
+    :param int levels: Number of levels
+    :param exact: Exact solution as a function of t. If None the errors are estimated
+    :param float order: Expected order of the solver. If None the observed order
+    :param executor: concurrent.futures executor running the levels (with a process pool f
+                     must be picklable). If None they run serially
+    :param kwargs: Other arguments of the solver
+    :return: ConvergenceResult, errors measured as max norm over the trajectory
+    """
+    dt = _whole_steps(dt, T, kwargs.get('t0', 0.0))
+    arguments = [(solver, f, U0, dt/2**i, T, 2**i, kwargs) for i in range(levels)]
+    if executor is None:
+        results = [_timed(_ode_level, a) for a in arguments]
+    else:
+        results = list(executor.map(_timed, [_ode_level]*levels, arguments))
+    values = [u for (u, t), elapsed in results]
+    exact_values = None
+    if exact is not None:
+        t = results[0][0][1]
+        exact_values = asarray([exact(t_n) for t_n in t]).reshape(values[0].shape)
+    return _analyse([dt/2**i for i in range(levels)], values,
+                    [elapsed for value, elapsed in results], exact_values, order)
@@ -0,0 +1,197 @@
+from math import log2
+
+from numpy import arange, concatenate, abs as np_abs, max as np_max, sum
+from nampyPrj.root.root import ConvergenceError
+from nampyPrj.convergence.convergence import _whole_steps
+from nampyPrj.integral.integral_vec import _trapezoidal_levels
+from nampyPrj.utils.instrument import profiled
+
+# Order of accuracy of the fixed-step solvers, for the error estimates of ode_tol
+ORDERS = {'ode_FE': 1, 'ode_system_FE': 1, 'ode_system_BE': 1, 'ode_RK4': 4}
+
+
+class ToleranceResult:
+    """
+    Result of a tolerance-driven computation
+
+    :param value: Computed value (integral, or solution at the time points t)
+    :param float error: Estimated error of value
+    :param resolution: Final number of subdivisions (integrals) or time step (ODE)
+    :param int evaluations: Number of evaluations of the function over all the levels (points
+                            for the integrals, calls for the ODE solvers)
+    :param int levels: Number of resolutions computed
+    :param bool converged: True if the tolerance was met
+    :param t: Time points of the solution (ODE only)
+    """
+    def __init__(self, value, error, resolution, evaluations, levels, converged, t=None):
+        self.value = value
+        self.error = error
+        self.resolution = resolution
+        self.evaluations = evaluations
+        self.levels = levels
+        self.converged = bool(converged)
+        self.t = t
+
+    def __repr__(self):
+        return ('ToleranceResult(error=%.3g, resolution=%r, evaluations=%d, levels=%d, '
+                'converged=%r)' % (self.error, self.resolution, self.evaluations, self.levels,
+                                   self.converged))
+
+
+def _finish(result, raise_on_failure):
+    if raise_on_failure and not result.converged:
+        raise ConvergenceError('tolerance not met at the finest resolution (%r)'
+                               % result.resolution, result)
+    return result
+
+
+@profiled
+def trapezoidal_tol(f, a, b, rtol=1E-8, atol=0.0, n=2, max_n=2**24, min_levels=5,
+                    raise_on_failure=False):
+    r"""
+    Composite trapezoidal method to a tolerance. The number of subdivisions is doubled,
+    reusing all the previous function values, until the Richardson error estimate
+
+    .. math ::
+        E_{2n} = \frac{|T_{2n} - T_n|}{3} \le atol + rtol |T_{2n}|
+
+    The estimate is only trusted after min_levels levels: on a coarse grid an oscillating
+    integrand can be sampled at its zeros only (aliasing), and two levels agree by accident.
+
+    :param f: Vectorized function
+    :param float a: Lower interval bound
+    :param float b: Upper interval bound
+    :param float rtol: Relative tolerance
+    :param float atol: Absolute tolerance
+    :param int n: Number of subdivisions of the first level
+    :param int max_n: Max number of subdivisions
+    :param int min_levels: Min number of levels before the estimate is trusted
+    :param bool raise_on_failure: Raise ConvergenceError if the tolerance is not met
+    :return: ToleranceResult
+    """
+    refinements = _trapezoidal_levels(f, a, b, n)
+    value, n = next(refinements)
+    levels = 1
+    error = float('inf')
+    while 2*n <= max_n:
+        previous = value
+        value, n = next(refinements)
+        levels += 1
+        error = abs(value - previous)/3
+        if levels >= min_levels and error <= atol + rtol*abs(value):
+            break
+    # The nested grids evaluate f once at each point of the finest one
+    evaluations = n + 1
+    result = ToleranceResult(value, error, n, evaluations, levels,
+                             levels >= min_levels and error <= atol + rtol*abs(value))
+    return _finish(result, raise_on_failure)
+
+
+@profiled
+def midpoint_tol(f, a, b, rtol=1E-8, atol=0.0, n=1, max_n=3**15, min_levels=5,
+                 raise_on_failure=False):
+    r"""
+    Composite midpoint method to a tolerance. The number of subdivisions is tripled, so the
+    previous midpoints are midpoints of the new grid and all the function values are
+    reused, until the Richardson error estimate
+
+    .. math ::
+        E_{3n} = \frac{|M_{3n} - M_n|}{8} \le atol + rtol |M_{3n}|
+
+    The estimate is only trusted after min_levels levels (see trapezoidal_tol).
+
+    :param f: Vectorized function
+    :param float a: Lower interval bound
+    :param float b: Upper interval bound
+    :param float rtol: Relative tolerance
+    :param float atol: Absolute tolerance
+    :param int n: Number of subdivisions of the first level
+    :param int max_n: Max number of subdivisions
+    :param int min_levels: Min number of levels before the estimate is trusted
+    :param bool raise_on_failure: Raise ConvergenceError if the tolerance is not met
+    :return: ToleranceResult
+    """
+    h = float(b - a) / n
+    value = h*sum(f(a + h*(arange(n) + 0.5)))
+    evaluations = n
+    levels = 1
+    error = float('inf')
+    while 3*n <= max_n:
+        previous = value
+        # New midpoints at 1/6 and 5/6 of the old subintervals
+        x = a + h*arange(n)
+        new = concatenate((x + h/6, x + 5*h/6))
+        value = value/3 + h/3*sum(f(new))
+        evaluations += 2*n
+        h /= 3
+        n *= 3
+        levels += 1
+        error = abs(value - previous)/8
+        if levels >= min_levels and error <= atol + rtol*abs(value):
+            break
+    result = ToleranceResult(value, error, n, evaluations, levels,
+                             levels >= min_levels and error <= atol + rtol*abs(value))
+    return _finish(result, raise_on_failure)
+
+
+@profiled
+def ode_tol(solver, f, U0, T, rtol=1E-6, atol=0.0, dt=None, order=None, max_levels=16,
+            raise_on_failure=False, **kwargs):
+    r"""
+    Fixed-step ODE solver to a tolerance. The time step is halved until the Richardson
+    estimate of the error on the grid of the first level
+
+    .. math ::
+        E = \frac{\max |u_{\Delta t/2} - u_{\Delta t}|}{2^p - 1} \le atol + rtol \max |u_{\Delta t/2}|
+
+    dt is adjusted so that [t0, T] is a whole number of steps. Every level stores its solution
+    on the grid of the first one only (save_every), so the memory does not grow with the
+    refinement.
+
+    :param solver: ODE solver with the signature of ode_system_FE (e.g. ode_FE, ode_RK4)
+    :param f: Right-hand side
+    :param U0: Initial value
+    :param float T: Final time
+    :param float rtol: Relative tolerance
+    :param float atol: Absolute tolerance
+    :param float dt: Time step of the first level. If None (T - t0)/8
+    :param int order: Order of the solver. If None it is looked up in ORDERS, otherwise the
+                      observed order is used
+    :param int max_levels: Max number of time steps tried
+    :param bool raise_on_failure: Raise ConvergenceError if the tolerance is not met
+    :param kwargs: Other arguments of the solver
+    :return: ToleranceResult, value holds the solution at the time points t
+    """
+    t0 = kwargs.get('t0', 0.0)
+    dt = (T - t0)/8. if dt is None else _whole_steps(dt, T, t0)
+    order = ORDERS.get(getattr(solver, '__name__', None)) if order is None else order
+    evaluations = [0]
+
+    def counted(*args):
+        evaluations[0] += 1
+        return f(*args)
+
+    u, t = solver(counted, U0, dt, T, **kwargs)
+    levels = 1
+    error = float('inf')
+    difference = None
+    converged = False
+    while levels < max_levels:
+        save_every = 2**levels
+        u_fine, t = solver(counted, U0, dt/save_every, T, save_every=save_every, **kwargs)
+        levels += 1
+        previous_difference = difference
+        difference = float(np_max(np_abs(u_fine - u)))
+        p = order
+        if p is None and previous_difference is not None and difference > 0:
+            # Observed order, rounded
+            p = max(1, round(log2(previous_difference/difference)))
+        u = u_fine
+        if p is None:
+            continue
+        error = difference/(2**p - 1)
+        if error <= atol + rtol*float(np_max(np_abs(u))):
+            converged = True
+            break
+    result = ToleranceResult(u, error, dt/2**(levels - 1), evaluations[0], levels, converged, t)
+    return _finish(result, raise_on_failure)
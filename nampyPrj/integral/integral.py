@@ -1,6 +1,8 @@
 import numpy as np
+from nampyPrj.utils.instrument import profiled
 
 
+@profiled
 def trapezoidal(f, a, b, n):
     r"""
     Composite trapezoidal method for integral numerical calculation.
@@ -22,6 +24,7 @@ def trapezoidal(f, a, b, n):
     return result
 
 
+@profiled
 def midpoint(f, a, b, n):
     r"""
     Composite trapezoidal method for integral numerical calculation.
@@ -45,6 +48,7 @@ def midpoint(f, a, b, n):
     return result
 
 
+@profiled
 def midpoint_double(f, a, b, c, d, nx, ny):
     r"""
     Composite trapezoidal method for double integral numerical calculation.
@@ -75,6 +79,7 @@ def midpoint_double(f, a, b, c, d, nx, ny):
     return Integral
 
 
+@profiled
 def midpoint_double2(f, a, b, c, d, nx, ny):
     r"""
     Composite trapezoidal method for double integral numerical calculation.
@@ -94,6 +99,7 @@ def midpoint_double2(f, a, b, c, d, nx, ny):
     return midpoint(g, a, b, nx)
 
 
+@profiled
 def midpoint_triple(g, a, b, c, d, e, f, nx, ny, nz):
     r"""
     Composite trapezoidal method for triple integral numerical calculation.
@@ -119,6 +125,7 @@ def midpoint_triple(g, a, b, c, d, e, f, nx, ny, nz):
     return midpoint(q, a, b, nx)
 
 
+@profiled
 def MonteCarlo_double(f, g, x0, x1, y0, y1, n):
     r"""
     Monte Carlo integration of f over a domain g>=0, embedded
@@ -0,0 +1,71 @@
+from numpy import linspace, sum, meshgrid
+from nampyPrj.utils.instrument import profiled
+from nampyPrj.utils.scheduler import AsyncEvaluator
+
+
+@profiled
+async def trapezoidal_async(f, a, b, n, concurrency=16, batch_size=None):
+    r"""
+    Composite trapezoidal method for integral numerical calculation, with the
+    evaluations of f issued concurrently (I/O-bound or remote integrands).
+
+    .. math ::
+        \int_{a}^{b} f(x) dx \approx h \left[ \frac{1}{2} f(x_0) + \sum_{i=1}^{n-1} f(x_i) + \frac{1}{2} f(x_n) \right]
+
+    :param f: function or coroutine function.
+    :param float a: Lower interval bound.
+    :param float b: Upper interval bound.
+    :param int n: Number of subdivision.
+    :param int concurrency: Max number of evaluations in flight.
+    :param int batch_size: Number of points per call if f accepts arrays.
+    """
+    h = float(b - a) / n
+    fx = await AsyncEvaluator(f, concurrency, batch_size).map(linspace(a, b, n+1))
+    return h*(sum(fx) - 0.5*fx[0] - 0.5*fx[-1])
+
+
+@profiled
+async def midpoint_async(f, a, b, n, concurrency=16, batch_size=None):
+    r"""
+    Composite midpoint method for integral numerical calculation, with the
+    evaluations of f issued concurrently (I/O-bound or remote integrands).
+
+    .. math ::
+        \int_{a}^{b} f(x) dx \approx h \sum_{i=0}^{n-1} f(x_i)
+
+        where, x_i = a + \frac{h}{2} + ih
+
+    :param f: function or coroutine function.
+    :param float a: Lower interval bound.
+    :param float b: Upper interval bound.
+    :param int n: Number of subdivision.
+    :param int concurrency: Max number of evaluations in flight.
+    :param int batch_size: Number of points per call if f accepts arrays.
+    """
+    h = float(b - a) / n
+    fx = await AsyncEvaluator(f, concurrency, batch_size).map(linspace(a + h/2, b - h/2, n))
+    return h*sum(fx)
+
+
+@profiled
+async def midpoint_double_async(f, a, b, c, d, nx, ny, concurrency=16, batch_size=None):
+    r"""
+    Composite midpoint method for double integral numerical calculation, with the
+    nx*ny evaluations of f issued concurrently.
+
+    :param f: function or coroutine function.
+    :param float a: Lower interval bound in x.
+    :param float b: Upper interval bound in x.
+    :param float c: Lower interval bound in y.
+    :param float d: Upper interval bound in y.
+    :param int nx: Number of subdivision in x.
+    :param int ny: Number of subdivision in y.
+    :param int concurrency: Max number of evaluations in flight.
+    :param int batch_size: Number of points per call if f accepts arrays.
+    """
+    hx = (b - a) / float(nx)
+    hy = (d - c) / float(ny)
+    x, y = meshgrid(linspace(a + hx/2, b - hx/2, nx), linspace(c + hy/2, d - hy/2, ny),
+                    indexing='ij')
+    fxy = await AsyncEvaluator(f, concurrency, batch_size).map(x, y)
+    return hx*hy*sum(fxy)
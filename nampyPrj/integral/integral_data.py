@@ -0,0 +1,219 @@
+import numpy as np
+from numpy import asarray, sum, cumsum, memmap
+from nampyPrj.utils.instrument import profiled
+
+CHUNK_SIZE = 2 ** 20
+
+
+class _CompensatedSum:
+    """ Neumaier's compensated summation of the partial results of the chunks """
+    def __init__(self, value=0.0):
+        self.total = float(value)
+        self.compensation = 0.0
+
+    def add(self, value):
+        t = self.total + value
+        if abs(self.total) >= abs(value):
+            self.compensation += (self.total - t) + value
+        else:
+            self.compensation += (value - t) + self.total
+        self.total = t
+
+    @property
+    def value(self):
+        return self.total + self.compensation
+
+
+def _chunk(a, start, stop):
+    """ Read a chunk of a (memory-mapped) array in double precision """
+    return asarray(a[start:stop], dtype=float)
+
+
+@profiled
+def trapezoidal_data(y, x=None, dx=1.0, chunk_size=CHUNK_SIZE):
+    r"""
+    Composite trapezoidal method for the integral of tabulated data.
+
+    .. math ::
+        \int_{x_0}^{x_n} y(x) dx \approx \sum_{i=0}^{n-1} \frac{x_{i+1} - x_i}{2} (y_i + y_{i+1})
+
+    The samples are processed in chunks, so y and x can be numpy.memmap arrays larger than
+    the memory; the partial sums of the chunks are accumulated with compensated summation.
+
+    :param y: Sample values
+    :param x: Sample points (non-uniform spacing). If None the spacing is dx
+    :param float dx: Uniform spacing of the samples
+    :param int chunk_size: Number of intervals processed at once
+    """
+    n = len(y) - 1
+    result = _CompensatedSum()
+    for start in range(0, n, chunk_size):
+        stop = min(start + chunk_size, n)
+        y_c = _chunk(y, start, stop + 1)
+        if x is None:
+            result.add(dx * (sum(y_c) - 0.5 * (y_c[0] + y_c[-1])))
+        else:
+            x_c = _chunk(x, start, stop + 1)
+            result.add(0.5 * sum((x_c[1:] - x_c[:-1]) * (y_c[1:] + y_c[:-1])))
+    return result.value
+
+
+@profiled
+def simpson_data(y, x=None, dx=1.0, chunk_size=CHUNK_SIZE):
+    r"""
+    Composite Simpson's method for the integral of tabulated data.
+
+    .. math ::
+        \int_{x_{2i}}^{x_{2i+2}} y(x) dx \approx \frac{h_0 + h_1}{6} \left[
+        \left(2 - \frac{h_1}{h_0}\right) y_{2i} + \frac{(h_0 + h_1)^2}{h_0 h_1} y_{2i+1}
+        + \left(2 - \frac{h_0}{h_1}\right) y_{2i+2} \right]
+
+        where, h_0 = x_{2i+1} - x_{2i}, h_1 = x_{2i+2} - x_{2i+1}
+
+    which reduces to the classic h/3 (y_0 + 4 y_1 + y_2) rule for uniform spacing. With an
+    odd number of intervals the last one is integrated with the parabola through the last
+    three samples. The samples are processed in chunks (see trapezoidal_data).
+
+    :param y: Sample values
+    :param x: Sample points (non-uniform spacing). If None the spacing is dx
+    :param float dx: Uniform spacing of the samples
+    :param int chunk_size: Number of intervals processed at once (rounded to an even number)
+    """
+    n = len(y) - 1
+    if n < 2:
+        return trapezoidal_data(y, x, dx)
+    chunk_size = max(2, chunk_size - chunk_size % 2)
+    n_even = n - n % 2
+    result = _CompensatedSum()
+    for start in range(0, n_even, chunk_size):
+        stop = min(start + chunk_size, n_even)
+        y_c = _chunk(y, start, stop + 1)
+        if x is None:
+            result.add(dx / 3.0 * (y_c[0] + 4 * sum(y_c[1:-1:2]) + 2 * sum(y_c[2:-1:2])
+                                   + y_c[-1]))
+        else:
+            h = np.diff(_chunk(x, start, stop + 1))
+            h0, h1 = h[0::2], h[1::2]
+            result.add(sum((h0 + h1) / 6.0 * ((2 - h1 / h0) * y_c[0:-1:2]
+                                              + (h0 + h1) ** 2 / (h0 * h1) * y_c[1::2]
+                                              + (2 - h0 / h1) * y_c[2::2])))
+    if n % 2:
+        y_c = _chunk(y, n - 2, n + 1)
+        if x is None:
+            h0 = h1 = dx
+        else:
+            h0, h1 = np.diff(_chunk(x, n - 2, n + 1))
+        alpha = (2 * h1 ** 2 + 3 * h0 * h1) / (6 * (h0 + h1))
+        beta = (h1 ** 2 + 3 * h0 * h1) / (6 * h0)
+        eta = h1 ** 3 / (6 * h0 * (h0 + h1))
+        result.add(alpha * y_c[2] + beta * y_c[1] - eta * y_c[0])
+    return result.value
+
+
+@profiled
+def cumulative_trapezoidal_data(y, x=None, dx=1.0, out=None, initial=0.0,
+                                chunk_size=CHUNK_SIZE):
+    r"""
+    Cumulative trapezoidal integral of tabulated data
+
+    .. math ::
+        I_k = I_0 + \sum_{i=0}^{k-1} \frac{x_{i+1} - x_i}{2} (y_i + y_{i+1}), \quad k = 0, \dots, n
+
+    The samples are processed in chunks and the running integral is written chunk by chunk
+    to out, which can be a numpy.memmap; the offset carried between chunks is accumulated
+    with compensated summation.
+
+    :param y: Sample values
+    :param x: Sample points (non-uniform spacing). If None the spacing is dx
+    :param float dx: Uniform spacing of the samples
+    :param out: Output array, or file name of a new memory-mapped float64 output file.
+                If None a new array is returned
+    :param float initial: Value of the integral at the first sample
+    :param int chunk_size: Number of intervals processed at once
+    """
+    n = len(y) - 1
+    if out is None:
+        out = np.empty(n + 1)
+    elif isinstance(out, str):
+        out = memmap(out, dtype=float, mode='w+', shape=(n + 1,))
+    out[0] = initial
+    offset = _CompensatedSum(initial)
+    for start in range(0, n, chunk_size):
+        stop = min(start + chunk_size, n)
+        y_c = _chunk(y, start, stop + 1)
+        if x is None:
+            increments = 0.5 * dx * (y_c[1:] + y_c[:-1])
+        else:
+            x_c = _chunk(x, start, stop + 1)
+            increments = 0.5 * (x_c[1:] - x_c[:-1]) * (y_c[1:] + y_c[:-1])
+        running = cumsum(increments)
+        out[start + 1:stop + 1] = offset.value + running
+        offset.add(running[-1])
+    if isinstance(out, memmap):
+        out.flush()
+    return out
+
+
+class RunningIntegral:
+    r"""
+    Trapezoidal integral of a stream of samples, extended as new samples arrive without
+    recomputing the past. Only the last sample and the (compensated) running total are kept.
+
+    .. code ::
+
+        running = RunningIntegral(dx=0.01)
+        for block in stream:
+            I = running.extend(block)  # integral at every sample of the block
+        total = running.value
+
+    :param float dx: Uniform spacing of the samples. If None the sample points must be
+                     passed to extend
+    :param float initial: Value of the integral at the first sample
+    """
+    def __init__(self, dx=None, initial=0.0):
+        self.dx = dx
+        self.count = 0
+        self._total = _CompensatedSum(initial)
+        self._last_x = None
+        self._last_y = None
+
+    @property
+    def value(self):
+        return self._total.value
+
+    def extend(self, y, x=None):
+        """
+        Add samples to the stream and return the integral at each of them
+
+        :param y: New sample values
+        :param x: New sample points (required if dx is None)
+        """
+        y = np.atleast_1d(asarray(y, dtype=float))
+        if self.dx is None:
+            if x is None:
+                raise ValueError('sample points x are required when dx is None')
+            x = np.atleast_1d(asarray(x, dtype=float))
+        out = np.empty(len(y))
+        if len(y) == 0:
+            return out
+        if self._last_y is None:
+            y_all = y
+            x_all = x
+            out[0] = self.value
+            start = 1
+        else:
+            y_all = np.concatenate(([self._last_y], y))
+            x_all = None if x is None else np.concatenate(([self._last_x], x))
+            start = 0
+        if self.dx is None:
+            increments = 0.5 * (x_all[1:] - x_all[:-1]) * (y_all[1:] + y_all[:-1])
+        else:
+            increments = 0.5 * self.dx * (y_all[1:] + y_all[:-1])
+        if len(increments):
+            running = cumsum(increments)
+            out[start:] = self.value + running
+            self._total.add(running[-1])
+        self._last_y = y[-1]
+        self._last_x = None if x is None else x[-1]
+        self.count += len(y)
+        return out
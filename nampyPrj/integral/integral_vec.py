@@ -1,7 +1,11 @@
-from numpy import linspace, sum
+from itertools import islice
 
+from numpy import linspace, sum, cumsum, empty, arange, float64
+from nampyPrj.utils.instrument import profiled
 
-def trapezoidal_vec(f, a, b, n):
+
+@profiled
+def trapezoidal_vec(f, a, b, n, dtype=float64, acc_dtype=float64):
     r"""
     Composite trapezoidal method for integral numerical calculation.
 
@@ -12,14 +16,55 @@ def trapezoidal_vec(f, a, b, n):
     :param float a: Lower interval bound.
     :param float b: Upper interval bound.
     :param int n: Number of subdivision.
+    :param dtype: Data type of the nodes (e.g. float32 to halve memory and bandwidth).
+    :param acc_dtype: Data type of the sum of the function values.
     """
     h = float(b - a) / n
-    x = linspace(a, b, n+1)
-    s = sum(f(x)) - 0.5*f(a) - 0.5*f(b)
+    x = linspace(a, b, n+1, dtype=dtype)
+    fx = f(x)
+    s = sum(fx, dtype=acc_dtype) - 0.5*acc_dtype(fx[0]) - 0.5*acc_dtype(fx[-1])
     return h*s
 
 
-def midpoint_vec(f, a, b, n):
+def _trapezoidal_levels(f, a, b, n):
+    """ Endless generator of the composite trapezoidal values on the nested grids n, 2n, 4n, ...
+    and their numbers of subdivisions. Each refinement only evaluates f at the new midpoints """
+    h = float(b - a) / n
+    fx = f(linspace(a, b, n+1))
+    value = h*(sum(fx) - 0.5*fx[0] - 0.5*fx[-1])
+    while True:
+        yield value, n
+        value = 0.5*value + 0.5*h*sum(f(a + h*(arange(n) + 0.5)))
+        h *= 0.5
+        n *= 2
+
+
+@profiled
+def trapezoidal_refined(f, a, b, n, levels):
+    r"""
+    Composite trapezoidal method on a sequence of nested grids with n, 2n, 4n, ... subdivisions.
+    Each refinement reuses the previous value and only evaluates f at the new midpoints,
+    so the whole sequence costs the evaluations of the finest grid.
+
+    .. math ::
+        T_{2n} = \frac{1}{2} T_n + \frac{h}{2} \sum_{i=0}^{n-1} f\left(a + \left(i + \frac{1}{2}\right) h\right)
+
+    :param f: function.
+    :param float a: Lower interval bound.
+    :param float b: Upper interval bound.
+    :param int n: Number of subdivision of the coarsest grid.
+    :param int levels: Number of grids.
+    :return: Values on the grids and their numbers of subdivisions.
+    """
+    values, subdivisions = [], []
+    for value, n in islice(_trapezoidal_levels(f, a, b, n), levels):
+        values.append(value)
+        subdivisions.append(n)
+    return values, subdivisions
+
+
+@profiled
+def midpoint_vec(f, a, b, n, dtype=float64, acc_dtype=float64):
     r"""
     Composite trapezoidal method for integral numerical calculation.
 
@@ -32,7 +77,62 @@ def midpoint_vec(f, a, b, n):
     :param float a: Lower interval bound.
     :param float b: Upper interval bound.
     :param int n: Number of subdivision.
+    :param dtype: Data type of the nodes (e.g. float32 to halve memory and bandwidth).
+    :param acc_dtype: Data type of the sum of the function values.
+    """
+    h = float(b - a) / n
+    x = linspace(a + h/2, b - h/2, n, dtype=dtype)
+    return h * sum(f(x), dtype=acc_dtype)
+
+
+@profiled
+def cumulative_trapezoidal_vec(f, a, b, n, dtype=float64, acc_dtype=float64):
+    r"""
+    Cumulative composite trapezoidal method: integral from a to every node of the
+    trapezoidal_vec grid, computed with one vectorized evaluation of f.
+
+    .. math ::
+        I_k = \int_{a}^{x_k} f(x) dx \approx \frac{h}{2} \sum_{i=0}^{k-1} (f(x_i) + f(x_{i+1}))
+
+    :param f: function.
+    :param float a: Lower interval bound.
+    :param float b: Upper interval bound.
+    :param int n: Number of subdivision.
+    :param dtype: Data type of the nodes (e.g. float32 to halve memory and bandwidth).
+    :param acc_dtype: Data type of the running sum and of the integrals.
+    :return: Integrals I_0, ..., I_n and nodes x_0, ..., x_n
+    """
+    h = float(b - a) / n
+    x = linspace(a, b, n+1, dtype=dtype)
+    fx = f(x)
+    I = empty(n+1, dtype=acc_dtype)
+    I[0] = 0
+    cumsum(0.5*h*(fx[1:] + fx[:-1]), out=I[1:], dtype=acc_dtype)
+    return I, x
+
+
+@profiled
+def cumulative_midpoint_vec(f, a, b, n, dtype=float64, acc_dtype=float64):
+    r"""
+    Cumulative composite midpoint method: integral from a to every cell boundary of the
+    midpoint_vec grid, computed with one vectorized evaluation of f.
+
+    .. math ::
+        I_k = \int_{a}^{a + kh} f(x) dx \approx h \sum_{i=0}^{k-1} f(x_i)
+
+        where, x_i = a + \frac{h}{2} + ih
+
+    :param f: function.
+    :param float a: Lower interval bound.
+    :param float b: Upper interval bound.
+    :param int n: Number of subdivision.
+    :param dtype: Data type of the nodes (e.g. float32 to halve memory and bandwidth).
+    :param acc_dtype: Data type of the running sum and of the integrals.
+    :return: Integrals I_0, ..., I_n and cell boundaries a, a + h, ..., b
     """
     h = float(b - a) / n
-    x = linspace(a + h/2, b - h/2, n)
-    return h * sum(f(x))
+    x = linspace(a + h/2, b - h/2, n, dtype=dtype)
+    I = empty(n+1, dtype=acc_dtype)
+    I[0] = 0
+    cumsum(h*f(x), out=I[1:], dtype=acc_dtype)
+    return I, linspace(a, b, n+1, dtype=dtype)
@@ -0,0 +1,193 @@
+from numpy import (linspace, zeros, asarray, atleast_2d, concatenate, eye, sqrt, finfo,
+                   abs as np_abs, max as np_max)
+from nampyPrj.ode.ode import ode_RK4, _propagate
+from nampyPrj.root.root import root_Newton_system, ConvergenceError, RootResult
+from nampyPrj.utils.autodiff import derivative, jacobian
+from nampyPrj.utils.linalg import solve_tridiagonal
+from nampyPrj.utils.instrument import profiled
+
+
+def _map(executor, function, *iterables):
+    """ Map on the executor, or serially in this process if executor is None """
+    if executor is None:
+        return list(map(function, *iterables))
+    return list(executor.map(function, *iterables))
+
+
+def bvp_multiple_shooting(f, bc, S0, t_nodes, dt, solver=ode_RK4, eps=1E-8, max_iterations=50,
+                          executor=None):
+    r"""
+    Multiple shooting method to compute the solution of a two-point boundary value problem
+    for a system of first order ODE
+
+    .. math ::
+        u' = f(u, t), \quad bc(u(a), u(b)) = 0
+
+    [a, b] is split at the nodes t_0 = a < t_1 < ... < t_M = b. The unknowns are the states
+    S_j at the start of each segment, determined with Newton's method so that the segments
+    match and the boundary conditions hold:
+
+    .. math ::
+        u_j(t_{j+1}; S_j) - S_{j+1} = 0, \quad bc(S_0, u_{M-1}(b; S_{M-1})) = 0
+
+    The sensitivities of the segments are computed by finite differences. The M (n+1)
+    integrations of a Newton iteration are independent and run on the executor, if given
+    (with a process pool f must be picklable).
+
+    :param f: Function or array of functions f(u, t)
+    :param bc: Residual of the boundary conditions bc(ua, ub), n values (must use NumPy
+               functions, it is differentiated automatically)
+    :param S0: Initial guess of the state at t_nodes[0], or of the states at all the nodes
+               but the last one (M x n)
+    :param t_nodes: Boundaries of the segments, t_nodes[0] = a and t_nodes[-1] = b
+    :param float dt: Time step of the integration of the segments
+    :param solver: ODE solver, with the signature of ode_system_FE
+    :param float eps: Tolerance of the Newton iterations
+    :param int max_iterations: Max number of Newton iterations
+    :param executor: concurrent.futures executor running the integrations of the segments.
+                     If None they run serially
+    :raises ConvergenceError: If Newton's method does not converge
+    :return: Solution u and time points t on [a, b]
+    """
+    # Not @profiled: the instrumented arguments could not be sent to the worker processes
+    t_nodes = asarray(t_nodes, dtype=float)
+    M = len(t_nodes) - 1
+    S0 = atleast_2d(asarray(S0, dtype=float))
+    n = S0.shape[1]
+    if len(S0) == 1 and M > 1:
+        # Initial guess at the nodes from a single integration
+        u, t = _propagate(solver, f, S0[0], t_nodes[0], t_nodes[-1], dt, full=True)
+        S0 = asarray([u[np_abs(t - t_node).argmin()] for t_node in t_nodes[:-1]])
+    elif len(S0) != M:
+        raise ValueError('S0 must hold the initial guess of 1 or %d states' % M)
+    starts = [t_nodes[j] for j in range(M)]
+    ends = [t_nodes[j+1] for j in range(M)]
+    solvers, fs, dts = [solver]*M, [f]*M, [dt]*M
+    h_min = sqrt(finfo(float).eps)
+    last = {}
+
+    def endpoints(S):
+        """ Ends of the segments starting from S, and their sensitivities (n x n per segment)
+        by finite differences, in one batch of integrations """
+        key = S.tobytes()
+        if key not in last:
+            states = S.reshape(M, n)
+            h = h_min*(1 + np_abs(states))
+            perturbed = [states[j] + h[j, i]*eye(n)[i] for j in range(M) for i in range(n)]
+            ends_all = _map(executor, _propagate, solvers*(n+1), fs*(n+1),
+                            list(states) + perturbed, starts*(n+1), ends*(n+1), dts*(n+1))
+            E = asarray(ends_all[:M])
+            Phi = zeros((M, n, n))
+            for j in range(M):
+                for i in range(n):
+                    Phi[j, :, i] = (ends_all[M + j*n + i] - E[j]) / h[j, i]
+            last.clear()
+            last[key] = E, Phi
+        return last[key]
+
+    def G(S):
+        E, Phi = endpoints(S)
+        states = S.reshape(M, n)
+        matching = [E[j] - states[j+1] for j in range(M - 1)]
+        return concatenate(matching + [asarray(bc(states[0], E[-1]), dtype=float)])
+
+    def J_G(S):
+        E, Phi = endpoints(S)
+        states = S.reshape(M, n)
+        J = zeros((M*n, M*n))
+        for j in range(M - 1):
+            J[j*n:(j+1)*n, j*n:(j+1)*n] = Phi[j]
+            J[j*n:(j+1)*n, (j+1)*n:(j+2)*n] = -eye(n)
+        B = jacobian(lambda z: bc(z[:n], z[n:]), concatenate((states[0], E[-1])))[1]
+        J[-n:, :n] += B[:, :n]
+        J[-n:, -n:] += B[:, n:] @ Phi[-1]
+        return J
+
+    S = root_Newton_system(G, S0.ravel(), J_G, eps, max_iterations, raise_on_failure=True)[0]
+
+    segments = _map(executor, _propagate, solvers, fs, list(S.reshape(M, n)), starts, ends, dts,
+                    [True]*M)
+    u = concatenate([segments[0][0]] + [u_j[1:] for u_j, t_j in segments[1:]])
+    t = concatenate([segments[0][1]] + [t_j[1:] for u_j, t_j in segments[1:]])
+    return u, t
+
+
+def bvp_shooting(f, bc, S0, a, b, dt, solver=ode_RK4, eps=1E-8, max_iterations=50,
+                 executor=None):
+    r"""
+    Shooting method to compute the solution of a two-point boundary value problem for a
+    system of first order ODE
+
+    .. math ::
+        u' = f(u, t), \quad bc(u(a), u(b)) = 0
+
+    The initial state S is determined with Newton's method so that bc(S, u(b; S)) = 0.
+    For long intervals or unstable problems use bvp_multiple_shooting.
+
+    :param f: Function or array of functions f(u, t)
+    :param bc: Residual of the boundary conditions bc(ua, ub), n values (must use NumPy
+               functions, it is differentiated automatically)
+    :param S0: Initial guess of the state at a
+    :param float a: Left boundary
+    :param float b: Right boundary
+    :param float dt: Time step
+    :param solver: ODE solver, with the signature of ode_system_FE
+    :param float eps: Tolerance of the Newton iterations
+    :param int max_iterations: Max number of Newton iterations
+    :param executor: concurrent.futures executor running the n+1 integrations of a Newton
+                     iteration. If None they run serially
+    :raises ConvergenceError: If Newton's method does not converge
+    :return: Solution u and time points t on [a, b]
+    """
+    # Not @profiled: the instrumented arguments could not be sent to the worker processes
+    return bvp_multiple_shooting(f, bc, S0, [a, b], dt, solver, eps, max_iterations, executor)
+
+
+@profiled
+def bvp_fd(g, a, b, ua, ub, n, U=None, eps=1E-10, max_iterations=50):
+    r"""
+    Finite difference method to compute the solution of a second order boundary value
+    problem with Dirichlet conditions
+
+    .. math ::
+        u'' = g(x, u, u'), \quad u(a) = u_a, \quad u(b) = u_b
+
+        \frac{u_{i+1} - 2u_i + u_{i-1}}{h^2} = g\left(x_i, u_i, \frac{u_{i+1} - u_{i-1}}{2h}\right)
+
+    The nonlinear system of the interior values is solved with Newton's method. Its
+    Jacobian is tridiagonal, so each iteration costs O(n) (Thomas algorithm); the partial
+    derivatives of g are computed by automatic differentiation. A linear g converges in one
+    iteration.
+
+    :param g: Function g(x, u, v) of arrays (must use NumPy functions)
+    :param float a: Left boundary
+    :param float b: Right boundary
+    :param float ua: Value at a
+    :param float ub: Value at b
+    :param int n: Number of intervals
+    :param U: Initial guess at the n+1 points. If None the line between the boundary values
+    :param float eps: Tolerance on the max Newton correction
+    :param int max_iterations: Max number of Newton iterations
+    :raises ValueError: If n < 2 (no interior point)
+    :raises ConvergenceError: If Newton's method does not converge
+    :return: Solution u and points x
+    """
+    if n < 2:
+        raise ValueError('n must be at least 2, got %r' % (n,))
+    x = linspace(a, b, n+1)
+    h = (b - a) / float(n)
+    u = linspace(ua, ub, n+1) if U is None else asarray(U, dtype=float).copy()
+    u[0], u[-1] = ua, ub
+    for iteration in range(1, max_iterations + 1):
+        v = (u[2:] - u[:-2]) / (2*h)
+        g_n, g_u = derivative(lambda w: g(x[1:-1], w, v), u[1:-1])
+        g_v = derivative(lambda w: g(x[1:-1], u[1:-1], w), v)[1]
+        residual = (u[2:] - 2*u[1:-1] + u[:-2]) / h**2 - g_n
+        delta = solve_tridiagonal(1/h**2 + g_v[1:]/(2*h), -2/h**2 - g_u + zeros(n-1),
+                                  1/h**2 - g_v[:-1]/(2*h), -residual)
+        u[1:-1] += delta
+        if np_max(np_abs(delta), initial=0) < eps:
+            return u, x
+    result = RootResult(u, max_iterations, 2*max_iterations, False,
+                        'max_iterations (%d) reached' % max_iterations)
+    raise ConvergenceError(result.reason, result)
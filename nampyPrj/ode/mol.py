@@ -0,0 +1,271 @@
+from numpy import (zeros, empty, full, asarray, atleast_1d, add, subtract, multiply)
+from nampyPrj.ode.ode import _time_grid, _saved_points
+from nampyPrj.root.root import ConvergenceError
+from nampyPrj.utils.linalg import factor_tridiagonal, solve_factored_tridiagonal, solve_cg
+from nampyPrj.utils.instrument import profiled
+
+BOUNDARY_CONDITIONS = ('dirichlet', 'neumann', 'periodic')
+
+
+def _along(axis, ndim, index):
+    """ Index selecting the slice index along axis and everything along the other axes """
+    return (slice(None),)*axis + (index,) + (slice(None),)*(ndim - axis - 1)
+
+
+class Laplacian:
+    r"""
+    Second order finite difference Laplacian on a uniform 1-D or 2-D grid, applied
+    matrix-free: only the stencil coefficients and one scratch array are stored.
+
+    .. math ::
+        (L u)_{i,j} = \frac{u_{i+1,j} - 2u_{i,j} + u_{i-1,j}}{\Delta x^2}
+                    + \frac{u_{i,j+1} - 2u_{i,j} + u_{i,j-1}}{\Delta y^2}
+
+    The grid holds the unknowns only. Boundary conditions:
+
+    - 'dirichlet': u = 0 one step beyond the first and last points
+    - 'neumann': zero flux half a step beyond the first and last points (cell-centred grid)
+    - 'periodic': the last point is followed by the first one
+
+    The operator is symmetric negative (semi-)definite for the three conditions.
+    Non-homogeneous conditions are imposed through a source term.
+
+    :param shape: Number of points along each axis
+    :param spacing: Grid spacing (one value, or one per axis)
+    :param str bc: Boundary condition
+    """
+    def __init__(self, shape, spacing, bc='dirichlet'):
+        if bc not in BOUNDARY_CONDITIONS:
+            raise ValueError('bc must be one of %s' % ', '.join(BOUNDARY_CONDITIONS))
+        self.shape = tuple(int(n) for n in atleast_1d(shape))
+        self.ndim = len(self.shape)
+        self.spacing = tuple(float(h) for h in atleast_1d(spacing)) * (
+            self.ndim if len(atleast_1d(spacing)) == 1 else 1)
+        self.bc = bc
+        self._coefficients = [1 / h**2 for h in self.spacing]
+        self._scratch = empty(self.shape)
+
+    def __call__(self, u, out=None):
+        """
+        L u, written into out
+
+        :param u: Values at the grid points
+        :param out: Output array. If None a new array is returned
+        """
+        u = asarray(u).reshape(self.shape)
+        if out is None:
+            out = empty(self.shape)
+        scratch = self._scratch
+        multiply(u, -2*sum(self._coefficients), out=out)
+        for axis, c in enumerate(self._coefficients):
+            lo = _along(axis, self.ndim, slice(None, -1))
+            hi = _along(axis, self.ndim, slice(1, None))
+            first = _along(axis, self.ndim, slice(0, 1))
+            last = _along(axis, self.ndim, slice(-1, None))
+            # Left and right neighbours
+            multiply(u[lo], c, out=scratch[hi])
+            add(out[hi], scratch[hi], out=out[hi])
+            multiply(u[hi], c, out=scratch[lo])
+            add(out[lo], scratch[lo], out=out[lo])
+            if self.bc == 'periodic':
+                multiply(u[last], c, out=scratch[first])
+                multiply(u[first], c, out=scratch[last])
+            elif self.bc == 'neumann':
+                multiply(u[first], c, out=scratch[first])
+                multiply(u[last], c, out=scratch[last])
+            if self.bc != 'dirichlet':
+                add(out[first], scratch[first], out=out[first])
+                add(out[last], scratch[last], out=out[last])
+        return out
+
+    def bands(self):
+        """ Sub-diagonal, diagonal and super-diagonal of the matrix of a 1-D Laplacian with
+        Dirichlet or Neumann conditions (see solve_tridiagonal) """
+        if self.ndim != 1 or self.bc == 'periodic':
+            raise ValueError('the matrix is tridiagonal for 1-D non periodic grids only')
+        n = self.shape[0]
+        c = self._coefficients[0]
+        diagonal = full(n, -2*c)
+        if self.bc == 'neumann':
+            diagonal[[0, -1]] = -c
+        return full(n - 1, c), diagonal, full(n - 1, c)
+
+
+class Gradient:
+    r"""
+    Second order central finite difference derivative along one axis of a uniform 1-D or
+    2-D grid, with the boundary conditions of Laplacian
+
+    .. math ::
+        (D u)_i = \frac{u_{i+1} - u_{i-1}}{2 \Delta x}
+
+    :param shape: Number of points along each axis
+    :param spacing: Grid spacing (one value, or one per axis)
+    :param int axis: Axis of the derivative
+    :param str bc: Boundary condition
+    """
+    def __init__(self, shape, spacing, axis=0, bc='dirichlet'):
+        if bc not in BOUNDARY_CONDITIONS:
+            raise ValueError('bc must be one of %s' % ', '.join(BOUNDARY_CONDITIONS))
+        self.shape = tuple(int(n) for n in atleast_1d(shape))
+        self.ndim = len(self.shape)
+        spacing = atleast_1d(spacing)
+        self.h = float(spacing[axis] if len(spacing) > 1 else spacing[0])
+        self.axis = axis
+        self.bc = bc
+
+    def __call__(self, u, out=None):
+        """
+        D u, written into out
+
+        :param u: Values at the grid points
+        :param out: Output array. If None a new array is returned
+        """
+        u = asarray(u).reshape(self.shape)
+        if out is None:
+            out = empty(self.shape)
+        index = lambda i: _along(self.axis, self.ndim, i)
+        subtract(u[index(slice(2, None))], u[index(slice(None, -2))],
+                 out=out[index(slice(1, -1))])
+        first, second = index(slice(0, 1)), index(slice(1, 2))
+        last, second_last = index(slice(-1, None)), index(slice(-2, -1))
+        if self.bc == 'dirichlet':
+            out[first] = u[second]
+            multiply(u[second_last], -1, out=out[last])
+        elif self.bc == 'neumann':
+            subtract(u[second], u[first], out=out[first])
+            subtract(u[last], u[second_last], out=out[last])
+        else:
+            subtract(u[second], u[last], out=out[first])
+            subtract(u[first], u[second_last], out=out[last])
+        multiply(out, 0.5/self.h, out=out)
+        return out
+
+
+class AdvectionDiffusion:
+    r"""
+    Method of lines right-hand side of the advection-diffusion equation on a uniform 1-D or
+    2-D grid
+
+    .. math ::
+        \frac{\partial u}{\partial t} = \alpha \nabla^2 u - \mathbf{v} \cdot \nabla u + s(t)
+
+    The instance is the function f(u, t) of the ODE system, to be passed to the explicit
+    solvers (ode_system_FE, ode_RK4) with U0 of the grid shape, or to mol_theta. The
+    operators are applied with preallocated buffers; with out given no array is allocated,
+    so use the solvers with inplace=True.
+
+    :param shape: Number of points along each axis
+    :param spacing: Grid spacing (one value, or one per axis)
+    :param float alpha: Diffusion coefficient
+    :param velocity: Advection velocity along each axis (constants or arrays of the grid
+                     shape). If None pure diffusion
+    :param source: Source term, array of the grid shape or function s(t)
+    :param str bc: Boundary condition (see Laplacian)
+    """
+    def __init__(self, shape, spacing, alpha=1.0, velocity=None, source=None, bc='dirichlet'):
+        self.laplacian = Laplacian(shape, spacing, bc)
+        self.shape = self.laplacian.shape
+        self.alpha = alpha
+        self.velocity = None if velocity is None else list(velocity)
+        self.gradients = [] if velocity is None else [
+            Gradient(shape, spacing, axis, bc) for axis in range(self.laplacian.ndim)]
+        self.source = source
+        self._scratch = empty(self.shape)
+
+    def _evaluate(self, u, t, out, diffusion=1.0, source=True):
+        if out is None:
+            out = empty(self.shape)
+        self.laplacian(u, out)
+        multiply(out, diffusion*self.alpha, out=out)
+        if self.velocity is not None:
+            for v, gradient in zip(self.velocity, self.gradients):
+                gradient(u, self._scratch)
+                multiply(self._scratch, v, out=self._scratch)
+                subtract(out, self._scratch, out=out)
+        if source and self.source is not None:
+            add(out, self.source(t) if callable(self.source) else self.source, out=out)
+        return out
+
+    def __call__(self, u, t, out=None):
+        """
+        Right-hand side at the state u and time t, written into out
+
+        :param u: Values at the grid points
+        :param float t: Time
+        :param out: Output array. If None a new array is returned
+        """
+        return self._evaluate(u, t, out)
+
+
+@profiled
+def mol_theta(system, U0, dt, T, theta=0.5, eps=1E-10, t0=0.0, save_every=1):
+    r"""
+    Theta method for the method of lines system of an AdvectionDiffusion problem: the
+    diffusion is implicit, the advection explicit (IMEX scheme)
+
+    .. math ::
+        (I - \theta \Delta t \alpha L) u^{n+1} = u^n + \Delta t \left[ (1 - \theta) \alpha L u^n
+        - \mathbf{v} \cdot \nabla u^n + \theta s(t_{n+1}) + (1 - \theta) s(t_n) \right]
+
+    theta = 1 is Backward Euler, theta = 0.5 Crank-Nicolson. The linear system is solved with
+    the Thomas algorithm for 1-D non periodic grids, factored once per time step size and
+    solved in place, otherwise with matrix-free conjugate gradients started from u^n.
+
+    :param AdvectionDiffusion system: Right-hand side
+    :param U0: Initial value (array of the grid shape)
+    :param float dt: Time step
+    :param float T: Final time
+    :param float theta: Implicitness of the diffusion (0.5 to 1)
+    :param float eps: Relative tolerance of the conjugate gradients
+    :param float t0: Initial time
+    :param int save_every: Return the solution every save_every time steps (and at the final
+                           time)
+    :raises ConvergenceError: If the conjugate gradients do not converge in a step
+    """
+    t, steps, indices = _time_grid(dt, T, t0)
+    store = _saved_points(len(t), None, save_every)
+    u = zeros((store.sum(),) + system.shape)
+    u_n = zeros(system.shape)
+    u_n[...] = U0
+    b = empty(system.shape)
+    source = empty(system.shape)
+    k = 0
+    if store[0]:
+        u[0] = u_n
+        k = 1
+    L = system.laplacian
+    thomas = L.ndim == 1 and L.bc != 'periodic'
+    if thomas:
+        lower, diagonal, upper = L.bands()
+        factors = {}
+    for n, dt_n in enumerate(steps):
+        # Explicit part
+        system._evaluate(u_n, t[n], b, diffusion=1 - theta, source=False)
+        multiply(b, dt_n, out=b)
+        add(b, u_n, out=b)
+        if system.source is not None:
+            for weight, t_s in ((1 - theta, t[n]), (theta, t[n+1])):
+                source[...] = system.source(t_s) if callable(system.source) else system.source
+                multiply(source, weight*dt_n, out=source)
+                add(b, source, out=b)
+
+        # Implicit diffusion
+        c = theta*dt_n*system.alpha
+        if thomas:
+            if dt_n not in factors:
+                factors[dt_n] = factor_tridiagonal(-c*lower, 1 - c*diagonal, -c*upper)
+            solve_factored_tridiagonal(factors[dt_n], b, out=u_n)
+        else:
+            def apply(p, out):
+                L(p, out)
+                multiply(out, -c, out=out)
+                add(out, p, out=out)
+            x, iterations = solve_cg(apply, b, u_n, eps)
+            if iterations < 0:
+                raise ConvergenceError('conjugate gradients did not converge at t=%g' % t[n+1])
+            u_n[...] = x
+        if store[n+1]:
+            u[k] = u_n
+            k += 1
+    return u, t[store]
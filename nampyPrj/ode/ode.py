@@ -1,7 +1,90 @@
-from numpy import linspace, zeros, asarray
-
-
-def ode_FE(f, U0, dt, T):
+from numpy import (linspace, zeros, asarray, eye, shape, float64, full, diff, arange, append,
+                   atleast_1d, searchsorted, clip, where, union1d, unique, allclose, empty,
+                   add, subtract, multiply, dtype as np_dtype)
+try:
+    from scipy.signal import lfilter, lfiltic
+except ImportError:  # optional, used for the linear recurrence of ode_EulerCromer
+    lfilter = lfiltic = None
+from nampyPrj.root.root import root_Newton_system
+from nampyPrj.utils.autodiff import stack
+from nampyPrj.utils.instrument import profiled
+
+
+def _compensated_add(u, increment, c, dtype):
+    """ Kahan-compensated u + increment in the precision dtype, returns the sum and the new
+    compensation c """
+    y = asarray(increment, dtype=dtype) - c
+    s = u + y
+    return s, (s - u) - y
+
+
+def _compensated_update(u, increment, c, scratch):
+    """ In-place Kahan-compensated u += increment, updating the compensation c. increment is
+    overwritten and scratch is a work array of the same shape """
+    subtract(increment, c, out=increment)
+    add(u, increment, out=scratch)
+    subtract(scratch, u, out=c)
+    subtract(c, increment, out=c)
+    u[...] = scratch
+
+
+def _time_grid(dt, T, t0=0.0, t=None, t_eval=None):
+    """ Time points of a solver and the list of the steps between them: the uniform grid of
+    step dt from t0 to T, or the user grid t, with the output times t_eval inserted. Also
+    returns the indices of the output times in the grid (None if t_eval is None) """
+    if t is None:
+        Nt = int(round(float(T - t0)/dt))
+        t = linspace(t0, t0 + Nt*dt, Nt+1)
+        steps = full(Nt, float(dt))
+    else:
+        t = asarray(t, dtype=float64)
+        steps = diff(t)
+        if t.ndim != 1 or (steps <= 0).any():
+            raise ValueError('the time grid must be a strictly increasing 1-D array')
+    if t_eval is None:
+        return t, steps.tolist(), None
+
+    t_eval = atleast_1d(asarray(t_eval, dtype=float64))
+    tol = 1E-6*steps.min() if len(steps) else 0.0
+    if (t_eval < t[0] - tol).any() or (t_eval > t[-1] + tol).any():
+        raise ValueError('the output times must be within [%g, %g]' % (t[0], t[-1]))
+    # Output times (almost) on the grid are snapped to it, the others are inserted
+    right = clip(searchsorted(t, t_eval), 0, len(t) - 1)
+    left = clip(right - 1, 0, len(t) - 1)
+    nearest = where(abs(t[left] - t_eval) < abs(t[right] - t_eval), left, right)
+    on_grid = abs(t[nearest] - t_eval) <= tol
+    t_eval = where(on_grid, t[nearest], t_eval)
+    if not on_grid.all():
+        t = union1d(t, t_eval)
+        steps = diff(t)
+    return t, steps.tolist(), unique(searchsorted(t, t_eval))
+
+
+def _saved_points(n_points, indices=None, save_every=1):
+    """ Mask of the time points stored by a solver: the output times, or every save_every-th
+    point and the last one """
+    if indices is None:
+        indices = arange(0, n_points, save_every)
+        if indices[-1] != n_points - 1:
+            indices = append(indices, n_points - 1)
+    store = zeros(n_points, dtype=bool)
+    store[indices] = True
+    return store
+
+
+def _propagate(solver, f, U, t_start, t_end, dt, full=False):
+    """ State at t_end of the solution starting from U at t_start, computed by solver on a
+    uniform grid of step close to dt, or the whole solution (u, t) if full. Module-level, so
+    it can be sent to worker processes """
+    n = max(1, int(round((t_end - t_start)/dt)))
+    if full:
+        return solver(f, U, None, None, t=linspace(t_start, t_end, n+1))
+    return solver(f, U, None, None, t=linspace(t_start, t_end, n+1), t_eval=t_end)[0][-1]
+
+
+@profiled
+def ode_FE(f, U0, dt, T, trace=None, dtype=float64, compensated=False, t0=0.0, t=None,
+           t_eval=None, save_every=1):
     r"""
     Forward Euler method (forward difference) to compute the solution of first order ODE
 
@@ -16,38 +99,216 @@ def ode_FE(f, U0, dt, T):
     :param list[int] U0: Initial value
     :param float dt: Time step
     :param float T: Final time
+    :param IterationTrace trace: Recorder of the state u^n, f(u^n, t_n) and the time step
+                                 of each step
+    :param dtype: Data type of the solution (e.g. float32 to halve memory and bandwidth)
+    :param bool compensated: Kahan-compensated accumulation of the increments, recovers most
+                             of the accuracy lost by a low precision dtype
+    :param float t0: Initial time
+    :param t: Time points of a non-uniform grid. If given dt, T and t0 are ignored
+    :param t_eval: Times at which the solution is returned (inserted in the grid if needed)
+    :param int save_every: Return the solution every save_every time steps (and at the final
+                           time). Ignored if t_eval is given
     """
-
-    Nt = int(round(float(T)/dt))
-    u = zeros(Nt+1)
-    t = linspace(0, Nt*dt, len(u))
-    u[0] = U0
-    for n in range(Nt):
-        u[n+1] = u[n] + dt*f(u[n], t[n])
-
-    return u, t
-
-
-def ode_system_FE(f, U0, dt, T):
+    t, steps, indices = _time_grid(dt, T, t0, t, t_eval)
+    store = _saved_points(len(t), indices, save_every)
+    u = zeros(store.sum(), dtype=dtype)
+    u_n = zeros((), dtype=dtype)
+    u_n[...] = U0
+    k = 0
+    if store[0]:
+        u[0] = u_n
+        k = 1
+    c = zeros((), dtype=dtype)
+    for n, dt_n in enumerate(steps):
+        f_n = f(u_n[()], t[n])
+        if trace is not None:
+            trace.record(u_n[()], f_n, dt_n)
+        if compensated:
+            u_n[...], c = _compensated_add(u_n, dt_n*f_n, c, dtype)
+        else:
+            u_n[...] = u_n[()] + dt_n*f_n
+        if store[n+1]:
+            u[k] = u_n
+            k += 1
+
+    return u, t[store]
+
+
+@profiled
+def ode_system_FE(f, U0, dt, T, trace=None, dtype=float64, compensated=False, t0=0.0, t=None,
+                  t_eval=None, save_every=1, inplace=False):
     """
-    Forward Euler method to compute the solution of system of first order ODE
+    Forward Euler method to compute the solution of system of first order ODE.
+    U0 can also be a 2-D array holding an ensemble of initial states, f then receives
+    and returns arrays of that shape.
+
+    The update runs on preallocated arrays; with inplace=True f writes its value into the
+    array out passed as third argument, f(u, t, out), and no array is allocated per step.
 
     :param f: Array of functions
     :param float U0: Initial value
     :param float dt: Time step
     :param float T: Final time
+    :param IterationTrace trace: Recorder of the state u^n, f(u^n, t_n) and the time step
+                                 of each step
+    :param dtype: Data type of the solution (e.g. float32 to halve memory and bandwidth)
+    :param bool compensated: Kahan-compensated accumulation of the increments, recovers most
+                             of the accuracy lost by a low precision dtype
+    :param float t0: Initial time
+    :param t: Time points of a non-uniform grid. If given dt, T and t0 are ignored
+    :param t_eval: Times at which the solution is returned (inserted in the grid if needed)
+    :param int save_every: Return the solution every save_every time steps (and at the final
+                           time). Ignored if t_eval is given
+    :param bool inplace: f has the in-place signature f(u, t, out)
     """
-    Nt = int(round(float(T)/dt))
-    f_ = lambda u, t: asarray(f(u, t))  # convert user function in array
-    u = zeros((Nt+1, len(U0)))
-    t = linspace(0, Nt*dt, len(u))
-    u[0] = U0
-    for n in range(Nt):
-        u[n+1] = u[n] + dt*f_(u[n], t[n])
-    return u, t
+    t, steps, indices = _time_grid(dt, T, t0, t, t_eval)
+    store = _saved_points(len(t), indices, save_every)
+    u = zeros((store.sum(),) + shape(U0), dtype=dtype)
+    u_n = zeros(shape(U0), dtype=dtype)
+    u_n[...] = U0
+    k = 0
+    if store[0]:
+        u[0] = u_n
+        k = 1
+    f_n = empty(shape(U0), dtype=dtype)
+    increment = empty(shape(U0), dtype=dtype)
+    scratch = empty(shape(U0), dtype=dtype)
+    c = zeros(shape(U0), dtype=dtype)
+    for n, dt_n in enumerate(steps):
+        if inplace:
+            f(u_n, t[n], f_n)
+        else:
+            f_n[...] = f(u_n, t[n])
+        if trace is not None:
+            trace.record(u_n, f_n, dt_n)
+        multiply(f_n, dt_n, out=increment)
+        if compensated:
+            _compensated_update(u_n, increment, c, scratch)
+        else:
+            add(u_n, increment, out=u_n)
+        if store[n+1]:
+            u[k] = u_n
+            k += 1
+    return u, t[store]
+
+
+@profiled
+def ode_system_BE(f, U0, dt, T, J=None, eps=1E-10, max_iterations=50, t0=0.0, t=None,
+                  t_eval=None, save_every=1):
+    r"""
+    Backward Euler method to compute the solution of system of first order ODE.
+    The implicit equation of each step is solved with Newton's method
 
+    .. math ::
+        u^{n+1} - \Delta t f(u^{n+1}, t_{n+1}) = u^n
 
-def ode_EulerCromer(f, s, F, m, T, U0, V0, dt):
+    :param f: Array of functions
+    :param U0: Initial value
+    :param float dt: Time step
+    :param float T: Final time
+    :param J: Jacobian of f with respect to u, J(u, t). If None it is computed
+              by automatic differentiation (f must use NumPy functions)
+    :param float eps: Tolerance of the Newton iterations
+    :param int max_iterations: Max number of Newton iterations per step
+    :param float t0: Initial time
+    :param t: Time points of a non-uniform grid. If given dt, T and t0 are ignored
+    :param t_eval: Times at which the solution is returned (inserted in the grid if needed)
+    :param int save_every: Return the solution every save_every time steps (and at the final
+                           time). Ignored if t_eval is given
+    :raises ConvergenceError: If Newton's method does not converge in a step
+    """
+    t, steps, indices = _time_grid(dt, T, t0, t, t_eval)
+    store = _saved_points(len(t), indices, save_every)
+    u = zeros((store.sum(), len(U0)))
+    I = eye(len(U0))
+    u_n = asarray(U0, dtype=float64)
+    k = 0
+    if store[0]:
+        u[0] = u_n
+        k = 1
+    for n, dt_n in enumerate(steps):
+        if J is None:
+            G = lambda v: v - u_n - dt_n*stack(f(v, t[n+1]))
+            J_G = 'autodiff'
+        else:
+            G = lambda v: v - u_n - dt_n*asarray(f(v, t[n+1]))
+            J_G = lambda v: I - dt_n*asarray(J(v, t[n+1]))
+        u_n = root_Newton_system(G, u_n, J_G, eps, max_iterations, raise_on_failure=True)[0]
+        if store[n+1]:
+            u[k] = u_n
+            k += 1
+    return u, t[store]
+
+
+def _on_grid(values, t, name):
+    """ Values of a coefficient or forcing term at the time points, from a constant or an
+    array of values on the grid """
+    values = asarray(values, dtype=float64)
+    if values.shape not in ((), t.shape):
+        raise ValueError('%s has %d values, the time grid has %d points' % (name, values.size,
+                                                                            len(t)))
+    return zeros(len(t)) + values
+
+
+def _vectorized_forcing(F, t, vectorized_F=False):
+    """ Values of the forcing term at all the time points, computed in one call, or None if F
+    has to be evaluated step by step. With vectorized_F None, F is tried on the grid and the
+    result is checked against scalar calls at the end points; any error falls back to the
+    evaluation step by step """
+    if not callable(F):
+        return _on_grid(F, t, 'F')
+    if vectorized_F is None:
+        try:
+            F_t = _on_grid(F(t), t, 'F')
+        except Exception:
+            return None
+        return F_t if allclose(F_t[[0, -1]], [F(t[0]), F(t[-1])], rtol=1E-12) else None
+    if vectorized_F:
+        return _on_grid(F(t), t, 'F')
+    return None
+
+
+def _linear_EulerCromer(b, k, F_t, m, steps, U0, V0, store):
+    """ Euler-Cromer scheme for a linear damping b v and spring k u, with the coefficients
+    and the forcing term given on the grid. No user function is called: with constant
+    coefficients and step the scheme is run as a linear recurrence in compiled code
+    (scipy.signal.lfilter if available), otherwise as a loop on plain floats """
+    Nt = len(steps)
+    if (lfilter is not None and Nt > 1 and steps.count(steps[0]) == Nt
+            and b.min() == b.max() and k.min() == k.max()):
+        dt = steps[0]
+        a = dt/m
+        u = zeros(Nt+1)
+        u[0] = U0
+        u[1] = U0 + dt*(V0 + a*(F_t[0] - b[0]*V0 - k[0]*U0))
+        # Eliminating v: u^{n+1} - (2 - ab - a k dt) u^n + (1 - ab) u^{n-1} = a dt F^n
+        denominator = [1., -(2 - a*b[0] - a*k[0]*dt), 1 - a*b[0]]
+        u[2:] = lfilter([1.], denominator, a*dt*F_t[1:Nt],
+                        zi=lfiltic([1.], denominator, [u[1], u[0]]))[0]
+        v = zeros(Nt+1)
+        v[0] = V0
+        v[1:] = diff(u)/dt
+        return u[store], v[store]
+
+    F_t, b, k, saved = F_t.tolist(), b.tolist(), k.tolist(), store.tolist()
+    u_n, v_n = float(U0), float(V0)
+    u_saved, v_saved = [], []
+    if saved[0]:
+        u_saved.append(u_n)
+        v_saved.append(v_n)
+    for n, dt_n in enumerate(steps):
+        v_n = v_n + dt_n*(1./m)*(F_t[n] - b[n]*v_n - k[n]*u_n)
+        u_n = u_n + dt_n*v_n
+        if saved[n+1]:
+            u_saved.append(u_n)
+            v_saved.append(v_n)
+    return asarray(u_saved), asarray(v_saved)
+
+
+@profiled
+def ode_EulerCromer(f, s, F, m, T, U0, V0, dt, dtype=float64, compensated=False, t0=0.0, t=None,
+                    t_eval=None, save_every=1, vectorized_F=False):
     r"""
     Semi-implicit Euler or Euler-Cromer method to compute the solution of second order ODE
     (Forward difference for the first equation and backward difference for the second equation)
@@ -61,31 +322,75 @@ def ode_EulerCromer(f, s, F, m, T, U0, V0, dt):
 
             u^{n+1} = u^n + \Delta t v^{n+1}
 
-    :param f: Function - Damping force
-    :param s: Function - Elastic force
-    :param F: Function - External force
+    With vectorized_F, F is evaluated on the whole time grid in one call. If f and s are given
+    as coefficients (linear damping b u' and spring k u) and F is vectorized or given as an
+    array, the scheme runs without any call of user functions.
+
+    :param f: Function - Damping force, or damping coefficient b (constant or array of its
+              values at the time points of the grid)
+    :param s: Function - Elastic force, or spring coefficient k (constant or array of its
+              values at the time points of the grid)
+    :param F: Function - External force, or array of its values at the time points of the grid
     :param float m: Mass
     :param float T: Final time
     :param float U0: Initial value for u
     :param float V0: Initial value for u'
     :param float dt: Time step
+    :param dtype: Data type of the solution (e.g. float32 to halve memory and bandwidth)
+    :param bool compensated: Kahan-compensated accumulation of the increments, recovers most
+                             of the accuracy lost by a low precision dtype
+    :param float t0: Initial time
+    :param t: Time points of a non-uniform grid. If given dt, T and t0 are ignored
+    :param t_eval: Times at which the solution is returned (inserted in the grid if needed)
+    :param int save_every: Return the solution every save_every time steps (and at the final
+                           time). Ignored if t_eval is given
+    :param bool vectorized_F: True if F accepts an array of times, False to evaluate it at
+                              each time step. If None it is detected by calling F on the grid
+                              (F must then have no side effects)
     """
-    Nt = int(round(T/dt))
-    t = linspace(0, Nt*dt, Nt+1)
-
-    u = zeros(Nt+1)
-    v = zeros(Nt+1)
-
-    u[0] = U0
-    v[0] = V0
-
-    for n in range(Nt):
-        v[n+1] = v[n] + dt*(1./m)*(F(t[n]) - f(v[n]) - s(u[n]))
-        u[n+1] = u[n] + dt*v[n+1]
-    return u, v, t
-
-
-def ode_RK2(X0, omega, dt, T):
+    t, steps, indices = _time_grid(dt, T, t0, t, t_eval)
+    store = _saved_points(len(t), indices, save_every)
+    F_t = _vectorized_forcing(F, t, vectorized_F)
+    b = None if callable(f) else _on_grid(f, t, 'f')
+    k = None if callable(s) else _on_grid(s, t, 's')
+    if (F_t is not None and b is not None and k is not None and not compensated
+            and np_dtype(dtype) == float64):
+        u, v = _linear_EulerCromer(b, k, F_t, m, steps, U0, V0, store)
+        return u, v, t[store]
+    damping = f if b is None else (lambda v: b[n]*v)
+    spring = s if k is None else (lambda u: k[n]*u)
+
+    u = zeros(store.sum(), dtype=dtype)
+    v = zeros(store.sum(), dtype=dtype)
+    u_n = zeros((), dtype=dtype)
+    v_n = zeros((), dtype=dtype)
+    u_n[...] = U0
+    v_n[...] = V0
+    j = 0
+    if store[0]:
+        u[0] = u_n
+        v[0] = v_n
+        j = 1
+
+    c_u = c_v = zeros((), dtype=dtype)
+    for n, dt_n in enumerate(steps):
+        F_n = F(t[n]) if F_t is None else F_t[n]
+        if compensated:
+            dv = dt_n*(1./m)*(F_n - damping(v_n[()]) - spring(u_n[()]))
+            v_n[...], c_v = _compensated_add(v_n, dv, c_v, dtype)
+            u_n[...], c_u = _compensated_add(u_n, dt_n*v_n[()], c_u, dtype)
+        else:
+            v_n[...] = v_n[()] + dt_n*(1./m)*(F_n - damping(v_n[()]) - spring(u_n[()]))
+            u_n[...] = u_n[()] + dt_n*v_n[()]
+        if store[n+1]:
+            u[j] = u_n
+            v[j] = v_n
+            j += 1
+    return u, v, t[store]
+
+
+@profiled
+def ode_RK2(X0, omega, dt, T, dtype=float64, t0=0.0, t=None, t_eval=None, save_every=1):
     r"""
     2nd-order Rugge-Kutta method (RK2) to compute the solution of second order ODE
     of oscillating systems (Centered finite difference)
@@ -99,32 +404,49 @@ def ode_RK2(X0, omega, dt, T):
     :param float omega: Damping factor
     :param float dt: Time step
     :param float T: Final time
+    :param dtype: Data type of the solution
+    :param float t0: Initial time
+    :param t: Time points of a non-uniform grid. If given dt, T and t0 are ignored
+    :param t_eval: Times at which the solution is returned (inserted in the grid if needed)
+    :param int save_every: Return the solution every save_every time steps (and at the final
+                           time). Ignored if t_eval is given
     """
-    Nt = int(round(T / dt))
-    u = zeros(Nt + 1)
-    v = zeros(Nt + 1)
-    t = linspace(0, Nt * dt, Nt + 1)
+    t, steps, indices = _time_grid(dt, T, t0, t, t_eval)
+    store = _saved_points(len(t), indices, save_every)
+    u = zeros(store.sum(), dtype=dtype)
+    v = zeros(store.sum(), dtype=dtype)
 
     # Initial condition
-    u[0] = X0
-    v[0] = 0
+    u_n = zeros((), dtype=dtype)
+    v_n = zeros((), dtype=dtype)
+    u_n[...] = X0
+    k = 0
+    if store[0]:
+        u[0] = u_n
+        k = 1
 
     # Step equations forward in time
-    for n in range(Nt):
-        u_star = u[n] + dt * v[n]
-        v_star = v[n] - dt * omega ** 2 * u[n]
-        u[n + 1] = u[n] + 0.5 * dt * (v[n] + v_star)
-        v[n + 1] = v[n] - 0.5 * dt * omega ** 2 * (u[n] + u_star)
-    return u, v, t
-
-
-def ode_RK4():
+    for n, dt_n in enumerate(steps):
+        u_star = u_n[()] + dt_n * v_n[()]
+        v_star = v_n[()] - dt_n * omega ** 2 * u_n[()]
+        u_n[...], v_n[...] = (u_n[()] + 0.5 * dt_n * (v_n[()] + v_star),
+                              v_n[()] - 0.5 * dt_n * omega ** 2 * (u_n[()] + u_star))
+        if store[n+1]:
+            u[k] = u_n
+            v[k] = v_n
+            k += 1
+    return u, v, t[store]
+
+
+@profiled
+def ode_RK4(f, U0, dt, T, trace=None, t0=0.0, t=None, t_eval=None, save_every=1,
+            inplace=False):
     r"""
     4th-order Rugge-Kutta method to compute the solution of first order ODE
     (Combination of forward, backward and central difference schemes)
 
     .. math ::
-        u^{n+1} = u^n + \frac{\Delta t}{6}(f^n + 2*\hat{f}^{n+1/2} + 2*\tilde{f}^{n+1/2} + \overline{f}^{n+1}
+        u^{n+1} = u^n + \frac{\Delta t}{6}(f^n + 2*\hat{f}^{n+1/2} + 2*\tilde{f}^{n+1/2} + \overline{f}^{n+1})
 
         where
 
@@ -132,12 +454,74 @@ def ode_RK4():
 
         \tilde{f}^{n+1/2} = f(u^n + \frac{1}{2}\Delta t \hat{f}^{n+1/2}, t_{n+1/2})
 
-        \overline{f}^{n+1} = f(u^n + \frac{1}{2}\Delta t \tilde{f}^{n+1/2}, t_{n+1})
-    """
-    #TODO
+        \overline{f}^{n+1} = f(u^n + \Delta t \tilde{f}^{n+1/2}, t_{n+1})
 
+    U0 can be a scalar, the initial state of a system or an ensemble of states (see
+    ode_system_FE). The stages run on preallocated arrays; with inplace=True f has the
+    in-place signature f(u, t, out) and no array is allocated per step. The array u passed
+    to f is reused between the calls.
 
-def ode_Stormer(U0, omega, dt, T):
+    :param f: Function or array of functions
+    :param U0: Initial value
+    :param float dt: Time step
+    :param float T: Final time
+    :param IterationTrace trace: Recorder of the state u^n, f(u^n, t_n) and the time step
+                                 of each step
+    :param float t0: Initial time
+    :param t: Time points of a non-uniform grid. If given dt, T and t0 are ignored
+    :param t_eval: Times at which the solution is returned (inserted in the grid if needed)
+    :param int save_every: Return the solution every save_every time steps (and at the final
+                           time). Ignored if t_eval is given
+    :param bool inplace: f has the in-place signature f(u, t, out)
+    """
+    t, steps, indices = _time_grid(dt, T, t0, t, t_eval)
+    store = _saved_points(len(t), indices, save_every)
+    u = zeros((store.sum(),) + shape(U0))
+    u_n = zeros(shape(U0))
+    u_n[...] = U0
+    k = 0
+    if store[0]:
+        u[0] = u_n
+        k = 1
+
+    # Stage values and work array, allocated once
+    f_n, f_hat, f_tilde, f_bar, stage = (empty(shape(U0)) for i in range(5))
+    if inplace:
+        evaluate = f
+    else:
+        def evaluate(u, t, out):
+            out[...] = f(u, t)
+
+    for n, dt_n in enumerate(steps):
+        t_half = t[n] + 0.5*dt_n
+        evaluate(u_n, t[n], f_n)
+        if trace is not None:
+            trace.record(u_n[()], f_n, dt_n)
+        multiply(f_n, 0.5*dt_n, out=stage)
+        add(u_n, stage, out=stage)
+        evaluate(stage, t_half, f_hat)
+        multiply(f_hat, 0.5*dt_n, out=stage)
+        add(u_n, stage, out=stage)
+        evaluate(stage, t_half, f_tilde)
+        multiply(f_tilde, dt_n, out=stage)
+        add(u_n, stage, out=stage)
+        evaluate(stage, t[n+1], f_bar)
+        # u^{n+1} = u^n + dt/6 (f^n + 2 f_hat + 2 f_tilde + f_bar)
+        multiply(f_hat, 2, out=stage)
+        add(f_n, stage, out=stage)
+        multiply(f_tilde, 2, out=f_tilde)
+        add(stage, f_tilde, out=stage)
+        add(stage, f_bar, out=stage)
+        multiply(stage, dt_n/6., out=stage)
+        add(u_n, stage, out=u_n)
+        if store[n+1]:
+            u[k] = u_n
+            k += 1
+    return u, t[store]
+
+
+@profiled
+def ode_Stormer(U0, omega, dt, T, dtype=float64, t0=0.0, save_every=1):
     r"""
     Stormer's method to compute the solution of second order ODE of oscillatory systems
 
@@ -152,18 +536,34 @@ def ode_Stormer(U0, omega, dt, T):
 
         u^{n+1} = 2*u^n - u^{n-1} - \Delta t^2 * \omega^2 * u^n
 
+    The three-level scheme needs a uniform grid, so only the output subsampling is available.
+
     :param float U0: Initial value for u
     :param float omega: Damping factor
     :param float dt: Time step
     :param float T: Final time
+    :param dtype: Data type of the solution
+    :param float t0: Initial time
+    :param int save_every: Return the solution every save_every time steps (and at the final
+                           time)
     """
     dt = float(dt)
-    Nt = int(round(T/dt))
-    u = zeros(Nt+1)
-    t = linspace(0, Nt*dt, Nt+1)
-
-    u[0] = U0
-    u[1] = u[0] - 0.5*dt**2*omega**2*u[0]
-    for n in range(1, Nt):
-        u[n+1] = 2*u[n] - u[n-1] - dt**2*omega**2*u[n]
-    return u, t
+    t, steps, indices = _time_grid(dt, T, t0)
+    store = _saved_points(len(t), None, save_every)
+    u = zeros(store.sum(), dtype=dtype)
+    u_n = zeros((), dtype=dtype)
+    u_prev = zeros((), dtype=dtype)
+
+    u_prev[...] = U0
+    u_n[...] = u_prev[()] - 0.5*dt**2*omega**2*u_prev[()]
+    u[0] = u_prev
+    k = 1
+    if store[1]:
+        u[k] = u_n
+        k += 1
+    for n in range(1, len(steps)):
+        u_prev[...], u_n[...] = u_n[()], 2*u_n[()] - u_prev[()] - dt**2*omega**2*u_n[()]
+        if store[n+1]:
+            u[k] = u_n
+            k += 1
+    return u, t[store]
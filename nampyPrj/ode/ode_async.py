@@ -0,0 +1,33 @@
+import asyncio
+from numpy import linspace, zeros, asarray
+from nampyPrj.utils.instrument import profiled
+from nampyPrj.utils.scheduler import AsyncEvaluator
+
+
+@profiled
+async def ode_system_FE_async(f, U0, dt, T, concurrency=16):
+    r"""
+    Forward Euler method to compute the solution of an ensemble of trajectories of a system
+    of first order ODE. At every time step the right-hand sides of all the trajectories are
+    evaluated concurrently (I/O-bound or remote right-hand sides).
+
+    .. math ::
+        u_k^{n+1} = u_k^n + \Delta t f(u_k^n, t_n), \quad k = 1, \dots, m
+
+    :param f: Array of functions, function or coroutine function f(u, t)
+    :param U0: Initial values, one row per trajectory (m x number of equations)
+    :param float dt: Time step
+    :param float T: Final time
+    :param int concurrency: Max number of evaluations in flight
+    :return: Solution u[n, k, :] and time t[n]
+    """
+    U0 = asarray(U0, dtype=float)
+    Nt = int(round(float(T)/dt))
+    u = zeros((Nt+1,) + U0.shape)
+    t = linspace(0, Nt*dt, len(u))
+    u[0] = U0
+    evaluate = AsyncEvaluator(f, concurrency)
+    for n in range(Nt):
+        f_n = await asyncio.gather(*[evaluate(u[n, k], t[n]) for k in range(len(U0))])
+        u[n+1] = u[n] + dt*asarray(f_n, dtype=float)
+    return u, t
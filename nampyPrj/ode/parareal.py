@@ -0,0 +1,128 @@
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from numpy import linspace, zeros, asarray, shape, abs as np_abs, max as np_max
+from nampyPrj.ode.ode import ode_system_FE, ode_RK4, _propagate
+
+
+class PararealResult:
+    """
+    Result of a Parareal integration
+
+    :param u: Solution at the boundaries of the time slices
+    :param t: Boundaries of the time slices
+    :param int iterations: Number of Parareal iterations performed
+    :param bool converged: True if the tolerance was met
+    :param list corrections: Max change of the boundary values at each iteration
+    :param float wall_time: Elapsed time of the Parareal integration [s]
+    :param float serial_time: Elapsed time of the serial fine integration [s] (if requested)
+    :param float serial_error: Max difference from the serial fine solution at the boundaries
+                               (if requested)
+    """
+    def __init__(self, u, t, iterations, converged, corrections, wall_time, serial_time=None,
+                 serial_error=None):
+        self.u = u
+        self.t = t
+        self.iterations = iterations
+        self.converged = bool(converged)
+        self.corrections = corrections
+        self.wall_time = wall_time
+        self.serial_time = serial_time
+        self.serial_error = serial_error
+
+    @property
+    def speedup(self):
+        """ Measured speedup over the serial fine integration, None if it was not run """
+        if self.serial_time is None:
+            return None
+        return self.serial_time / self.wall_time
+
+    def __repr__(self):
+        return ('PararealResult(iterations=%d, converged=%r, wall_time=%.3g, speedup=%r)'
+                % (self.iterations, self.converged, self.wall_time, self.speedup))
+
+
+def ode_parareal(f, U0, T, n_slices, coarse_dt, fine_dt, coarse=ode_system_FE, fine=ode_RK4,
+                 t0=0.0, eps=1E-8, max_iterations=None, processes=None, executor=None,
+                 serial_reference=False):
+    r"""
+    Parareal method, parallel in time, to compute the solution of system of first order ODE
+    on long time intervals.
+    [t0, T] is split in n_slices time slices. A cheap coarse propagator G sweeps the slices
+    sequentially, while an accurate fine propagator F runs on all the slices concurrently:
+
+    .. math ::
+        U_{j+1}^{k+1} = G(U_j^{k+1}) + F(U_j^k) - G(U_j^k)
+
+    The iterations stop when the boundary values change less than eps. After k iterations
+    the first k slices are exact, so at most n_slices iterations are performed. The fine
+    propagations run in a process pool: f, coarse and fine must be picklable (defined at
+    module level).
+
+    :param f: Function or array of functions f(u, t)
+    :param U0: Initial value
+    :param float T: Final time
+    :param int n_slices: Number of time slices
+    :param float coarse_dt: Time step of the coarse propagator
+    :param float fine_dt: Time step of the fine propagator
+    :param coarse: Coarse solver, with the signature of ode_system_FE
+    :param fine: Fine solver, with the signature of ode_system_FE
+    :param float t0: Initial time
+    :param float eps: Tolerance on the max change of the boundary values
+    :param int max_iterations: Max number of iterations. If None n_slices
+    :param int processes: Number of worker processes. If None the number of CPUs
+    :param executor: concurrent.futures executor running the fine propagations (e.g. a
+                     ThreadPoolExecutor for a vectorized f releasing the GIL). If None a
+                     process pool is created
+    :param bool serial_reference: Also run the fine solver serially on [t0, T] to measure
+                                  the speedup and the error of the boundary values
+    :return: PararealResult
+    """
+    # Not @profiled: the instrumented arguments could not be sent to the worker processes
+    start = time.perf_counter()
+    t = linspace(t0, T, n_slices + 1)
+    max_iterations = n_slices if max_iterations is None else min(max_iterations, n_slices)
+    u = zeros((n_slices + 1,) + shape(U0))
+    u[0] = U0
+
+    # Initial guess: coarse sweep
+    G = zeros(u.shape)
+    for j in range(n_slices):
+        G[j+1] = _propagate(coarse, f, u[j], t[j], t[j+1], coarse_dt)
+        u[j+1] = G[j+1]
+
+    pool = executor if executor is not None else ProcessPoolExecutor(processes)
+    corrections = []
+    converged = False
+    iterations = 0
+    try:
+        for k in range(max_iterations):
+            # Slices before k are already exact
+            futures = {j: pool.submit(_propagate, fine, f, u[j].copy(), t[j], t[j+1], fine_dt)
+                       for j in range(k, n_slices)}
+            F = {j: asarray(future.result()) for j, future in futures.items()}
+            u_new = u.copy()
+            u_new[k+1] = F[k]
+            for j in range(k + 1, n_slices):
+                G_new = _propagate(coarse, f, u_new[j], t[j], t[j+1], coarse_dt)
+                u_new[j+1] = G_new + F[j] - G[j+1]
+                G[j+1] = G_new
+            iterations += 1
+            corrections.append(float(np_max(np_abs(u_new - u))))
+            u = u_new
+            if corrections[-1] < eps or k + 1 == n_slices:
+                converged = True
+                break
+    finally:
+        if executor is None:
+            pool.shutdown()
+    wall_time = time.perf_counter() - start
+
+    result = PararealResult(u, t, iterations, converged, corrections, wall_time)
+    if serial_reference:
+        start = time.perf_counter()
+        n = max(1, int(round((T - t0)/fine_dt)))
+        u_serial = fine(f, U0, None, None, t=linspace(t0, T, n + 1), t_eval=t)[0]
+        result.serial_time = time.perf_counter() - start
+        result.serial_error = float(np_max(np_abs(u_serial - u)))
+    return result
@@ -0,0 +1,226 @@
+from numpy import zeros, empty, shape, sqrt, add, multiply, subtract, swapaxes, float64
+from numpy.random import default_rng, Generator, SeedSequence
+from nampyPrj.ode.ode import _time_grid, _saved_points
+from nampyPrj.utils.autodiff import derivative
+
+# Number of time steps of noise drawn at once from the stream of each path
+NOISE_BLOCK = 128
+
+
+class SDEResult:
+    """
+    Result of the simulation of an ensemble of paths of a stochastic differential equation
+
+    :param t: Time points of the statistics (and of the stored paths)
+    :param mean: Mean across the paths at each time point
+    :param var: Sample variance across the paths at each time point
+    :param int n_paths: Number of paths
+    :param paths: Paths at each time point (n_times x n_paths x ...), None if not stored
+    """
+    def __init__(self, t, mean, var, n_paths, paths=None):
+        self.t = t
+        self.mean = mean
+        self.var = var
+        self.n_paths = n_paths
+        self.paths = paths
+
+    def __repr__(self):
+        return 'SDEResult(n_paths=%d, n_times=%d, paths_stored=%r)' % (
+            self.n_paths, len(self.t), self.paths is not None)
+
+
+def _simulate(f, g, dgdu, milstein, U0, t, steps, store, seeds, store_paths):
+    """ Paths of a batch advanced together, each drawing its noise from its own stream (seed
+    sequence). Returns the mean and the sum of squared deviations across the paths at the
+    stored time points, and the paths if store_paths """
+    n_paths = len(seeds)
+    state_shape = (n_paths,) + shape(U0)
+    n_saved = store.sum()
+    mean = zeros((n_saved,) + shape(U0))
+    M2 = zeros((n_saved,) + shape(U0))
+    paths = zeros((n_saved,) + state_shape) if store_paths else None
+    u_n = empty(state_shape)
+    u_n[...] = U0
+    streams = [default_rng(seed) for seed in seeds]
+    block = min(NOISE_BLOCK, max(len(steps), 1))
+    draws = empty((n_paths, block) + shape(U0))
+    noise = empty((block,) + state_shape)
+    dW = empty(state_shape)
+    increment = empty(state_shape)
+    correction = empty(state_shape)
+
+    def record(k):
+        mean[k] = u_n.mean(axis=0)
+        subtract(u_n, mean[k], out=correction)
+        multiply(correction, correction, out=correction)
+        M2[k] = correction.sum(axis=0)
+        if store_paths:
+            paths[k] = u_n
+
+    k = 0
+    if store[0]:
+        record(0)
+        k = 1
+    for n, dt_n in enumerate(steps):
+        j = n % NOISE_BLOCK
+        if j == 0:
+            # The draws of a path do not depend on the block size nor on the batches
+            m = min(NOISE_BLOCK, len(steps) - n)
+            for p, stream in enumerate(streams):
+                stream.standard_normal(out=draws[p, :m])
+            # Time-major copy, each step reads contiguous noise
+            noise[:m] = swapaxes(draws[:, :m], 0, 1)
+        multiply(noise[j], sqrt(dt_n), out=dW)
+        f_n = f(u_n, t[n])
+        if milstein:
+            if dgdu is None:
+                g_n, g_u = derivative(lambda w: g(w, t[n]), u_n)
+            else:
+                g_n, g_u = g(u_n, t[n]), dgdu(u_n, t[n])
+            # 0.5 g g' (dW^2 - dt)
+            multiply(dW, dW, out=correction)
+            subtract(correction, dt_n, out=correction)
+            multiply(correction, 0.5*g_n*g_u, out=correction)
+        else:
+            g_n = g(u_n, t[n])
+        multiply(dW, g_n, out=increment)
+        add(u_n, increment, out=u_n)
+        multiply(f_n, dt_n, out=increment)
+        add(u_n, increment, out=u_n)
+        if milstein:
+            add(u_n, correction, out=u_n)
+        if store[n+1]:
+            record(k)
+            k += 1
+    return mean, M2, paths
+
+
+def _combine(statistics):
+    """ Mean and sum of squared deviations of the union of batches, from the (count, mean, M2)
+    of each batch (pairwise formula of Chan, Golub and LeVeque) """
+    count, mean, M2 = statistics[0]
+    for count_b, mean_b, M2_b in statistics[1:]:
+        total = count + count_b
+        delta = mean_b - mean
+        mean = mean + delta*(count_b/total)
+        M2 = M2 + M2_b + delta**2*(count*count_b/total)
+        count = total
+    return mean, M2
+
+
+def _seed_sequence(rng):
+    """ Seed sequence of a numpy.random.Generator, or of a seed """
+    if isinstance(rng, Generator):
+        bit_generator = rng.bit_generator
+        # Public since NumPy 1.25
+        return getattr(bit_generator, 'seed_seq', None) or bit_generator._seed_seq
+    if isinstance(rng, SeedSequence):
+        return rng
+    return SeedSequence(rng)
+
+
+def _sde(f, g, dgdu, milstein, U0, dt, T, n_paths, rng, store_paths, save_every, t0, batch_size,
+         executor):
+    t, steps, indices = _time_grid(dt, T, t0)
+    store = _saved_points(len(t), None, save_every)
+    batch_size = n_paths if batch_size is None else batch_size
+    sizes = [min(batch_size, n_paths - start) for start in range(0, n_paths, batch_size)]
+    # One independent stream per path: the results depend on neither the batches nor the
+    # executor
+    seeds = _seed_sequence(rng).spawn(n_paths)
+    arguments = [(f, g, dgdu, milstein, U0, t, steps, store, seeds[start:start + size],
+                  store_paths)
+                 for start, size in zip(range(0, n_paths, batch_size), sizes)]
+    if executor is None:
+        batches = [_simulate(*a) for a in arguments]
+    else:
+        batches = [future.result() for future in [executor.submit(_simulate, *a)
+                                                   for a in arguments]]
+    mean, M2 = _combine([(size, mean_b, M2_b) for size, (mean_b, M2_b, p) in zip(sizes, batches)])
+    var = M2/(n_paths - 1) if n_paths > 1 else zeros(M2.shape)
+    paths = None
+    if store_paths:
+        paths = zeros((store.sum(), n_paths) + shape(U0), dtype=float64)
+        start = 0
+        for size, (mean_b, M2_b, p) in zip(sizes, batches):
+            paths[:, start:start + size] = p
+            start += size
+    return SDEResult(t[store], mean, var, n_paths, paths)
+
+
+def sde_EulerMaruyama(f, g, U0, dt, T, n_paths=1000, rng=None, store_paths=False, save_every=1,
+                      t0=0.0, batch_size=None, executor=None):
+    r"""
+    Euler-Maruyama method to compute an ensemble of paths of a stochastic differential
+    equation (Ito), strong order 1/2
+
+    .. math ::
+        du = f(u, t) dt + g(u, t) dW
+
+        u^{n+1} = u^n + \Delta t f(u^n, t_n) + g(u^n, t_n) \Delta W^n,
+        \quad \Delta W^n \sim N(0, \Delta t)
+
+    All the paths of a batch are advanced together as one array: f and g receive the states
+    of the paths (n_paths x shape of U0) and act elementwise (diagonal noise). The mean and
+    the variance across the paths are accumulated at each stored time point, so the paths
+    need not be kept. Batches of paths can run on an executor and their statistics are
+    merged exactly. Each path draws from its own stream spawned from the seed sequence of
+    rng, so the same seed gives the same paths whatever the batch size and wherever the
+    batches run.
+
+    :param f: Drift f(u, t)
+    :param g: Diffusion g(u, t)
+    :param U0: Initial value (scalar, or state of a system)
+    :param float dt: Time step
+    :param float T: Final time
+    :param int n_paths: Number of paths
+    :param rng: numpy.random.Generator, SeedSequence or seed
+    :param bool store_paths: Also return all the paths
+    :param int save_every: Statistics (and paths) every save_every time steps (and at the
+                           final time)
+    :param float t0: Initial time
+    :param int batch_size: Number of paths advanced together. If None all of them
+    :param executor: concurrent.futures executor running the batches (with a process pool f
+                     and g must be picklable). If None they run serially
+    :return: SDEResult
+    """
+    # Not @profiled: the instrumented arguments could not be sent to the worker processes
+    return _sde(f, g, None, False, U0, dt, T, n_paths, rng, store_paths, save_every, t0,
+                batch_size, executor)
+
+
+def sde_Milstein(f, g, U0, dt, T, n_paths=1000, dgdu=None, rng=None, store_paths=False,
+                 save_every=1, t0=0.0, batch_size=None, executor=None):
+    r"""
+    Milstein method to compute an ensemble of paths of a stochastic differential equation
+    (Ito) with diagonal noise, strong order 1
+
+    .. math ::
+        du = f(u, t) dt + g(u, t) dW
+
+        u^{n+1} = u^n + \Delta t f(u^n, t_n) + g \Delta W^n
+        + \frac{1}{2} g \frac{\partial g}{\partial u} \left((\Delta W^n)^2 - \Delta t\right)
+
+    See sde_EulerMaruyama for the ensembles, the statistics and the batches.
+
+    :param f: Drift f(u, t)
+    :param g: Diffusion g(u, t)
+    :param U0: Initial value (scalar, or state of a system)
+    :param float dt: Time step
+    :param float T: Final time
+    :param int n_paths: Number of paths
+    :param dgdu: Derivative of g with respect to u, dgdu(u, t). If None it is computed by
+                 automatic differentiation (g must use NumPy functions)
+    :param rng: numpy.random.Generator, SeedSequence or seed
+    :param bool store_paths: Also return all the paths
+    :param int save_every: Statistics (and paths) every save_every time steps (and at the
+                           final time)
+    :param float t0: Initial time
+    :param int batch_size: Number of paths advanced together. If None all of them
+    :param executor: concurrent.futures executor running the batches (with a process pool f,
+                     g and dgdu must be picklable). If None they run serially
+    :return: SDEResult
+    """
+    # Not @profiled: the instrumented arguments could not be sent to the worker processes
+    return _sde(f, g, dgdu, True, U0, dt, T, n_paths, rng, store_paths, save_every, t0,
+                batch_size, executor)
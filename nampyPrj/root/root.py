@@ -1,9 +1,75 @@
-import sys
 from sympy import *
-from math import log
+from numpy import asarray, abs as np_abs, max as np_max, log as np_log
+from numpy.linalg import solve, LinAlgError
+from nampyPrj.utils import autodiff
+from nampyPrj.utils.trace import IterationTrace
+from nampyPrj.utils.instrument import profiled
 
 
-def root_NewtonRaphson(f, x, dfdx=None, eps=1E-6, max_iterations=100, return_x_list=False):
+class RootFindingError(Exception):
+    """
+    Base class for the errors raised by the root finding methods.
+
+    :param str reason: Description of the failure
+    :param RootResult result: State of the solver when the failure occurred
+    """
+    def __init__(self, reason, result=None):
+        super().__init__(reason)
+        self.reason = reason
+        self.result = result
+
+
+class DerivativeZeroError(RootFindingError):
+    """ The derivative (or the secant slope) vanished during the iterations """
+
+
+class InvalidBracketError(RootFindingError):
+    """ The function does not have opposite signs at the interval endpoints """
+
+
+class ConvergenceError(RootFindingError):
+    """ The tolerance was not met within the maximum number of iterations """
+
+
+class RootResult:
+    """
+    Result of a root finding method
+
+    :param float root: Last root estimate
+    :param int iterations: Number of iterations performed
+    :param int function_calls: Number of evaluations of f
+    :param bool converged: True if the tolerance was met
+    :param str reason: Description of the termination cause
+    :param list x_list: Iterates (only if requested)
+    """
+    def __init__(self, root, iterations, function_calls, converged, reason, x_list=None):
+        self.root = root
+        self.iterations = iterations
+        self.function_calls = function_calls
+        self.converged = bool(converged)
+        self.reason = reason
+        self.x_list = x_list
+
+    def __repr__(self):
+        return ('RootResult(root=%r, iterations=%d, function_calls=%d, converged=%r, reason=%r)'
+                % (self.root, self.iterations, self.function_calls, self.converged, self.reason))
+
+
+def _root_output(result, return_x_list, full_output, raise_on_failure):
+    """ Build the legacy (x, iterations) output or the RootResult of a root finding method """
+    if raise_on_failure and not result.converged:
+        raise ConvergenceError(result.reason, result)
+    if full_output:
+        return result
+    iteration_counter = result.iterations if result.converged else -1
+    if return_x_list:
+        return result.x_list, iteration_counter
+    return result.root, iteration_counter
+
+
+@profiled
+def root_NewtonRaphson(f, x, dfdx=None, eps=1E-6, max_iterations=100, return_x_list=False,
+                       full_output=False, raise_on_failure=False, trace=None):
     r"""
     Newton-Raphson's method for the solution of nonlinear algebraic equations
 
@@ -11,43 +77,107 @@ def root_NewtonRaphson(f, x, dfdx=None, eps=1E-6, max_iterations=100, return_x_l
         x_{n+1} = x_{n} - \frac{f(x_n)}{f'(x_n)}
 
     :param f: Function
-    :param dfdx: Function derivative
+    :param dfdx: Function derivative, None (symbolic differentiation with sympy)
+                 or 'autodiff' (automatic differentiation with Dual numbers)
     :param float x: Initial root guest
     :param float eps: Tolerance
     :param int max_iterations: Max number of iterations
+    :param bool return_x_list: Return the list of iterates instead of the last one
+    :param bool full_output: Return a RootResult
+    :param bool raise_on_failure: Raise ConvergenceError if the tolerance is not met
+    :param IterationTrace trace: Recorder of the iterates, function values and steps
+    :raises DerivativeZeroError: If the derivative vanishes at an iterate
     """
-    f_value = f(x)
+    use_autodiff = isinstance(dfdx, str) and dfdx == 'autodiff'
+    if use_autodiff:
+        f_value, dfdx_value = autodiff.derivative(f, x)
+    else:
+        f_value = f(x)
+    function_calls = 1
     iteration_counter = 0
-    if return_x_list:
-        x_list = []
+    x_list = [] if return_x_list else None
+    if dfdx is None and abs(f_value) > eps:
+        sym_x = symbols('x')
+        dfdx = lambdify([sym_x], diff(f(sym_x), sym_x))
     while abs(f_value) > eps and iteration_counter < max_iterations:
-        try:
-            if dfdx is None:
-                def dfdx():
-                    sym_x = symbols('x')
-                    dfdx_expr = diff(f(sym_x), sym_x)
-                    dfdx_lambda = lambdify([sym_x], dfdx_expr)
-                    return dfdx_lambda
-                dfdx = dfdx()
-            x = x - float(f_value) / dfdx(x)
-        except ZeroDivisionError:
-            print("Error! Derivative zero for x = ", x)
-            sys.exit(1)
-        f_value = f(x)
+        if not use_autodiff:
+            dfdx_value = dfdx(x)
+        if dfdx_value == 0:
+            result = RootResult(x, iteration_counter, function_calls, False,
+                                'derivative zero for x = %g' % x, x_list)
+            raise DerivativeZeroError(result.reason, result)
+        step = -float(f_value) / dfdx_value
+        x = x + step
+        if use_autodiff:
+            f_value, dfdx_value = autodiff.derivative(f, x)
+        else:
+            f_value = f(x)
+        function_calls += 1
         iteration_counter += 1
         if return_x_list:
             x_list.append(x)
+        if trace is not None:
+            trace.record(x, f_value, step)
 
-    if abs(f_value) > eps:
-        iteration_counter = -1
+    converged = abs(f_value) <= eps
+    reason = 'tolerance reached' if converged else 'maximum number of iterations reached'
+    result = RootResult(x, iteration_counter, function_calls, converged, reason, x_list)
+    return _root_output(result, return_x_list, full_output, raise_on_failure)
 
-    if return_x_list:
-        return x_list, iteration_counter
-    else:
-        return x, iteration_counter
 
+@profiled
+def root_Newton_system(F, x, J='autodiff', eps=1E-6, max_iterations=100, full_output=False,
+                       raise_on_failure=False, trace=None):
+    r"""
+    Newton's method for the solution of systems of nonlinear algebraic equations
+
+    .. math ::
+        J(x_n) \delta = -F(x_n), \quad x_{n+1} = x_n + \delta
+
+    :param F: Function of a vector returning a vector (or a list of components)
+    :param x: Initial root guess
+    :param J: Jacobian function or 'autodiff' (automatic differentiation with Dual numbers)
+    :param float eps: Tolerance on the max norm of F
+    :param int max_iterations: Max number of iterations
+    :param bool full_output: Return a RootResult
+    :param bool raise_on_failure: Raise ConvergenceError if the tolerance is not met
+    :param IterationTrace trace: Recorder of the iterates, function values and steps
+    :raises DerivativeZeroError: If the Jacobian is singular
+    """
+    use_autodiff = isinstance(J, str) and J == 'autodiff'
 
-def root_secant(f, x0, x1, eps, max_iterations, return_x_list=False):
+    def evaluate(x):
+        if use_autodiff:
+            return autodiff.jacobian(F, x)
+        return asarray(F(x), dtype=float), asarray(J(x), dtype=float)
+
+    x = asarray(x, dtype=float)
+    F_value, J_value = evaluate(x)
+    function_calls = 1
+    iteration_counter = 0
+    while np_max(np_abs(F_value)) > eps and iteration_counter < max_iterations:
+        try:
+            delta = solve(J_value, -F_value)
+        except LinAlgError:
+            result = RootResult(x, iteration_counter, function_calls, False,
+                                'singular Jacobian for x = %s' % x)
+            raise DerivativeZeroError(result.reason, result)
+        x = x + delta
+        F_value, J_value = evaluate(x)
+        function_calls += 1
+        iteration_counter += 1
+        if trace is not None:
+            trace.record(x, F_value, delta)
+
+    converged = np_max(np_abs(F_value)) <= eps
+    reason = 'tolerance reached' if converged else 'maximum number of iterations reached'
+    result = RootResult(x, iteration_counter, function_calls, converged, reason)
+    return _root_output(result, False, full_output, raise_on_failure)
+
+
+@profiled
+def root_secant(f, x0, x1, eps, max_iterations, return_x_list=False,
+                full_output=False, raise_on_failure=False, trace=None):
     r"""
     Secant method for the solution of nonlinear algebraic equations
 
@@ -56,38 +186,44 @@ def root_secant(f, x0, x1, eps, max_iterations, return_x_list=False):
     :param float x1: Second root guess
     :param float eps: Tolerance
     :param int max_iterations: Max number of iterations
+    :param bool return_x_list: Return the list of iterates instead of the last one
+    :param bool full_output: Return a RootResult
+    :param bool raise_on_failure: Raise ConvergenceError if the tolerance is not met
+    :param IterationTrace trace: Recorder of the iterates, function values and steps
+    :raises DerivativeZeroError: If the secant slope vanishes
     """
     f_x0 = f(x0)
     f_x1 = f(x1)
+    function_calls = 2
     iteration_counter = 0
-    if return_x_list:
-        x_list = []
+    x_list = [] if return_x_list else None
     while abs(f_x1) > eps and iteration_counter < max_iterations:
-        try:
-            denominator = float(f_x1 - f_x0) / (x1 - x0)
-            x = x1 - float(f_x1) / denominator
-        except ZeroDivisionError:
-            print("Error! - denominator zero for x = ", x)
-            sys.exit(1)  # Abort with error
+        if f_x1 == f_x0 or x1 == x0:
+            result = RootResult(x1, iteration_counter, function_calls, False,
+                                'denominator zero for x = %g' % x1, x_list)
+            raise DerivativeZeroError(result.reason, result)
+        denominator = float(f_x1 - f_x0) / (x1 - x0)
+        x = x1 - float(f_x1) / denominator
         x0 = x1
         x1 = x
         f_x0 = f_x1
         f_x1 = f(x1)
+        function_calls += 1
         iteration_counter += 1
         if return_x_list:
             x_list.append(x)
+        if trace is not None:
+            trace.record(x1, f_x1, x1 - x0)
 
     # Here, either a solution is found, or too many iterations
-    if abs(f_x1) > eps:
-        iteration_counter = -1
+    converged = abs(f_x1) <= eps
+    reason = 'tolerance reached' if converged else 'maximum number of iterations reached'
+    result = RootResult(x1, iteration_counter, function_calls, converged, reason, x_list)
+    return _root_output(result, return_x_list, full_output, raise_on_failure)
 
-    if return_x_list:
-        return x_list, iteration_counter
-    else:
-        return x, iteration_counter
 
-
-def root_bisection(f, xL, xR, eps, return_x_list=False):
+@profiled
+def root_bisection(f, xL, xR, eps, return_x_list=False, full_output=False, trace=None):
     r"""
     Bisection method for the solution of nonlinear algebraic equations
 
@@ -95,17 +231,22 @@ def root_bisection(f, xL, xR, eps, return_x_list=False):
     :param float xL: Left initial bound
     :param float xR: Right initial bound
     :param float eps: Tolerance
-    :param return_x_list:
+    :param bool return_x_list: Return the list of iterates instead of the last one
+    :param bool full_output: Return a RootResult
+    :param IterationTrace trace: Recorder of the iterates, function values and steps
+    :raises InvalidBracketError: If f has the same sign at both endpoints
     """
     fL = f(xL)
-    if fL * f(xR) > 0:
-        print("Error! Function does not have opposite signs at interval endpoints!")
-        sys.exit(1)
+    fR = f(xR)
+    if fL * fR > 0:
+        result = RootResult(None, 0, 2, False,
+                            'function does not have opposite signs at interval endpoints')
+        raise InvalidBracketError(result.reason, result)
     xM = float(xL + xR) / 2.0
     fM = f(xM)
+    function_calls = 3
     iteration_counter = 1
-    if return_x_list:
-        x_list = []
+    x_list = [] if return_x_list else None
 
     while abs(fM) > eps:
         if fL * fM > 0:  # i.e. same sign
@@ -115,18 +256,105 @@ def root_bisection(f, xL, xR, eps, return_x_list=False):
             xR = xM
         xM = float(xL + xR) / 2
         fM = f(xM)
+        function_calls += 1
         iteration_counter += 1
         if return_x_list:
             x_list.append(xM)
-    if return_x_list:
-        return x_list, iteration_counter
-    else:
-        return xM, iteration_counter
+        if trace is not None:
+            trace.record(xM, fM, 0.5 * (xR - xL))
+    result = RootResult(xM, iteration_counter, function_calls, True, 'tolerance reached', x_list)
+    return _root_output(result, return_x_list, full_output, False)
+
+
+@profiled
+def root_brent(f, xL, xR, eps, max_iterations=100, full_output=False, raise_on_failure=False,
+               trace=None):
+    r"""
+    Brent's method for the solution of nonlinear algebraic equations
+    (bisection safeguarded inverse quadratic interpolation and secant steps)
+
+    :param f: Function
+    :param float xL: Left initial bound
+    :param float xR: Right initial bound
+    :param float eps: Tolerance on the bracket width
+    :param int max_iterations: Max number of iterations
+    :param bool full_output: Return a RootResult
+    :param bool raise_on_failure: Raise ConvergenceError if the tolerance is not met
+    :param IterationTrace trace: Recorder of the iterates, function values and steps
+    :raises InvalidBracketError: If f has the same sign at both endpoints
+    """
+    a, b = float(xL), float(xR)
+    fa, fb = f(a), f(b)
+    function_calls = 2
+    if fa * fb > 0:
+        result = RootResult(None, 0, function_calls, False,
+                            'function does not have opposite signs at interval endpoints')
+        raise InvalidBracketError(result.reason, result)
+    c, fc = a, fa
+    d = e = b - a
+    iteration_counter = 0
+    converged = fb == 0
+    while not converged and iteration_counter < max_iterations:
+        if fb * fc > 0:  # Keep the root bracketed by b and c
+            c, fc = a, fa
+            d = e = b - a
+        if abs(fc) < abs(fb):  # b is the best estimate
+            a, b, c = b, c, b
+            fa, fb, fc = fb, fc, fb
+        tol = 2.0 * 2.2E-16 * abs(b) + 0.5 * eps
+        m = 0.5 * (c - b)
+        if abs(m) <= tol or fb == 0:
+            converged = True
+            break
+        if abs(e) >= tol and abs(fa) > abs(fb):
+            s = fb / fa
+            if a == c:  # Secant step
+                p = 2.0 * m * s
+                q = 1.0 - s
+            else:  # Inverse quadratic interpolation
+                q = fa / fc
+                r = fb / fc
+                p = s * (2.0 * m * q * (q - r) - (b - a) * (r - 1.0))
+                q = (q - 1.0) * (r - 1.0) * (s - 1.0)
+            if p > 0:
+                q = -q
+            else:
+                p = -p
+            if 2.0 * p < min(3.0 * m * q - abs(tol * q), abs(e * q)):
+                e = d
+                d = p / q
+            else:  # Interpolation rejected, bisect
+                d = e = m
+        else:
+            d = e = m
+        a, fa = b, fb
+        step = d if abs(d) > tol else (tol if m > 0 else -tol)
+        b += step
+        fb = f(b)
+        function_calls += 1
+        iteration_counter += 1
+        if trace is not None:
+            trace.record(b, fb, step)
+
+    converged = converged or fb == 0
+    reason = 'tolerance reached' if converged else 'maximum number of iterations reached'
+    result = RootResult(b, iteration_counter, function_calls, converged, reason)
+    return _root_output(result, False, full_output, raise_on_failure)
 
 
 def rate(x, x_exact):
-    """ Compute the convergence rate of the root finding method"""
-    e = [abs(x_ - x_exact) for x_ in x]
-    q = [log(e[n+1]/e[n])/log(e[n]/e[n-1])
-         for n in range(1, len(e)-1, 1)]
-    return q
+    r"""
+    Compute the convergence rate of the root finding method
+
+    .. math ::
+        q_n = \frac{\ln(e_{n+1}/e_n)}{\ln(e_n/e_{n-1})}, \quad e_n = |x_n - x_{exact}|
+
+    :param x: Iterates: list, array (iterations along the first axis, a batch of problems
+              along the others) or IterationTrace
+    :param x_exact: Exact root (or roots, one per problem of the batch)
+    """
+    if isinstance(x, IterationTrace):
+        x = x.x
+    log_e = np_log(np_abs(asarray(x, dtype=float) - x_exact))
+    d = log_e[1:] - log_e[:-1]
+    return d[1:] / d[:-1]
@@ -0,0 +1,104 @@
+from numpy import (asarray, atleast_1d, zeros, eye, exp, pi, arange, linspace, where, abs,
+                   max, sort, concatenate, unique, polyval, polyder, trim_zeros, nonzero)
+from numpy.linalg import eigvals
+from nampyPrj.root.root import root_brent
+from nampyPrj.utils.instrument import profiled
+
+
+@profiled
+def root_polynomial(coefficients, method='companion', eps=1E-12, max_iterations=100):
+    r"""
+    All the (complex) roots of a polynomial at once
+
+    .. math ::
+        p(x) = c_0 x^n + c_1 x^{n-1} + \dots + c_n
+
+    With method='companion' the roots are the eigenvalues of the companion matrix.
+    With method='aberth' all the roots are refined simultaneously by the Aberth-Ehrlich iteration
+
+    .. math ::
+        z_k \leftarrow z_k - \frac{w_k}{1 - w_k \sum_{j \neq k} \frac{1}{z_k - z_j}},
+        \quad w_k = \frac{p(z_k)}{p'(z_k)}
+
+    :param coefficients: Polynomial coefficients, highest degree first
+    :param str method: 'companion' or 'aberth'
+    :param float eps: Tolerance on the relative root correction (aberth only)
+    :param int max_iterations: Max number of iterations (aberth only)
+    """
+    c = trim_zeros(atleast_1d(asarray(coefficients)), 'f')
+    if len(c) < 2:
+        return zeros(0, dtype=complex)
+    # Zero roots are split off, they would stall the Aberth iteration
+    n_zero = len(c) - len(trim_zeros(c, 'b'))
+    c = trim_zeros(c, 'b')
+    n = len(c) - 1
+    if n == 0:
+        roots = zeros(0, dtype=complex)
+    elif method == 'companion':
+        companion = zeros((n, n), dtype=c.dtype if c.dtype.kind == 'c' else float)
+        companion[0, :] = -c[1:] / c[0]
+        companion[1:, :-1] = eye(n - 1)
+        roots = eigvals(companion)
+    elif method == 'aberth':
+        dc = polyder(c)
+        # Initial guesses spread on a circle inside the Cauchy bound
+        radius = 1 + max(abs(c[1:] / c[0]))
+        z = 0.5 * radius * exp(2j * pi * (arange(n) + 0.25) / n)
+        for iteration in range(max_iterations):
+            w = polyval(c, z) / polyval(dc, z)
+            diff = z[:, None] - z[None, :]
+            diff[arange(n), arange(n)] = 1
+            inv = 1 / diff
+            inv[arange(n), arange(n)] = 0
+            correction = w / (1 - w * inv.sum(axis=1))
+            z = z - correction
+            if max(abs(correction) / where(abs(z) > 1, abs(z), 1)) < eps:
+                break
+        roots = z
+    else:
+        raise ValueError("method must be 'companion' or 'aberth', got %r" % method)
+    return concatenate((roots, zeros(n_zero, dtype=complex)))
+
+
+@profiled
+def root_scan(f, a, b, n, eps=1E-10, method='bisection', max_iterations=200):
+    r"""
+    All the roots of f in [a, b]. f is sampled (vectorized) on a uniform grid
+    of n subintervals, every sign change is bracketed and all the brackets are refined
+    together by a vectorized bisection, or one by one by Brent's method
+
+    Roots closer than the grid spacing h = (b - a)/n can be missed.
+
+    :param f: Function (must accept arrays when method='bisection')
+    :param float a: Lower interval bound
+    :param float b: Upper interval bound
+    :param int n: Number of subdivision of the scanning grid
+    :param float eps: Tolerance on the bracket width
+    :param str method: 'bisection' or 'brent'
+    :param int max_iterations: Max number of iterations
+    """
+    x = linspace(a, b, n+1)
+    fx = asarray(f(x), dtype=float)
+    exact = x[fx == 0]
+    index = nonzero(fx[:-1] * fx[1:] < 0)[0]
+    xL = x[index]
+    xR = x[index + 1]
+
+    if method == 'bisection':
+        fL = fx[index]
+        for iteration in range(max_iterations):
+            if len(xL) == 0 or max(xR - xL) <= 2 * eps:
+                break
+            xM = 0.5 * (xL + xR)
+            fM = asarray(f(xM), dtype=float)
+            same_sign = fL * fM > 0
+            xL = where(same_sign, xM, xL)
+            fL = where(same_sign, fM, fL)
+            xR = where(same_sign, xR, xM)
+        roots = 0.5 * (xL + xR)
+    elif method == 'brent':
+        roots = asarray([root_brent(f, xL_, xR_, eps, max_iterations)[0]
+                         for xL_, xR_ in zip(xL, xR)], dtype=float)
+    else:
+        raise ValueError("method must be 'bisection' or 'brent', got %r" % method)
+    return sort(unique(concatenate((exact, roots))))
@@ -0,0 +1,263 @@
+import numpy as np
+from numpy import asarray, ones, eye, zeros, shape
+
+
+class Dual:
+    r"""
+    Forward-mode automatic differentiation number
+
+    .. math ::
+        f(a + \varepsilon b) = f(a) + \varepsilon f'(a) b, \quad \varepsilon^2 = 0
+
+    The value can be a scalar or an array (batch). The derivative has the shape of the
+    value plus a trailing axis with one entry per seed direction, so a Jacobian is obtained
+    in a single evaluation of the function. Python operators and the common NumPy ufuncs
+    (np.sin, np.exp, ...) are supported; functions of the math module are not.
+
+    :param value: Value
+    :param derivative: Derivative with respect to each seed direction
+    """
+    __array_priority__ = 1000
+
+    def __init__(self, value, derivative):
+        self.value = value
+        self.derivative = asarray(derivative)
+
+    def __repr__(self):
+        return 'Dual(%r, %r)' % (self.value, self.derivative)
+
+    @property
+    def shape(self):
+        return shape(self.value)
+
+    @property
+    def ndim(self):
+        return len(shape(self.value))
+
+    def __len__(self):
+        return len(self.value)
+
+    def __getitem__(self, index):
+        if not isinstance(index, tuple):
+            index = (index,)
+        return Dual(self.value[index], self.derivative[index + (slice(None),)])
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self[i]
+
+    def __float__(self):
+        raise TypeError('Dual numbers cannot be converted to float, '
+                        'use NumPy functions (np.exp, ...) instead of the math module')
+
+    def sum(self, axis=None):
+        if axis is None:
+            axis = tuple(range(self.ndim))
+        elif axis < 0:
+            axis += self.ndim
+        return Dual(np.sum(self.value, axis=axis), np.sum(self.derivative, axis=axis))
+
+    # Arithmetic
+    def __add__(self, other):
+        return _apply(np.add, self, other)
+
+    __radd__ = __add__
+
+    def __sub__(self, other):
+        return _apply(np.subtract, self, other)
+
+    def __rsub__(self, other):
+        return _apply(np.subtract, other, self)
+
+    def __mul__(self, other):
+        return _apply(np.multiply, self, other)
+
+    __rmul__ = __mul__
+
+    def __truediv__(self, other):
+        return _apply(np.true_divide, self, other)
+
+    def __rtruediv__(self, other):
+        return _apply(np.true_divide, other, self)
+
+    def __pow__(self, other):
+        return _apply(np.power, self, other)
+
+    def __rpow__(self, other):
+        return _apply(np.power, other, self)
+
+    def __neg__(self):
+        return _apply(np.negative, self)
+
+    def __pos__(self):
+        return self
+
+    def __abs__(self):
+        return _apply(np.absolute, self)
+
+    # Comparisons act on the value, so branches in user functions work
+    def __lt__(self, other):
+        return self.value < _value(other)
+
+    def __le__(self, other):
+        return self.value <= _value(other)
+
+    def __gt__(self, other):
+        return self.value > _value(other)
+
+    def __ge__(self, other):
+        return self.value >= _value(other)
+
+    def __eq__(self, other):
+        return self.value == _value(other)
+
+    def __ne__(self, other):
+        return self.value != _value(other)
+
+    __hash__ = None
+
+    def __array_ufunc__(self, ufunc, method, *inputs, **kwargs):
+        if method != '__call__' or kwargs:
+            return NotImplemented
+        if ufunc in _UNARY or ufunc in _BINARY:
+            return _apply(ufunc, *inputs)
+        if ufunc in _PIECEWISE_CONSTANT:
+            return ufunc(*[_value(x) for x in inputs])
+        return NotImplemented
+
+
+def _value(x):
+    return x.value if isinstance(x, Dual) else x
+
+
+def _scale(a, derivative):
+    """ Multiply each seed direction of derivative by a """
+    return asarray(a)[..., None] * derivative
+
+
+# Derivative of the unary ufuncs as a function of the argument and of the result
+_UNARY = {
+    np.negative: lambda x, y: -ones(shape(x)),
+    np.absolute: lambda x, y: np.sign(x),
+    np.sqrt: lambda x, y: 0.5 / y,
+    np.square: lambda x, y: 2 * x,
+    np.exp: lambda x, y: y,
+    np.expm1: lambda x, y: y + 1,
+    np.log: lambda x, y: 1 / x,
+    np.log10: lambda x, y: 1 / (x * np.log(10)),
+    np.log1p: lambda x, y: 1 / (1 + x),
+    np.sin: lambda x, y: np.cos(x),
+    np.cos: lambda x, y: -np.sin(x),
+    np.tan: lambda x, y: 1 + y ** 2,
+    np.arcsin: lambda x, y: 1 / np.sqrt(1 - x ** 2),
+    np.arccos: lambda x, y: -1 / np.sqrt(1 - x ** 2),
+    np.arctan: lambda x, y: 1 / (1 + x ** 2),
+    np.sinh: lambda x, y: np.cosh(x),
+    np.cosh: lambda x, y: np.sinh(x),
+    np.tanh: lambda x, y: 1 - y ** 2,
+}
+
+_BINARY = (np.add, np.subtract, np.multiply, np.true_divide, np.power, np.maximum, np.minimum)
+
+_PIECEWISE_CONSTANT = (np.sign, np.floor, np.ceil, np.rint, np.greater, np.greater_equal,
+                       np.less, np.less_equal, np.equal, np.not_equal, np.isfinite, np.isnan)
+
+
+def _apply(ufunc, *inputs):
+    """ Evaluate ufunc on (possibly) Dual inputs with the chain rule """
+    if ufunc in _UNARY:
+        x = inputs[0]
+        y = ufunc(x.value)
+        return Dual(y, _scale(_UNARY[ufunc](x.value, y), x.derivative))
+
+    a, b = inputs
+    a_value, b_value = _value(a), _value(b)
+    da = a.derivative if isinstance(a, Dual) else None
+    db = b.derivative if isinstance(b, Dual) else None
+    y = ufunc(a_value, b_value)
+    terms = []
+    if ufunc is np.add or ufunc is np.subtract:
+        sign = 1 if ufunc is np.add else -1
+        if da is not None:
+            terms.append(_scale(ones(shape(y)), da))
+        if db is not None:
+            terms.append(sign * _scale(ones(shape(y)), db))
+    elif ufunc is np.multiply:
+        if da is not None:
+            terms.append(_scale(b_value, da))
+        if db is not None:
+            terms.append(_scale(a_value, db))
+    elif ufunc is np.true_divide:
+        if da is not None:
+            terms.append(_scale(1 / b_value, da))
+        if db is not None:
+            terms.append(_scale(-y / b_value, db))
+    elif ufunc is np.power:
+        if da is not None:
+            terms.append(_scale(b_value * a_value ** (b_value - 1), da))
+        if db is not None:
+            terms.append(_scale(y * np.log(a_value), db))
+    else:  # maximum, minimum
+        take_a = ufunc(a_value, b_value) == a_value
+        if da is not None:
+            terms.append(_scale(take_a, da))
+        if db is not None:
+            terms.append(_scale(~take_a, db))
+    derivative = terms[0] if len(terms) == 1 else terms[0] + terms[1]
+    return Dual(y, derivative)
+
+
+def stack(values):
+    """
+    Convert a sequence of Dual numbers and constants (e.g. the list returned by the right-hand
+    side of an ODE system) into a single Dual array. Sequences without Dual numbers are
+    returned as arrays.
+
+    :param values: Sequence of Dual numbers and constants
+    """
+    if isinstance(values, Dual):
+        return values
+    duals = [v for v in values if isinstance(v, Dual)]
+    if not duals:
+        return asarray(values)
+    n_seeds = duals[0].derivative.shape[-1]
+    value = asarray([_value(v) for v in values])
+    derivative = zeros(value.shape + (n_seeds,))
+    for i, v in enumerate(values):
+        if isinstance(v, Dual):
+            derivative[i] = v.derivative
+    return Dual(value, derivative)
+
+
+def derivative(f, x):
+    r"""
+    Value and derivative of f at x computed with one evaluation of f on Dual numbers.
+    For an array x the derivative is computed elementwise (f must act elementwise).
+
+    :param f: Function
+    :param x: Point (scalar or array)
+    """
+    x = asarray(x, dtype=float)
+    y = f(Dual(x, ones(x.shape + (1,))))
+    if not isinstance(y, Dual):
+        return y, zeros(x.shape)
+    value = y.value[()] if isinstance(y.value, np.ndarray) else y.value
+    return value, y.derivative[..., 0][()]
+
+
+def jacobian(F, x):
+    r"""
+    Value and Jacobian matrix of F at x computed with one evaluation of F on Dual numbers
+
+    .. math ::
+        J_{ij} = \frac{\partial F_i}{\partial x_j}
+
+    :param F: Function of a vector returning a vector (or a list of components)
+    :param x: Point
+    """
+    x = asarray(x, dtype=float)
+    n = x.size
+    y = stack(F(Dual(x, eye(n))))
+    if not isinstance(y, Dual):
+        return y, zeros(y.shape + (n,))
+    return y.value, y.derivative
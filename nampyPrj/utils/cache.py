@@ -0,0 +1,354 @@
+import hashlib
+import json
+import os
+import sys
+import tempfile
+import time
+import zipfile
+from collections import OrderedDict
+
+import numpy as np
+
+from nampyPrj.utils.instrument import record_event
+
+
+class MemoizedFunction:
+    """
+    Bounded LRU cache of the values of a function of scalar arguments, keyed on the
+    arguments rounded to a number of decimals. Use it to wrap an expensive integrand or
+    scalar right-hand side that is evaluated many times at the same points (nested rules,
+    refinement sweeps). For the right-hand side of a system use MemoizedStateFunction:
+
+    .. code ::
+
+        g = MemoizedFunction(f)
+        for n in 10, 20, 40:
+            trapezoidal(g, 0, 1, n)  # reuses the values at the coarser nodes
+        print(g.stats())
+
+    :param f: Function of one or more scalar arguments
+    :param int maxsize: Max number of cached values
+    :param int decimals: Number of decimals of the rounded arguments in the keys
+    """
+    def __init__(self, f, maxsize=100000, decimals=12):
+        self.f = f
+        self.maxsize = maxsize
+        self.decimals = decimals
+        self.hits = 0
+        self.misses = 0
+        self._cache = OrderedDict()
+
+    def _key(self, args):
+        if any(np.ndim(a) for a in args):
+            raise TypeError('%s takes scalar arguments, use MemoizedStateFunction for the '
+                            'right-hand side of a system' % type(self).__name__)
+        return tuple(round(float(a), self.decimals) for a in args)
+
+    def _store(self, key, value):
+        self._cache[key] = value
+        if len(self._cache) > self.maxsize:
+            self._cache.popitem(last=False)
+
+    def __call__(self, *args):
+        key = self._key(args)
+        try:
+            value = self._cache[key]
+        except KeyError:
+            self.misses += 1
+            record_event('memo_misses')
+            value = self.f(*args)
+            self._store(key, value)
+            return value
+        self.hits += 1
+        record_event('memo_hits')
+        self._cache.move_to_end(key)
+        return value
+
+    def clear(self):
+        self._cache.clear()
+        self.hits = self.misses = 0
+
+    def memory(self):
+        """ Estimated memory used by the cache in bytes """
+        size = sys.getsizeof(self._cache)
+        for key, value in self._cache.items():
+            size += sys.getsizeof(key) + sum(sys.getsizeof(k) for k in key) + sys.getsizeof(value)
+        return size
+
+    def stats(self):
+        """ Hits, misses, hit rate, number of cached values and estimated memory """
+        calls = self.hits + self.misses
+        return {'hits': self.hits, 'misses': self.misses,
+                'hit_rate': self.hits / calls if calls else 0.0,
+                'size': len(self._cache), 'maxsize': self.maxsize, 'memory': self.memory()}
+
+
+class MemoizedArrayFunction(MemoizedFunction):
+    """
+    Array-aware version of MemoizedFunction for vectorized functions. The points of a batch are
+    rounded and deduplicated, the cached values are looked up and f is called once on the
+    missing points only.
+
+    f must act pointwise: every element of the (broadcast) arguments is a separate point, as
+    for a vectorized integrand. It does not apply to the right-hand side f(u, t) of a system,
+    whose value depends on the whole state u: use MemoizedStateFunction.
+
+    :param f: Vectorized function of one or more array arguments
+    :param int maxsize: Max number of cached values
+    :param int decimals: Number of decimals of the rounded arguments in the keys
+    """
+    def __call__(self, *args):
+        arrays = np.broadcast_arrays(*[np.asarray(a, dtype=float) for a in args])
+        shape = arrays[0].shape
+        points = np.round(np.column_stack([a.ravel() for a in arrays]), self.decimals)
+        unique, inverse = np.unique(points, axis=0, return_inverse=True)
+        keys = [tuple(p) for p in unique.tolist()]
+
+        values = np.empty(len(keys))
+        missing = []
+        for i, key in enumerate(keys):
+            value = self._cache.get(key)
+            if value is None:
+                missing.append(i)
+            else:
+                values[i] = value
+                self._cache.move_to_end(key)
+        if missing:
+            missing = np.asarray(missing)
+            computed = np.broadcast_to(self.f(*unique[missing].T), missing.shape)
+            values[missing] = computed
+            for i, value in zip(missing.tolist(), computed.tolist()):
+                self._store(keys[i], value)
+        # Duplicates within the batch count as hits
+        n_hits = points.shape[0] - len(missing)
+        self.hits += n_hits
+        self.misses += len(missing)
+        record_event('memo_hits', n_hits)
+        record_event('memo_misses', len(missing))
+        return values[inverse.ravel()].reshape(shape)
+
+
+class MemoizedStateFunction(MemoizedFunction):
+    """
+    Version of MemoizedFunction for a right-hand side f(u, t) of a system, or any function
+    of array arguments that is not pointwise. The key is made of the rounded values of the
+    whole arguments, and the values are stored as arrays:
+
+    .. code ::
+
+        g = MemoizedStateFunction(f)
+        ode_system_FE(g, U0, dt, T)
+
+    The returned arrays are copies, so the caller may modify them.
+
+    :param f: Function of one or more (array) arguments, returning an array
+    :param int maxsize: Max number of cached values
+    :param int decimals: Number of decimals of the rounded arguments in the keys
+    """
+    def _key(self, args):
+        key = []
+        for a in args:
+            # + 0.0 merges -0.0 and 0.0
+            a = np.round(np.asarray(a, dtype=float), self.decimals) + 0.0
+            key.append((a.shape, a.tobytes()))
+        return tuple(key)
+
+    def _store(self, key, value):
+        MemoizedFunction._store(self, key, np.array(value, dtype=float))
+
+    def __call__(self, *args):
+        return np.array(MemoizedFunction.__call__(self, *args))
+
+    def memory(self):
+        size = sys.getsizeof(self._cache)
+        for key, value in self._cache.items():
+            size += sys.getsizeof(key) + sum(sys.getsizeof(b) for s, b in key) + value.nbytes
+        return size
+
+
+def _canonical(value):
+    """ JSON-serializable description of an argument, arrays are summarized by a hash of
+    their content """
+    if isinstance(value, np.ndarray):
+        return ['ndarray', str(value.dtype), list(value.shape),
+                hashlib.sha256(np.ascontiguousarray(value).tobytes()).hexdigest()]
+    if isinstance(value, (list, tuple)):
+        return [_canonical(v) for v in value]
+    if isinstance(value, dict):
+        return {str(k): _canonical(v) for k, v in sorted(value.items())}
+    if isinstance(value, (np.generic, float, int, bool, str)) or value is None:
+        return repr(value.item() if isinstance(value, np.generic) else value)
+    if isinstance(value, type) or callable(value):
+        return 'callable:' + getattr(value, '__qualname__', type(value).__qualname__)
+    raise TypeError('cannot build a cache key from an argument of type %s' % type(value).__name__)
+
+
+# Age in seconds after which a temporary file of DiskCache was left by a killed writer
+STALE_TEMPORARY = 3600.0
+
+
+class DiskCache:
+    """
+    Persistent content-addressed cache of the results of the nampyPrj routines. A result is
+    stored as a compressed NumPy file named by the hash of the routine name, the arguments
+    and a fingerprint of the user functions, so it survives restarts and is shared by all
+    the processes using the same directory:
+
+    .. code ::
+
+        cache = DiskCache('~/.cache/nampy')
+        I = cache.call(midpoint_triple, g, 0, 1, 0, 1, 0, 1, 100, 100, 100, fingerprint='g-v1')
+
+    Files are written to a temporary name and atomically renamed, so concurrent readers never
+    see a partial file. When the total size exceeds max_size the least recently used files
+    are removed, as are the temporary files left by killed writers. Storing is best-effort: a
+    result that cannot be cached, or a failed write, is still returned. Hits, misses and
+    failed writes are reported to the active profilers as the events disk_cache_hits,
+    disk_cache_misses and disk_cache_errors.
+
+    The cache cannot see the code of the user functions: the fingerprint must change whenever
+    a function passed to the routine changes. Nor does the key include the state of a random
+    number generator: a hit for a randomized routine such as MonteCarlo_double returns the
+    stored estimate and skips its draws from the global np.random generator, so the later
+    draws differ from an uncached run. Put the seed in the fingerprint to cache one estimate
+    per seed.
+
+    :param str directory: Cache directory (created if needed)
+    :param int max_size: Max total size of the cached files in bytes
+    """
+    def __init__(self, directory, max_size=2**30):
+        self.directory = os.path.abspath(os.path.expanduser(directory))
+        self.max_size = max_size
+        os.makedirs(self.directory, exist_ok=True)
+
+    def key(self, name, args=(), kwargs=None, fingerprint=None):
+        """
+        Cache key of a call
+
+        :param str name: Name of the routine
+        :param args: Positional arguments
+        :param dict kwargs: Keyword arguments
+        :param str fingerprint: Identifier of the version of the user functions
+        """
+        kwargs = {} if kwargs is None else kwargs
+        if fingerprint is None and any(callable(v) for v in list(args) + list(kwargs.values())):
+            raise ValueError('a fingerprint of the user functions is required')
+        description = json.dumps([name, _canonical(list(args)), _canonical(kwargs), fingerprint])
+        return hashlib.sha256(description.encode()).hexdigest()
+
+    def _path(self, key):
+        return os.path.join(self.directory, key + '.npz')
+
+    def load(self, key):
+        """ Cached result of key, and whether it was found """
+        path = self._path(key)
+        try:
+            with np.load(path) as data:
+                kind = str(data['kind'])
+                arrays = [data['arr_%d' % i] for i in range(len(data.files) - 1)]
+            os.utime(path)  # recently used
+        except (FileNotFoundError, zipfile.BadZipFile, KeyError, ValueError, OSError):
+            return None, False
+        if kind == 'scalar':
+            return arrays[0][()], True
+        if kind == 'array':
+            return arrays[0], True
+        return tuple(arrays), True
+
+    def store(self, key, result):
+        """ Write the result of key (scalar, array or tuple of arrays) """
+        if isinstance(result, tuple):
+            kind, arrays = 'tuple', [np.asarray(r) for r in result]
+        elif isinstance(result, np.ndarray):
+            kind, arrays = 'array', [result]
+        elif np.isscalar(result):
+            kind, arrays = 'scalar', [np.asarray(result)]
+        else:
+            raise TypeError('cannot cache a result of type %s' % type(result).__name__)
+        descriptor, temporary = tempfile.mkstemp(suffix='.tmp', dir=self.directory)
+        try:
+            with os.fdopen(descriptor, 'wb') as file:
+                np.savez_compressed(file, *arrays, kind=kind)
+            os.replace(temporary, self._path(key))
+        except BaseException:
+            if os.path.exists(temporary):
+                os.remove(temporary)
+            raise
+        self.evict()
+
+    def call(self, routine, *args, fingerprint=None, **kwargs):
+        """
+        Result of routine(*args, **kwargs), from the cache if available
+
+        :param routine: nampyPrj routine (or any function with a cacheable result)
+        :param str fingerprint: Identifier of the version of the user functions in the
+                                arguments
+        """
+        key = self.key(routine.__module__ + '.' + routine.__name__, args, kwargs, fingerprint)
+        result, found = self.load(key)
+        if found:
+            record_event('disk_cache_hits')
+            return result
+        record_event('disk_cache_misses')
+        result = routine(*args, **kwargs)
+        try:
+            self.store(key, result)
+        except (TypeError, OSError):
+            # Uncacheable result, or full or read-only directory
+            record_event('disk_cache_errors')
+        return result
+
+    def wrap(self, routine, fingerprint=None):
+        """ Cached version of routine """
+        def cached(*args, **kwargs):
+            return self.call(routine, *args, fingerprint=fingerprint, **kwargs)
+        cached.__name__ = routine.__name__
+        cached.__doc__ = routine.__doc__
+        return cached
+
+    def _entries(self):
+        entries = []
+        for entry in os.scandir(self.directory):
+            if entry.name.endswith(('.npz', '.tmp')):
+                try:
+                    stat = entry.stat()
+                except FileNotFoundError:  # removed by another process
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+        return entries
+
+    @staticmethod
+    def _remove(path):
+        try:
+            os.remove(path)
+        except FileNotFoundError:  # removed by another process
+            pass
+
+    def size(self):
+        """ Total size of the cached files (and of the temporary files) in bytes """
+        return sum(size for mtime, size, path in self._entries())
+
+    def evict(self):
+        """ Remove the temporary files older than STALE_TEMPORARY seconds, then the least
+        recently used files until the size is below max_size """
+        now = time.time()
+        total = 0
+        files = []
+        for mtime, size, path in sorted(self._entries()):
+            if path.endswith('.tmp'):
+                if now - mtime > STALE_TEMPORARY:
+                    self._remove(path)
+                    continue
+            else:
+                files.append((size, path))
+            total += size
+        for size, path in files:
+            if total <= self.max_size:
+                break
+            self._remove(path)
+            total -= size
+
+    def clear(self):
+        """ Remove all the cached files and the temporary files """
+        for mtime, size, path in self._entries():
+            self._remove(path)
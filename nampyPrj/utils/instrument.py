@@ -0,0 +1,209 @@
+import functools
+import inspect
+import time
+from contextvars import ContextVar
+
+_active_profilers = ContextVar('nampyPrj_active_profilers', default=())
+_inside_routine = ContextVar('nampyPrj_inside_routine', default=False)
+
+
+class FunctionStats:
+    """
+    Evaluation statistics of one user function
+
+    :param str routine: Name of the nampyPrj routine that received the function
+    :param str name: Name of the argument of the routine
+    """
+    def __init__(self, routine, name):
+        self.routine = routine
+        self.name = name
+        self.calls = 0
+        self.total_time = 0.0
+        self.points = 0  # evaluated points (an array argument counts all its elements)
+        self.max_batch = 0
+
+    @property
+    def time_per_call(self):
+        return self.total_time / self.calls if self.calls else 0.0
+
+    def as_dict(self):
+        return {'routine': self.routine, 'name': self.name, 'calls': self.calls,
+                'total_time': self.total_time, 'time_per_call': self.time_per_call,
+                'points': self.points, 'max_batch': self.max_batch}
+
+
+class Profiler:
+    """
+    Context manager collecting the number of calls, the time and the batch sizes of the
+    user functions passed to the nampyPrj routines, and the time spent in each routine.
+    No change of the user or library code is needed:
+
+    .. code ::
+
+        with Profiler() as profiler:
+            trapezoidal(f, 0, 1, 100)
+        print(profiler.summary())
+
+    Only the functions passed to the outermost routine are instrumented, so routines calling
+    other routines (e.g. midpoint_double2) are reported once.
+
+    :param on_evaluation: Hook called after each evaluation of a user function as
+                          on_evaluation(stats, args, elapsed); for the root finding methods and
+                          the ODE solvers it runs at every iteration or time step
+    :param on_routine: Hook called after each routine call as on_routine(name, elapsed)
+    """
+    def __init__(self, on_evaluation=None, on_routine=None):
+        self.on_evaluation = on_evaluation
+        self.on_routine = on_routine
+        self.functions = {}
+        self.routines = {}
+        self.events = {}
+        self._tokens = []
+
+    def __enter__(self):
+        self._tokens.append(_active_profilers.set(_active_profilers.get() + (self,)))
+        return self
+
+    def __exit__(self, *exc_info):
+        _active_profilers.reset(self._tokens.pop())
+        return False
+
+    def wrap(self, f, routine, name):
+        """
+        Instrumented version of f
+
+        :param f: User function
+        :param str routine: Name of the routine receiving f
+        :param str name: Name of the argument
+        """
+        key = (routine, name)
+        if key not in self.functions:
+            self.functions[key] = FunctionStats(routine, name)
+        stats = self.functions[key]
+
+        def record(args, elapsed):
+            batch = _batch_size(args[0]) if args else 1
+            stats.calls += 1
+            stats.total_time += elapsed
+            stats.points += batch
+            stats.max_batch = max(stats.max_batch, batch)
+            if self.on_evaluation is not None:
+                self.on_evaluation(stats, args, elapsed)
+
+        if inspect.iscoroutinefunction(f):
+            @functools.wraps(f)
+            async def instrumented(*args, **kwargs):
+                start = time.perf_counter()
+                result = await f(*args, **kwargs)
+                record(args, time.perf_counter() - start)
+                return result
+        else:
+            @functools.wraps(f)
+            def instrumented(*args, **kwargs):
+                start = time.perf_counter()
+                result = f(*args, **kwargs)
+                record(args, time.perf_counter() - start)
+                return result
+        return instrumented
+
+    def record_routine(self, name, elapsed):
+        calls, total = self.routines.get(name, (0, 0.0))
+        self.routines[name] = (calls + 1, total + elapsed)
+        if self.on_routine is not None:
+            self.on_routine(name, elapsed)
+
+    def record_event(self, name, count=1):
+        """ Increment the counter of a named event (e.g. a cache hit) """
+        self.events[name] = self.events.get(name, 0) + count
+
+    def stats(self):
+        """ Collected statistics as a JSON-serializable dictionary """
+        return {'functions': [s.as_dict() for s in self.functions.values()],
+                'routines': {name: {'calls': calls, 'total_time': total}
+                             for name, (calls, total) in self.routines.items()},
+                'events': dict(self.events)}
+
+    def summary(self):
+        """ Collected statistics as a text table """
+        lines = ['%-24s %-8s %10s %12s %14s %10s' %
+                 ('routine', 'function', 'calls', 'time [s]', 'per call [s]', 'points')]
+        for s in sorted(self.functions.values(), key=lambda s: -s.total_time):
+            lines.append('%-24s %-8s %10d %12.6f %14.3e %10d' %
+                         (s.routine, s.name, s.calls, s.total_time, s.time_per_call, s.points))
+        for name, (calls, total) in self.routines.items():
+            lines.append('%-24s %-8s %10d %12.6f' % (name, '(total)', calls, total))
+        for name, count in self.events.items():
+            lines.append('%-24s %10d' % (name, count))
+        return '\n'.join(lines)
+
+
+def _batch_size(x):
+    size = 1
+    for n in getattr(x, 'shape', ()):
+        size *= n
+    return size
+
+
+def active_profilers():
+    """ Profilers of the enclosing Profiler contexts """
+    return _active_profilers.get()
+
+
+def record_event(name, count=1):
+    """ Increment the counter of a named event in every active profiler """
+    for profiler in _active_profilers.get():
+        profiler.record_event(name, count)
+
+
+def profiled(routine):
+    """
+    Decorator of the public nampyPrj routines. Inside a Profiler context the callable arguments
+    of the routine are instrumented and the routine is timed; otherwise the routine is called
+    unchanged.
+    """
+    signature = inspect.signature(routine)
+    name = routine.__name__
+
+    def instrument_arguments(profilers, args, kwargs):
+        bound = signature.bind(*args, **kwargs)
+        for argument, value in bound.arguments.items():
+            if callable(value) and not isinstance(value, type):
+                for profiler in profilers:
+                    value = profiler.wrap(value, name, argument)
+                bound.arguments[argument] = value
+        return bound
+
+    if inspect.iscoroutinefunction(routine):
+        @functools.wraps(routine)
+        async def wrapper(*args, **kwargs):
+            profilers = _active_profilers.get()
+            if not profilers or _inside_routine.get():
+                return await routine(*args, **kwargs)
+            bound = instrument_arguments(profilers, args, kwargs)
+            token = _inside_routine.set(True)
+            start = time.perf_counter()
+            try:
+                return await routine(*bound.args, **bound.kwargs)
+            finally:
+                elapsed = time.perf_counter() - start
+                _inside_routine.reset(token)
+                for profiler in profilers:
+                    profiler.record_routine(name, elapsed)
+        return wrapper
+
+    @functools.wraps(routine)
+    def wrapper(*args, **kwargs):
+        profilers = _active_profilers.get()
+        if not profilers or _inside_routine.get():
+            return routine(*args, **kwargs)
+        bound = instrument_arguments(profilers, args, kwargs)
+        token = _inside_routine.set(True)
+        start = time.perf_counter()
+        try:
+            return routine(*bound.args, **bound.kwargs)
+        finally:
+            elapsed = time.perf_counter() - start
+            _inside_routine.reset(token)
+            for profiler in profilers:
+                profiler.record_routine(name, elapsed)
+    return wrapper
@@ -0,0 +1,139 @@
+from numpy import asarray, empty, empty_like, result_type, vdot, multiply, subtract
+
+
+def factor_tridiagonal(lower, diagonal, upper):
+    r"""
+    LU factorization of a tridiagonal matrix (forward elimination of the Thomas algorithm,
+    without pivoting). The matrix must be diagonally dominant or symmetric positive definite.
+    Factor once and call solve_factored_tridiagonal for every right-hand side of a sequence
+    of systems with the same matrix.
+
+    .. math ::
+        l_i x_{i-1} + d_i x_i + u_i x_{i+1} = r_i, \quad i = 0, \dots, n-1
+
+        w_0 = \frac{1}{d_0}, \quad c_{i-1} = u_{i-1} w_{i-1}, \quad
+        w_i = \frac{1}{d_i - l_i c_{i-1}}
+
+    :param lower: Sub-diagonal l_1 ... l_{n-1} (n-1 values)
+    :param diagonal: Diagonal d_0 ... d_{n-1} (n values)
+    :param upper: Super-diagonal u_0 ... u_{n-2} (n-1 values)
+    :return: Factors (l, c, w): sub-diagonal, eliminated super-diagonal and inverse pivots
+    """
+    lower = asarray(lower)
+    diagonal = asarray(diagonal)
+    upper = asarray(upper)
+    dtype = result_type(lower, diagonal, upper, float)
+    l, d, u = lower.tolist(), diagonal.tolist(), upper.tolist()
+    n = len(d)
+    c = [0.]*(n - 1)
+    w = [0.]*n
+    # Plain floats: the recurrence is sequential and numpy scalars are slower
+    w[0] = 1 / d[0]
+    for i in range(1, n):
+        c[i-1] = u[i-1]*w[i-1]
+        w[i] = 1 / (d[i] - l[i-1]*c[i-1])
+    return asarray(l, dtype=dtype), asarray(c, dtype=dtype), asarray(w, dtype=dtype)
+
+
+def solve_factored_tridiagonal(factors, rhs, out=None):
+    """
+    Solution of a tridiagonal linear system factored by factor_tridiagonal (forward and back
+    substitution, O(n) operations). With several right-hand sides every row step is one
+    operation on all the columns.
+
+    :param factors: Output of factor_tridiagonal
+    :param rhs: Right-hand side, n values or n rows of several right-hand sides
+    :param out: Output array of the shape of rhs (may be rhs). If None a new array is returned
+    """
+    lower, c, w = factors
+    rhs = asarray(rhs)
+    n = len(w)
+    x = empty(rhs.shape, dtype=result_type(w, rhs)) if out is None else out
+    l, c, w = lower.tolist(), c.tolist(), w.tolist()
+    if rhs.ndim == 1:
+        y = rhs.tolist()
+        y[0] *= w[0]
+        for i in range(1, n):
+            y[i] = (y[i] - l[i-1]*y[i-1])*w[i]
+        for i in range(n - 2, -1, -1):
+            y[i] -= c[i]*y[i+1]
+        x[...] = y
+        return x
+
+    if x is not rhs:
+        x[...] = rhs
+    scratch = empty(x.shape[1:], dtype=x.dtype)
+    multiply(x[0], w[0], out=x[0])
+    for i in range(1, n):
+        multiply(x[i-1], l[i-1], out=scratch)
+        subtract(x[i], scratch, out=x[i])
+        multiply(x[i], w[i], out=x[i])
+    for i in range(n - 2, -1, -1):
+        multiply(x[i+1], c[i], out=scratch)
+        subtract(x[i], scratch, out=x[i])
+    return x
+
+
+def solve_tridiagonal(lower, diagonal, upper, rhs, out=None):
+    r"""
+    Solution of a tridiagonal linear system with the Thomas algorithm (Gaussian elimination
+    without pivoting, O(n) operations and memory). The matrix must be diagonally dominant
+    or symmetric positive definite. To solve several systems with the same matrix in
+    sequence, use factor_tridiagonal and solve_factored_tridiagonal.
+
+    .. math ::
+        l_i x_{i-1} + d_i x_i + u_i x_{i+1} = r_i, \quad i = 0, \dots, n-1
+
+    :param lower: Sub-diagonal l_1 ... l_{n-1} (n-1 values)
+    :param diagonal: Diagonal d_0 ... d_{n-1} (n values)
+    :param upper: Super-diagonal u_0 ... u_{n-2} (n-1 values)
+    :param rhs: Right-hand side, n values or n rows of several right-hand sides
+    :param out: Output array of the shape of rhs (may be rhs). If None a new array is returned
+    """
+    return solve_factored_tridiagonal(factor_tridiagonal(lower, diagonal, upper), rhs, out)
+
+
+def solve_cg(apply, b, x0=None, eps=1E-10, max_iterations=None):
+    r"""
+    Conjugate gradient method for a symmetric positive definite linear system A x = b, with
+    A given as a function (matrix-free). The work arrays are allocated once and apply is
+    expected to write A p into its out argument.
+
+    The iterations stop when the residual norm is below eps times the norm of b.
+
+    :param apply: Function apply(p, out) writing A p into out, of any array shape
+    :param b: Right-hand side
+    :param x0: Initial guess. If None zero
+    :param float eps: Relative tolerance on the residual norm
+    :param int max_iterations: Max number of iterations. If None the size of b
+    :return: Solution x and number of iterations, -1 if the tolerance was not met
+    """
+    b = asarray(b, dtype=float)
+    max_iterations = b.size if max_iterations is None else max_iterations
+    x = empty_like(b)
+    r = empty_like(b)
+    Ap = empty_like(b)
+    if x0 is None:
+        x[...] = 0
+        r[...] = b
+    else:
+        x[...] = x0
+        apply(x, Ap)
+        r[...] = b - Ap
+    p = r.copy()
+    rr = vdot(r, r)
+    tolerance = eps**2 * max(vdot(b, b), 1E-300)
+    for iteration in range(max_iterations + 1):
+        if rr <= tolerance:
+            return x, iteration
+        if iteration == max_iterations:
+            break
+        apply(p, Ap)
+        alpha = rr / vdot(p, Ap)
+        x += alpha*p
+        r -= alpha*Ap
+        rr_new = vdot(r, r)
+        p *= rr_new / rr
+        p += r
+        rr = rr_new
+    return x, -1
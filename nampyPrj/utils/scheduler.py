@@ -0,0 +1,55 @@
+import asyncio
+import contextvars
+import functools
+import inspect
+
+import numpy as np
+
+
+class AsyncEvaluator:
+    """
+    Asynchronous evaluation scheduler. Many evaluations of f are issued concurrently,
+    at most concurrency at a time. f can be a coroutine function (e.g. a client of a
+    simulation service) or a regular function, which is then run in the default thread pool.
+    If f accepts arrays, batch_size points are sent in each call.
+
+    :param f: Function or coroutine function
+    :param int concurrency: Max number of evaluations in flight
+    :param int batch_size: Number of points per call of a vectorized f. If None f is called
+                           point by point
+    """
+    def __init__(self, f, concurrency=16, batch_size=None):
+        self.f = f
+        self.concurrency = concurrency
+        self.batch_size = batch_size
+        self._semaphore = None
+
+    async def __call__(self, *args):
+        """ One evaluation of f, within the concurrency limit """
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.concurrency)
+        async with self._semaphore:
+            if inspect.iscoroutinefunction(self.f):
+                return await self.f(*args)
+            call = functools.partial(contextvars.copy_context().run, self.f, *args)
+            return await asyncio.get_running_loop().run_in_executor(None, call)
+
+    async def map(self, *args):
+        """
+        Values of f at all the points, as an array of the broadcast shape of the arguments
+
+        :param args: Arrays of coordinates of the points
+        """
+        arrays = np.broadcast_arrays(*[np.asarray(a, dtype=float) for a in args])
+        shape = arrays[0].shape
+        flat = [a.ravel() for a in arrays]
+        n = flat[0].size
+        if self.batch_size is None:
+            values = await asyncio.gather(*[self(*[a[i] for a in flat]) for i in range(n)])
+            return np.asarray(values, dtype=float).reshape(shape)
+        starts = range(0, n, self.batch_size)
+        batches = await asyncio.gather(*[self(*[a[i:i + self.batch_size] for a in flat])
+                                         for i in starts])
+        return np.concatenate([np.broadcast_to(np.asarray(b, dtype=float),
+                                               (min(self.batch_size, n - i),))
+                               for i, b in zip(starts, batches)]).reshape(shape)
@@ -0,0 +1,89 @@
+from numpy import empty, full, nan, shape, asarray, concatenate, nanmin, nanmean, nanmax
+
+
+class IterationTrace:
+    """
+    Iteration history recorder backed by preallocated NumPy arrays.
+    Each record stores an iterate x, the function value f(x) and the step size.
+    Records can be scalars or arrays of a fixed shape (a batch of problems, the state of an ODE).
+    The root solvers record each new iterate with the step that produced it; root_bisection
+    takes no step and stores the half-width of the new bracket in the step column. The ODE
+    solvers record each state u^n with f(u^n, t_n) and the time step taken from it.
+
+    With keep_last=k the recorder is a ring buffer that only keeps the last k records.
+    Otherwise the storage starts with capacity records and doubles when full.
+
+    :param int capacity: Initial number of records
+    :param int keep_last: Number of records kept in ring-buffer mode
+    :param dtype: Data type of the records
+    """
+    def __init__(self, capacity=64, keep_last=None, dtype=float):
+        self.keep_last = keep_last
+        self.capacity = keep_last if keep_last is not None else capacity
+        self.dtype = dtype
+        self.count = 0  # total number of records, including the discarded ones
+        self._x = self._fx = self._step = None
+
+    def _allocate(self, record_shape):
+        self._x = empty((self.capacity,) + record_shape, dtype=self.dtype)
+        self._fx = full((self.capacity,) + record_shape, nan, dtype=self.dtype)
+        self._step = full((self.capacity,) + record_shape, nan, dtype=self.dtype)
+
+    def _grow(self):
+        self.capacity *= 2
+        self._x = concatenate((self._x, empty(self._x.shape, dtype=self.dtype)))
+        self._fx = concatenate((self._fx, full(self._fx.shape, nan, dtype=self.dtype)))
+        self._step = concatenate((self._step, full(self._step.shape, nan, dtype=self.dtype)))
+
+    def record(self, x, fx=nan, step=nan):
+        """
+        Store one record
+
+        :param x: Iterate
+        :param fx: Function value at the iterate
+        :param step: Step size
+        """
+        if self._x is None:
+            self._allocate(shape(x))
+        if self.keep_last is not None:
+            i = self.count % self.capacity
+        else:
+            if self.count == self.capacity:
+                self._grow()
+            i = self.count
+        self._x[i] = x
+        self._fx[i] = fx
+        self._step[i] = step
+        self.count += 1
+
+    def __len__(self):
+        return min(self.count, self.capacity)
+
+    def _ordered(self, a):
+        """ Stored records, oldest first (a view unless the ring buffer has wrapped) """
+        if a is None:
+            return empty(0, dtype=self.dtype)
+        if self.keep_last is None or self.count <= self.capacity:
+            return a[:len(self)]
+        i = self.count % self.capacity
+        return concatenate((a[i:], a[:i]))
+
+    @property
+    def x(self):
+        return self._ordered(self._x)
+
+    @property
+    def fx(self):
+        return self._ordered(self._fx)
+
+    @property
+    def step(self):
+        return self._ordered(self._step)
+
+    def statistics(self):
+        """ Number of records and min/mean/max of the absolute step sizes """
+        step = abs(asarray(self.step))
+        if step.size == 0 or (step != step).all():
+            return {'count': self.count, 'min_step': nan, 'mean_step': nan, 'max_step': nan}
+        return {'count': self.count, 'min_step': nanmin(step), 'mean_step': nanmean(step),
+                'max_step': nanmax(step)}
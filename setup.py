@@ -17,7 +17,6 @@ setup(
     description="Demo Numerical Analysis library",
     long_description=long_description,
     long_description_content_type="text/markdown",
-    package_dir={'': 'nampyPrj'},
     url="https://github.com/GiordiR/nampy",
     author="Riccardo Giordani",
     author_email="riccardo.giordani93@gmail.com",
@@ -28,7 +27,13 @@ setup(
         "Programming Language :: Python :: 3.10",
         "Operating System :: OS Independent"
     ],
-    packages=find_packages('nampyPrj'),
+    packages=find_packages(include=['nampyPrj', 'nampyPrj.*']),
     include_package_data=True,
-    install_requires=['numpy', 'sympy', 'matplotlib']
+    install_requires=['numpy', 'sympy', 'matplotlib'],
+    # scipy.signal.lfilter runs the linear recurrence of ode_EulerCromer in compiled code
+    extras_require={'fast': ['scipy']},
+    entry_points={
+        'console_scripts': ['nampy-benchmark=nampyPrj.benchmark.benchmark:cli',
+                            'nampy-batch=nampyPrj.batch.batch:cli'],
+    }
 )
@@ -9,14 +9,14 @@ def application_root_Newton():
     #def dfdx(x):
     #    return 2*x
     dfdx = None
-    solution, no_iterations = root_NewtonRaphson(f, 1000, dfdx, 1E-6, 100, return_x_list=True)
+    result = root_NewtonRaphson(f, 1000, dfdx, 1E-6, 100, return_x_list=True, full_output=True)
 
-    if no_iterations > 0:  # Solution found
-        print("Number of function calls: %d" % (1 + 2 * no_iterations))
-        print("A solution is: %f" % (solution[-1]))
-        print_rates('Newton', solution, 3)
+    if result.converged:  # Solution found
+        print("Number of function calls: %d" % result.function_calls)
+        print("A solution is: %f" % result.root)
+        print_rates('Newton', result.x_list, 3)
     else:
-        print("Solution not found!")
+        print("Solution not found! (%s)" % result.reason)
 
 
 def application_root_secant():
@@ -26,14 +26,14 @@ def application_root_secant():
 
     x0 = 1000
     x1 = x0 - 1
-    solution, no_iterations = root_secant(f, x0, x1, 1.0e-6, 100, return_x_list=True)
+    result = root_secant(f, x0, x1, 1.0e-6, 100, return_x_list=True, full_output=True)
 
-    if no_iterations > 0:  # Solution found
-        print("Number of function calls: %d" % (2 + no_iterations))
-        print("A solution is: %f" % (solution[-1]))
-        print_rates('Secant', solution, 3)
+    if result.converged:  # Solution found
+        print("Number of function calls: %d" % result.function_calls)
+        print("A solution is: %f" % result.root)
+        print_rates('Secant', result.x_list, 3)
     else:
-        print("Solution not found!")
+        print("Solution not found! (%s)" % result.reason)
 
 
 def application_root_bisection():
@@ -44,11 +44,11 @@ def application_root_bisection():
     a = 0
     b = 1000
 
-    solution, no_iterations = root_bisection(f, a, b, eps=1.0e-6, return_x_list=True)
+    result = root_bisection(f, a, b, eps=1.0e-6, return_x_list=True, full_output=True)
 
-    print("Number of function calls: %d" % (1 + 2 * no_iterations))
-    print("A solution is: %f" % (solution[-1]))
-    print_rates('Bisection', solution, 3)
+    print("Number of function calls: %d" % result.function_calls)
+    print("A solution is: %f" % result.root)
+    print_rates('Bisection', result.x_list, 3)
 
 
 def print_rates(method, x, x_exact):
@@ -0,0 +1,61 @@
+import csv
+import json
+from math import exp, sqrt
+from nampyPrj.batch.batch import main, cli, read_jobs, run_batch
+
+
+def test_batch_csv(tmp_path):
+    """A CSV sweep runs on the process pool and streams one record per job"""
+    jobs = tmp_path / 'jobs.csv'
+    with open(jobs, 'w', newline='') as file:
+        writer = csv.writer(file)
+        writer.writerow(['method', 'f', 'a', 'b', 'n', 'x', 'dfdx', 'eps', 'U0', 'dt', 'T'])
+        for n in 10, 100, 1000:
+            writer.writerow(['trapezoidal_vec', 'exp(x)', 0, 1, n, '', '', '', '', '', ''])
+        writer.writerow(['root_NewtonRaphson', 'x**2 - 9', '', '', '', 1000, '2*x', 1E-10,
+                         '', '', ''])
+        writer.writerow(['ode_system_FE', '["u1", "-u0"]', '', '', '', '', '', '', '[1, 0]',
+                         0.001, 1])
+        writer.writerow(['root_secant', 'x**2 - 9', '', '', '', '', '', '', '', '', ''])
+        # Constant integrand: the expression is not read as a number
+        writer.writerow(['trapezoidal', '1', 0, 2, 4, '', '', '', '', '', ''])
+    output = tmp_path / 'results.csv'
+    summary = main([str(jobs), '--processes', '2', '--chunksize', '2', '--quiet',
+                    '--output', str(output)])
+    with open(output, newline='') as file:
+        records = {int(r['id']): r for r in csv.DictReader(file)}
+    assert summary['jobs'] == len(records) == 7 and summary['failed'] == 1
+    assert abs(float(records[2]['value']) - (exp(1) - 1)) < 1E-6
+    assert float(records[3]['value']) == 3.0 and records[3]['converged'] == 'True'
+    assert json.loads(records[4]['value'])[1] < 0 and records[4]['points'] == '1001'
+    assert records[5]['status'] == 'error'
+    assert summary['methods']['trapezoidal_vec']['jobs'] == 3
+    assert records[6]['status'] == 'ok' and float(records[6]['value']) == 2.0
+
+
+def test_batch_json(tmp_path):
+    jobs = tmp_path / 'jobs.json'
+    jobs.write_text(json.dumps({
+        'defaults': {'eps': 1E-10},
+        'jobs': [{'method': 'root_Newton_system', 'F': ['x0**2 + x1**2 - 4', 'x0 - x1'],
+                  'x': [1, 0.5]},
+                 {'id': 'triple', 'method': 'midpoint_triple', 'g': '1', 'a': 0, 'b': 2,
+                  'c': 0, 'd': 1, 'e': 0, 'f': 1, 'nx': 2, 'ny': 2, 'nz': 2, 'eps': None}]}))
+    from concurrent.futures import ThreadPoolExecutor
+    output = tmp_path / 'results.jsonl'
+    with open(output, 'w') as file, ThreadPoolExecutor(2) as executor:
+        summary = run_batch(read_jobs(str(jobs)), file, executor=executor)
+    records = {r['id']: r for r in map(json.loads, output.read_text().splitlines())}
+    assert abs(records[0]['value'][0] - sqrt(2)) < 1E-10
+    # Unknown arguments fail the job, not the batch
+    assert records['triple']['status'] == 'error' and summary['failed'] == 1
+
+
+def test_batch_cli(tmp_path):
+    """The console script returns 0 when all the jobs succeed and 1 otherwise"""
+    jobs = tmp_path / 'jobs.json'
+    jobs.write_text(json.dumps([{'method': 'trapezoidal', 'f': 'x', 'a': 0, 'b': 1, 'n': 4}]))
+    output = str(tmp_path / 'results.jsonl')
+    assert cli([str(jobs), '--processes', '1', '--quiet', '--output', output]) == 0
+    jobs.write_text(json.dumps([{'method': 'trapezoidal', 'f': 'x', 'a': 0}]))
+    assert cli([str(jobs), '--processes', '1', '--quiet', '--output', output]) == 1
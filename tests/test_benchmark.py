@@ -0,0 +1,21 @@
+import json
+from nampyPrj.benchmark.benchmark import main
+
+
+def test_benchmark_report(tmp_path):
+    """The quick suite runs and writes a JSON report"""
+    output = tmp_path / 'report.json'
+    main(['--groups', 'integral', 'ode', '--repeat', '1', '--quiet', '--output', str(output)])
+    report = json.loads(output.read_text())
+    names = {r['name'] for r in report['results']}
+    assert {'trapezoidal', 'trapezoidal_vec', 'ode_system_FE'} <= names
+    assert all(r['error'] < 0.3 for r in report['results'])
+    assert all('peak_memory' in r for r in report['results'] if r['group'] == 'ode')
+    assert len(report['comparisons']) == 4
+
+
+def test_benchmark_cli(tmp_path):
+    """The console script returns an exit status, not the report"""
+    from nampyPrj.benchmark.benchmark import cli
+    assert cli(['--groups', 'root', '--repeat', '1', '--quiet',
+                '--output', str(tmp_path / 'report.json')]) == 0
@@ -0,0 +1,85 @@
+import numpy as np
+
+from nampyPrj.convergence.convergence import (convergence_study, integral_convergence,
+                                              ode_convergence)
+from nampyPrj.integral.integral import midpoint
+from nampyPrj.integral.integral_vec import trapezoidal_refined, trapezoidal_vec
+from nampyPrj.ode.ode import ode_FE, ode_RK4
+
+
+def test_convergence_study():
+    """Observed order and Richardson estimates of the midpoint method, levels in threads"""
+    from concurrent.futures import ThreadPoolExecutor
+    f = lambda t: 3 * t ** 2 * np.exp(t ** 3)
+    exact = np.exp(1) - 1
+    with ThreadPoolExecutor(2) as executor:
+        study = convergence_study(lambda n: midpoint(f, 0, 1, n), [8, 16, 32, 64], executor=executor)
+    assert abs(study.orders[-1] - 2) < 0.01 and np.isnan(study.orders[:2]).all()
+    # Richardson estimate close to the true error, extrapolation much more accurate
+    assert abs(study.errors[-1] / abs(study.values[-1] - exact) - 1) < 0.01
+    assert abs(study.extrapolated[-1] - exact) < 1E-5
+
+    study = convergence_study(lambda n: midpoint(f, 0, 1, n), [8, 16, 32, 64], exact=exact)
+    assert study.exact_errors and abs(study.orders[-1] - 2) < 0.01
+    assert study.resolution_for(1E-2) == 1 / 16.
+    h = study.resolution_for(1E-8)
+    assert abs(midpoint(f, 0, 1, int(np.ceil(1 / h))) - exact) < 1.1E-8
+    # NumPy integer levels are numbers of subdivisions too
+    study = convergence_study(lambda n: midpoint(f, 0, 1, int(n)), 2 ** np.arange(3, 7))
+    assert np.allclose(study.h, [1 / 8., 1 / 16., 1 / 32., 1 / 64.])
+
+
+def test_integral_convergence():
+    """Nested trapezoidal grids reproduce the direct computation"""
+    values, n = trapezoidal_refined(np.exp, 0, 1, 2, 6)
+    assert n == [2, 4, 8, 16, 32, 64]
+    assert np.allclose(values, [trapezoidal_vec(np.exp, 0, 1, k) for k in n], rtol=1E-14)
+    study = integral_convergence(np.exp, 0, 1, 2, 10, exact=np.exp(1) - 1)
+    assert abs(study.orders[-1] - 2) < 1E-3
+    assert abs(study.extrapolated[-1] - (np.exp(1) - 1)) < 1E-12
+    # Each refinement is timed separately
+    assert len(study.times) == 10 and all(t >= 0 for t in study.times)
+
+
+def test_ode_convergence():
+    study = ode_convergence(ode_FE, lambda u, t: -u, 1.0, 0.1, 2, 5, exact=lambda t: np.exp(-t))
+    assert abs(study.orders[-1] - 1) < 0.01 and study.values[-1].shape == (21,)
+    study = ode_convergence(ode_RK4, lambda u, t: [u[1], -u[0]], [1, 0], 0.1, 2, 4)
+    assert abs(study.orders[-1] - 4) < 0.05 and study.errors[-1] < 1E-9
+    # T/dt not an integer: dt is adjusted so that the grids of the levels nest
+    study = ode_convergence(ode_FE, lambda u, t: -u, 1.0, 0.3, 1.0, levels=4,
+                            exact=lambda t: np.exp(-t))
+    assert study.h[0] == 1 / 3 and study.values[-1].shape == (4,)
+    assert abs(study.orders[-1] - 1) < 0.1
+
+
+def test_tolerance_driven():
+    """Integrals and ODE solutions to a tolerance, with the cost spent"""
+    import pytest
+    from nampyPrj.convergence.tolerance import trapezoidal_tol, midpoint_tol, ode_tol
+    from nampyPrj.root.root import ConvergenceError
+    f = lambda t: 3 * t ** 2 * np.exp(t ** 3)
+    exact = np.exp(1) - 1
+    for method in trapezoidal_tol, midpoint_tol:
+        result = method(f, 0, 1, rtol=1E-8)
+        assert result.converged and abs(result.value - exact) < 2E-8 * exact
+        # All the evaluations are reused: the cost is the one of the finest grid
+        assert result.evaluations <= result.resolution + 1
+    with pytest.raises(ConvergenceError):
+        trapezoidal_tol(f, 0, 1, rtol=1E-15, max_n=64, raise_on_failure=True)
+    # Oscillating integrand vanishing at the nodes of the first levels (aliasing)
+    g = lambda x: x * np.sin(8 * np.pi * x)
+    for method in trapezoidal_tol, midpoint_tol:
+        result = method(g, 0, 1, atol=1E-10)
+        assert result.converged and abs(result.value + 1 / (8 * np.pi)) < 1E-9
+    assert not trapezoidal_tol(g, 0, 1, atol=1E-10, max_n=8).converged
+
+    result = ode_tol(ode_RK4, lambda u, t: [u[1], -u[0]], [1, 0], 10, rtol=1E-8)
+    assert result.converged and result.value.shape == (9, 2)
+    assert abs(result.value[:, 0] - np.cos(result.t)).max() < 1E-8
+    result = ode_tol(ode_FE, lambda u, t: -u, 1.0, 2, rtol=1E-4, order=None)
+    assert result.converged and abs(result.value - np.exp(-result.t)).max() < 2E-4
+    # T/dt not an integer: the levels still share the grid of the first one
+    result = ode_tol(ode_FE, lambda u, t: -u, 1.0, 1.0, rtol=1E-4, dt=0.3)
+    assert result.converged and result.t[-1] == 1.0 and len(result.t) == 4
+    assert abs(result.value - np.exp(-result.t)).max() < 2E-4
@@ -1,5 +1,6 @@
 from nampyPrj.integral.integral import *
 from nampyPrj.integral.integral_vec import *
+from nampyPrj.integral.integral_data import *
 
 
 def test_trapezoidal_one_exact_result():
@@ -255,3 +256,97 @@ def test_MonteCarlo_double_circle_r():
                                    g, x0, x1, y0, y1, n)
     print('MC approximation %d samples: %.16f' % (n ** 2, I_computed))
     assert (abs(I_expected - I_computed) < 1E-15)
+
+
+def test_data_chunked_equals_unchunked():
+    """Chunk boundaries do not change the trapezoidal and Simpson results"""
+    x = np.linspace(0, 2, 1002)  # odd number of intervals
+    y = np.exp(x)
+    h = x[1] - x[0]
+    for integrate in trapezoidal_data, simpson_data:
+        expected = integrate(y, x)
+        for chunk_size in 2, 7, 64:
+            assert abs(integrate(y, x, chunk_size=chunk_size) - expected) < 1E-13
+            assert abs(integrate(y, dx=h, chunk_size=chunk_size) - expected) < 1E-12
+    assert abs(trapezoidal_data(y, x) - trapezoidal_vec(np.exp, 0, 2, 1001)) < 1E-13
+
+
+def test_simpson_data_quadratic():
+    """Simpson's rule integrates quadratics exactly, also on non-uniform grids"""
+    np.random.seed(3)
+    for n in 20, 21:
+        x = np.sort(np.random.uniform(0, 2, n))
+        y = 3 * x ** 2 - 2 * x
+        F = lambda x: x ** 3 - x ** 2
+        assert abs(simpson_data(y, x, chunk_size=6) - (F(x[-1]) - F(x[0]))) < 1E-12
+
+
+def test_cumulative_trapezoidal_data_memmap(tmp_path):
+    x = np.linspace(0, 1, 101)
+    y = np.memmap(str(tmp_path / 'y.dat'), dtype=np.float32, mode='w+', shape=x.shape)
+    y[:] = 6 * x - 4
+    out = cumulative_trapezoidal_data(y, dx=0.01, out=str(tmp_path / 'I.dat'), chunk_size=16)
+    assert isinstance(out, np.memmap)
+    assert np.allclose(out, 3 * x ** 2 - 4 * x, atol=1E-6)
+    assert abs(out[-1] - trapezoidal_data(y, dx=0.01)) < 1E-12
+
+
+def test_cumulative_vec():
+    """The last cumulative value is the definite integral, linear functions are exact"""
+    f = lambda x: 6 * x - 4
+    F = lambda x: 3 * x ** 2 - 4 * x
+    for cumulative, integral in ((cumulative_trapezoidal_vec, trapezoidal_vec),
+                                 (cumulative_midpoint_vec, midpoint_vec)):
+        I, x = cumulative(f, 1.2, 4.4, 21)
+        assert len(I) == len(x) == 22
+        assert abs(I - (F(x) - F(1.2))).max() < 1E-12
+        I, x = cumulative(np.exp, 0, 1, 50)
+        assert abs(I[-1] - integral(np.exp, 0, 1, 50)) < 1E-14
+
+
+def test_running_integral_stream():
+    """Extending block by block gives the same values as one cumulative pass"""
+    I, x = cumulative_trapezoidal_vec(np.exp, 0, 1, 100)
+    y = np.exp(x)
+    uniform = RunningIntegral(dx=0.01)
+    nonuniform = RunningIntegral()
+    blocks = [(0, 1), (1, 40), (40, 40), (40, 101)]
+    computed = np.concatenate([uniform.extend(y[i:j]) for i, j in blocks])
+    assert abs(computed - I).max() < 1E-14
+    computed = np.concatenate([nonuniform.extend(y[i:j], x[i:j]) for i, j in blocks])
+    assert abs(computed - I).max() < 1E-14
+    assert uniform.count == 101 and abs(uniform.value - I[-1]) < 1E-14
+
+
+def test_async_integrals_concurrency():
+    """Async rules match the sync ones and never exceed the concurrency limit"""
+    import asyncio
+    from nampyPrj.integral.integral_async import (trapezoidal_async, midpoint_async,
+                                                  midpoint_double_async)
+    in_flight = [0, 0]  # current, max
+
+    async def f(x):
+        in_flight[0] += 1
+        in_flight[1] = max(in_flight)
+        await asyncio.sleep(0.001)
+        in_flight[0] -= 1
+        return 6 * x - 4
+
+    computed = asyncio.run(trapezoidal_async(f, 1.2, 4.4, 40, concurrency=8))
+    assert abs(computed - trapezoidal_vec(lambda x: 6 * x - 4, 1.2, 4.4, 40)) < 1E-12
+    assert in_flight[1] == 8
+    computed = asyncio.run(midpoint_async(np.exp, 0, 1, 50, batch_size=16))
+    assert abs(computed - midpoint_vec(np.exp, 0, 1, 50)) < 1E-14
+    computed = asyncio.run(midpoint_double_async(lambda x, y: 2 * x + y, 0, 2, 2, 3, 5, 3))
+    assert abs(computed - midpoint_double(lambda x, y: 2 * x + y, 0, 2, 2, 3, 5, 3)) < 1E-12
+
+
+def test_vec_float32_nodes():
+    """float32 nodes with float64 accumulation keep about 6 significant digits"""
+    f = lambda t: 3 * t ** 2 * np.exp(t ** 3)
+    exact = np.exp(1) - 1
+    for integrate in trapezoidal_vec, midpoint_vec:
+        computed = integrate(f, 0, 1, 100000, dtype=np.float32)
+        assert abs(computed - exact) / exact < 1E-6
+    I, x = cumulative_trapezoidal_vec(f, 0, 1, 1000, dtype=np.float32)
+    assert x.dtype == np.float32 and I.dtype == np.float64
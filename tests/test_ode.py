@@ -118,3 +118,313 @@ def _test_manufactured_solution(damping=True):
 def test_manufactured_solution_ode_EC():
     _test_manufactured_solution(damping=True)
     _test_manufactured_solution(damping=False)
+
+
+def test_ode_system_BE():
+    """Stiff linear system: backward Euler is stable and first order accurate,
+    with an explicit or an automatic Jacobian"""
+    from numpy import cos, exp
+
+    def f(u, t):
+        return [-1000 * (u[0] - cos(t)), -u[1]]
+
+    def J(u, t):
+        return [[-1000, 0], [0, -1]]
+
+    u, t = ode_system_BE(f, [0, 1], 0.01, 1)
+    u_J, t = ode_system_BE(f, [0, 1], 0.01, 1, J=J)
+    assert abs(u - u_J).max() < 1E-12
+    assert abs(u[-1, 0] - cos(1)) < 1E-2
+    assert abs(u[-1, 1] - exp(-1)) < 1E-2
+
+
+def test_ode_FE_trace():
+    from nampyPrj.utils.trace import IterationTrace
+    trace = IterationTrace(keep_last=10)
+    u, t = ode_FE(lambda u, t: 0.1 * u, 100, 0.5, 20, trace=trace)
+    assert trace.count == len(t) - 1
+    # State and right-hand side of the same step
+    assert abs(trace.x - u[-11:-1]).max() == 0
+    assert abs(trace.fx - 0.1 * trace.x).max() == 0
+    assert trace.statistics()['mean_step'] == 0.5
+
+
+def test_ode_system_FE_async_ensemble():
+    """Each trajectory of the ensemble matches the synchronous solver"""
+    import asyncio
+    from nampyPrj.ode.ode_async import ode_system_FE_async
+
+    async def f(u, t):
+        await asyncio.sleep(0)
+        return [u[1], -u[0]]
+
+    U0 = [[1, 0], [0, 1], [2, 0.5]]
+    u, t = asyncio.run(ode_system_FE_async(f, U0, 0.01, 1, concurrency=2))
+    assert u.shape == (101, 3, 2)
+    for k in range(3):
+        expected, t = ode_system_FE(lambda u, t: [u[1], -u[0]], U0[k], 0.01, 1)
+        assert abs(u[:, k] - expected).max() < 1E-14
+
+
+def test_ode_float32_compensated():
+    """Compensated float32 accumulation is much closer to the float64 solution"""
+    import numpy as np
+    f = lambda u, t: 0.1 * u
+    u64, t = ode_FE(f, 1.0, 1E-4, 10)
+    u32, t = ode_FE(f, 1.0, 1E-4, 10, dtype=np.float32)
+    u32c, t = ode_FE(f, 1.0, 1E-4, 10, dtype=np.float32, compensated=True)
+    assert u32.dtype == np.float32
+    assert abs(u32c[-1] - u64[-1]) < abs(u32[-1] - u64[-1]) / 10
+
+    # Ensemble of oscillators stored as a (steps, trajectories, 2) float32 array
+    g = lambda u, t: np.column_stack((u[:, 1], -u[:, 0]))
+    U0 = np.column_stack((np.linspace(0, 1, 50), np.zeros(50)))
+    u64, t = ode_system_FE(g, U0, 1E-3, 5)
+    u32c, t = ode_system_FE(g, U0, 1E-3, 5, dtype=np.float32, compensated=True)
+    assert u32c.shape == (5001, 50, 2) and u32c.dtype == np.float32
+    assert abs(u32c - u64).max() < 1E-6
+
+    u64, v64, t = ode_EulerCromer(lambda v: 0.3 * v, lambda u: u, np.sin, 1, 10, 1, 0, 1E-3)
+    u32, v32, t = ode_EulerCromer(lambda v: 0.3 * v, lambda u: u, np.sin, 1, 10, 1, 0, 1E-3,
+                                  dtype=np.float32, compensated=True)
+    assert abs(u32 - u64).max() < 1E-6
+
+
+def test_ode_output_times():
+    """Output selection, start time and non-uniform grids"""
+    import numpy as np
+    f = lambda u, t: -u
+    u, t = ode_FE(f, 1.0, 0.01, 2)
+    u_every, t_every = ode_FE(f, 1.0, 0.01, 2, save_every=30)
+    assert np.allclose(t_every, np.append(t[::30], 2.0))
+    assert np.array_equal(u_every, np.append(u[::30], u[-1]))
+
+    u_eval, t_eval = ode_FE(f, 1.0, 0.01, 2, t_eval=[0.5, 1.0, 2.0])
+    assert np.allclose(t_eval, [0.5, 1.0, 2.0])
+    assert np.array_equal(u_eval, u[[50, 100, 200]])
+
+    # Output time between grid points is inserted in the grid
+    u_mid, t_mid = ode_FE(f, 1.0, 0.01, 2, t_eval=[0.505])
+    assert t_mid[0] == 0.505 and u[51] < u_mid[0] < u[50]
+
+    u_shift, t_shift = ode_FE(lambda u, t: t, 0.0, 0.5, 3, t0=1)
+    assert t_shift[0] == 1 and t_shift[-1] == 3 and u_shift[-1] == 0.5*(1 + 1.5 + 2 + 2.5)
+
+    grid = np.concatenate((np.linspace(0, 1, 101), np.linspace(1.001, 2, 1000)))
+    u_grid, t_grid = ode_system_BE(lambda u, t: -u, [1.0], None, None, t=grid, t_eval=2.0)
+    assert abs(u_grid[0, 0] - np.exp(-2)) < 1E-2
+
+    # Forcing precomputed on the grid
+    args = (lambda v: 0.1*v, lambda u: u)
+    u, v, t = ode_EulerCromer(args[0], args[1], np.cos, 1, 10, 1, 0, 0.01)
+    u_vec, v_vec, t_vec = ode_EulerCromer(args[0], args[1], np.cos, 1, 10, 1, 0, 0.01,
+                                          vectorized_F=True, save_every=100)
+    u_arr, v_arr, t_arr = ode_EulerCromer(args[0], args[1], np.cos(t), 1, 10, 1, 0, 0.01)
+    assert np.array_equal(u_vec, u[::100]) and np.array_equal(u_arr, u)
+
+
+def test_ode_EC_linear_coefficients(monkeypatch):
+    """Linear damping and spring given as coefficients, with vectorized or scalar forcing"""
+    import math
+    import numpy as np
+    import nampyPrj.ode.ode as ode_module
+    b, k = 0.2, 4.0
+    u, v, t = ode_EulerCromer(lambda v: b*v, lambda u: k*u, lambda t: math.sin(t),
+                              1, 20, 1, 0, 1E-3)
+    u_lin, v_lin, t_lin = ode_EulerCromer(b, k, np.sin, 1, 20, 1, 0, 1E-3, vectorized_F=True)
+    assert np.allclose(u_lin, u, atol=1E-10) and np.allclose(v_lin, v, atol=1E-8)
+
+    # Loop on plain floats, also where scipy is installed
+    monkeypatch.setattr(ode_module, 'lfilter', None)
+    u_loop, v_loop, t_loop = ode_EulerCromer(b, k, np.sin, 1, 20, 1, 0, 1E-3, save_every=10,
+                                             vectorized_F=None)
+    assert np.allclose(u_loop, u[::10], atol=1E-12)
+
+    # Scalar-only forcing: evaluated step by step by default, and after a failed detection
+    F = lambda t: float(t.is_integer())
+    u_s, v_s, t_s = ode_EulerCromer(lambda v: b*v, lambda u: k*u, F, 1, 2, 1, 0, 0.5)
+    for vectorized_F in False, None:
+        u_c, v_c, t_c = ode_EulerCromer(b, k, F, 1, 2, 1, 0, 0.5, vectorized_F=vectorized_F)
+        assert np.allclose(u_c, u_s) and np.allclose(v_c, v_s)
+
+    # Time-dependent coefficient on the grid
+    k_t = k*np.ones(len(t))
+    u_t, v_t, t_t = ode_EulerCromer(b, k_t, np.sin(t), 1, 20, 1, 0, 1E-3)
+    assert np.allclose(u_t, u, atol=1E-12)
+
+
+def test_ode_EC_linear_lfilter(monkeypatch):
+    """The lfilter recurrence matches the loop on plain floats"""
+    import numpy as np
+    import pytest
+    import nampyPrj.ode.ode as ode_module
+    pytest.importorskip('scipy')
+    b, k = 0.2, 4.0
+    u, v, t = ode_EulerCromer(b, k, np.sin, 1, 20, 1, 0, 1E-3, save_every=7, vectorized_F=True)
+    monkeypatch.setattr(ode_module, 'lfilter', None)
+    u_loop, v_loop, t_loop = ode_EulerCromer(b, k, np.sin, 1, 20, 1, 0, 1E-3, save_every=7,
+                                             vectorized_F=True)
+    assert np.array_equal(t, t_loop)
+    # Same scheme, the rounding errors of the two recurrences differ
+    assert np.allclose(u, u_loop, rtol=0, atol=1E-9) and np.allclose(v, v_loop, rtol=0, atol=1E-9)
+
+
+def test_ode_RK4_order():
+    """Error of RK4 decreases as dt^4"""
+    import numpy as np
+    errors = [abs(ode_RK4(lambda u, t: -u, 1.0, dt, 1)[0][-1] - np.exp(-1)) for dt in (0.1, 0.05)]
+    assert 15 < errors[0] / errors[1] < 17
+    u, t = ode_RK4(lambda u, t: [u[1], -u[0]], [1, 0], 0.01, 1, save_every=50)
+    assert u.shape == (3, 2) and abs(u[-1, 0] - np.cos(1)) < 1E-9
+
+
+def _decay(u, t):
+    return -u * (1 + 0.5 * t)
+
+
+def test_ode_parareal():
+    """Parareal converges to the serial fine solution at the slice boundaries"""
+    import numpy as np
+    from concurrent.futures import ThreadPoolExecutor
+    from nampyPrj.ode.parareal import ode_parareal
+    with ThreadPoolExecutor(2) as executor:
+        result = ode_parareal(_decay, [1.0], 4, 8, 0.1, 1E-3, eps=1E-10, executor=executor,
+                              serial_reference=True)
+    assert result.converged and result.iterations < 8
+    assert result.serial_error < 1E-9 and result.speedup > 0
+    assert abs(result.u[-1, 0] - np.exp(-4 - 0.25 * 16)) < 1E-9
+
+    result = ode_parareal(_decay, [1.0], 2, 4, 0.1, 1E-2, processes=2, max_iterations=1)
+    assert result.iterations == 1 and len(result.corrections) == 1
+
+
+def test_bvp():
+    """Shooting, multiple shooting and finite differences for u'' = -u, u(0)=0, u(pi/2)=1"""
+    import numpy as np
+    import pytest
+    from concurrent.futures import ThreadPoolExecutor
+    from nampyPrj.ode.bvp import bvp_shooting, bvp_multiple_shooting, bvp_fd
+    f = lambda u, t: [u[1], -u[0]]
+    bc = lambda ua, ub: [ua[0], ub[0] - 1]
+    u, t = bvp_shooting(f, bc, [0, 0], 0, np.pi / 2, 0.01)
+    assert abs(u[:, 0] - np.sin(t)).max() < 1E-9 and abs(u[0, 1] - 1) < 1E-9
+
+    with ThreadPoolExecutor(2) as executor:
+        u, t = bvp_multiple_shooting(f, bc, [0, 0], np.linspace(0, np.pi / 2, 4), 0.01,
+                                     executor=executor)
+    assert abs(u[:, 0] - np.sin(t)).max() < 1E-9 and t[-1] == np.pi / 2
+
+    # Nonlinear problem u'' = 2u^3 with solution 1/(1+x), second order convergence
+    errors = []
+    for n in 50, 100:
+        u, x = bvp_fd(lambda x, u, v: 2 * u ** 3, 1, 2, 1 / 2., 1 / 3., n)
+        errors.append(abs(u - 1 / (1 + x)).max())
+    assert 3.5 < errors[0] / errors[1] < 4.5
+    u, x = bvp_fd(lambda x, u, v: 6 * x + u - x ** 3, 0, 1, 0, 1, 20)
+    assert abs(u - x ** 3).max() < 1E-13
+    with pytest.raises(ValueError):
+        bvp_fd(lambda x, u, v: u, 0, 1, 0, 1, 1)
+
+
+def test_mol_heat():
+    """Heat equation with sin modes, explicit and implicit solvers, 1-D and 2-D"""
+    import numpy as np
+    from nampyPrj.ode.mol import AdvectionDiffusion, Laplacian, mol_theta
+    n = 49
+    h = 1 / (n + 1)
+    x = np.linspace(h, 1 - h, n)
+    U0 = np.sin(np.pi * x)
+    exact = np.exp(-np.pi ** 2 * 0.1) * U0
+    system = AdvectionDiffusion(n, h)
+    u, t = ode_system_FE(system, U0, 0.4 * h ** 2, 0.1, save_every=10 ** 6)
+    assert abs(u[-1] - exact).max() < 2E-4
+    u, t = mol_theta(system, U0, 1E-3, 0.1)
+    assert abs(u[-1] - exact).max() < 2E-4
+
+    X, Y = np.meshgrid(x, x, indexing='ij')
+    U0 = np.sin(np.pi * X) * np.sin(2 * np.pi * Y)
+    system = AdvectionDiffusion((n, n), h, source=np.zeros((n, n)))
+    u, t = mol_theta(system, U0, 1E-3, 0.05, theta=1, save_every=10)
+    assert u.shape == (6, n, n)
+    assert abs(u[-1] - np.exp(-5 * np.pi ** 2 * 0.05) * U0).max() < 1E-2
+
+    # Symmetric operator, constants in the kernel with zero-flux conditions
+    L = Laplacian((4, 3), (0.1, 0.2), bc='neumann')
+    A = np.array([L(e.reshape(4, 3)).ravel() for e in np.eye(12)])
+    assert np.allclose(A, A.T) and np.allclose(A.sum(axis=1), 0)
+
+
+def test_mol_advection():
+    """Periodic advection of a sine wave for one period"""
+    import numpy as np
+    from nampyPrj.ode.mol import AdvectionDiffusion
+    n = 100
+    x = np.arange(n) / n
+    system = AdvectionDiffusion(n, 1 / n, alpha=0, velocity=[1.0], bc='periodic')
+    out = np.empty(n)
+    assert system(np.sin(2 * np.pi * x), 0, out) is out
+    u, t = ode_RK4(system, np.sin(2 * np.pi * x), 2E-3, 1.0, save_every=10 ** 6)
+    assert abs(u[-1] - np.sin(2 * np.pi * x)).max() < 5E-3
+
+
+def test_ode_inplace_rhs():
+    """In-place right-hand sides give the same solution as the returning ones"""
+    import numpy as np
+
+    def f(u, t):
+        return np.array([u[1], -u[0] + np.sin(t)])
+
+    def f_inplace(u, t, out):
+        out[0] = u[1]
+        out[1] = -u[0] + np.sin(t)
+
+    for solver in ode_system_FE, ode_RK4:
+        u, t = solver(f, [1, 0], 0.01, 5)
+        u_inplace, t = solver(f_inplace, [1, 0], 0.01, 5, inplace=True)
+        assert np.array_equal(u, u_inplace)
+    u, t = ode_system_FE(f, [1, 0], 0.01, 5, dtype=np.float32, compensated=True)
+    u_inplace, t = ode_system_FE(f_inplace, [1, 0], 0.01, 5, dtype=np.float32,
+                                 compensated=True, inplace=True)
+    assert np.array_equal(u, u_inplace)
+
+
+def _gbm_drift(u, t):
+    return 0.5 * u
+
+
+def _gbm_diffusion(u, t):
+    return 0.8 * u
+
+
+def test_sde():
+    """Strong error on geometric Brownian motion, statistics of batches run in processes"""
+    import numpy as np
+    from concurrent.futures import ProcessPoolExecutor
+    from nampyPrj.ode.sde import sde_EulerMaruyama, sde_Milstein
+    n, n_paths = 256, 2000
+    # The noise of a path depends only on the seed: W(1) from dW with no drift
+    W = sde_EulerMaruyama(lambda u, t: 0 * u, lambda u, t: 1, 0.0, 1 / n, 1, n_paths, rng=1,
+                          store_paths=True).paths[-1]
+    exact = np.exp((0.5 - 0.8 ** 2 / 2) + 0.8 * W)
+    errors = [abs(method(_gbm_drift, _gbm_diffusion, 1.0, 1 / n, 1, n_paths, rng=1,
+                         store_paths=True).paths[-1] - exact).mean()
+              for method in (sde_EulerMaruyama, sde_Milstein)]
+    assert errors[1] < errors[0] / 5
+
+    result = sde_Milstein(_gbm_drift, _gbm_diffusion, 1.0, 1E-2, 1, 4000, rng=3, batch_size=1000,
+                          store_paths=True, save_every=10)
+    assert result.mean.shape == (11,) and result.paths.shape == (11, 4000)
+    assert np.allclose(result.mean, result.paths.mean(axis=1))
+    assert np.allclose(result.var, result.paths.var(axis=1, ddof=1))
+    assert abs(result.mean[-1] - np.exp(0.5)) < 4 * np.sqrt(result.var[-1] / 4000)
+    # Same seed, same paths whatever the batch size
+    for batch_size in None, 700:
+        other = sde_Milstein(_gbm_drift, _gbm_diffusion, 1.0, 1E-2, 1, 4000, rng=3,
+                             batch_size=batch_size, store_paths=True, save_every=10)
+        assert np.array_equal(other.paths, result.paths)
+        assert np.allclose(other.mean, result.mean, rtol=1E-14)
+
+    with ProcessPoolExecutor(2) as executor:
+        parallel = sde_Milstein(_gbm_drift, _gbm_diffusion, 1.0, 1E-2, 1, 4000, rng=3,
+                                batch_size=1000, save_every=10, executor=executor)
+    assert parallel.paths is None and np.array_equal(parallel.mean, result.mean)
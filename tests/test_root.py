@@ -0,0 +1,136 @@
+import pytest
+import numpy as np
+from nampyPrj.root.root import (root_NewtonRaphson, root_Newton_system, root_secant,
+                                 root_bisection, root_brent, RootFindingError, DerivativeZeroError, InvalidBracketError,
+                                 ConvergenceError)
+from nampyPrj.root.root_vec import root_polynomial, root_scan
+
+
+def test_NewtonRaphson_quadratic():
+    """Check the root and the evaluation counts of x**2 - 9"""
+    result = root_NewtonRaphson(lambda x: x ** 2 - 9, 1000, lambda x: 2 * x, 1E-6, 100,
+                                full_output=True)
+    assert result.converged
+    assert abs(result.root - 3) < 1E-6
+    assert result.function_calls == result.iterations + 1
+
+
+def test_NewtonRaphson_legacy_output():
+    """Check that the (x, iterations) output is unchanged"""
+    x, no_iterations = root_NewtonRaphson(lambda x: x ** 2 - 9, 1000, None, 1E-6, 100)
+    assert abs(x - 3) < 1E-6 and no_iterations > 0
+    x, no_iterations = root_NewtonRaphson(lambda x: x ** 2 - 9, 1000, None, 1E-6, 2)
+    assert no_iterations == -1
+
+
+def test_NewtonRaphson_zero_derivative():
+    """A vanishing derivative raises instead of exiting"""
+    with pytest.raises(DerivativeZeroError) as error:
+        root_NewtonRaphson(lambda x: x ** 2 - 9, 0, lambda x: 2 * x, 1E-6, 100)
+    assert error.value.result.iterations == 0
+    assert isinstance(error.value, RootFindingError)
+
+
+def test_NewtonRaphson_raise_on_failure():
+    with pytest.raises(ConvergenceError) as error:
+        root_NewtonRaphson(lambda x: x ** 2 - 9, 1000, lambda x: 2 * x, 1E-6, 3,
+                           raise_on_failure=True)
+    assert not error.value.result.converged
+    assert error.value.result.iterations == 3
+
+
+def test_secant_quadratic():
+    result = root_secant(lambda x: x ** 2 - 9, 1000, 999, 1E-6, 100,
+                         return_x_list=True, full_output=True)
+    assert result.converged
+    assert abs(result.root - 3) < 1E-6
+    assert result.function_calls == result.iterations + 2
+    assert result.x_list[-1] == result.root
+
+
+def test_secant_flat_function():
+    with pytest.raises(DerivativeZeroError):
+        root_secant(lambda x: 1.0, 0, 1, 1E-6, 100)
+
+
+def test_bisection_quadratic():
+    x, no_iterations = root_bisection(lambda x: x ** 2 - 9, 0, 1000, 1E-6)
+    assert abs(x - 3) < 1E-6
+    result = root_bisection(lambda x: x ** 2 - 9, 0, 1000, 1E-6, full_output=True)
+    assert result.function_calls == result.iterations + 2
+
+
+def test_bisection_invalid_bracket():
+    with pytest.raises(InvalidBracketError):
+        root_bisection(lambda x: x ** 2 - 9, 4, 1000, 1E-6)
+
+
+def test_brent_quadratic():
+    result = root_brent(lambda x: x ** 2 - 9, 0, 1000, 1E-12, full_output=True)
+    assert result.converged
+    assert abs(result.root - 3) < 1E-12
+    with pytest.raises(InvalidBracketError):
+        root_brent(lambda x: x ** 2 - 9, 4, 1000, 1E-12)
+
+
+def test_root_polynomial():
+    """Both methods recover known real and complex roots"""
+    expected = np.array([-4, 0, 0.5, 1, 2, 1j, -1j])
+    coefficients = np.poly(expected).real
+    for method in 'companion', 'aberth':
+        computed = root_polynomial(coefficients, method)
+        assert len(computed) == len(expected)
+        distance = np.abs(computed[:, None] - expected[None, :]).min(axis=0)
+        assert distance.max() < 1E-8, method
+
+
+def test_root_scan():
+    """All the roots of sin in [-10, 10] are found by both refinements"""
+    expected = np.pi * np.arange(-3, 4)
+    for method in 'bisection', 'brent':
+        computed = root_scan(np.sin, -10, 10, 97, eps=1E-12, method=method)
+        assert len(computed) == len(expected)
+        assert np.allclose(computed, expected, atol=1E-10), method
+
+
+def test_NewtonRaphson_autodiff():
+    """Automatic differentiation works through branches and NumPy calls"""
+    def f(x):
+        if x > 0:
+            return np.exp(x) - 2
+        return x * x - 2
+
+    result = root_NewtonRaphson(f, 3, 'autodiff', 1E-12, 100, full_output=True)
+    assert result.converged
+    assert abs(result.root - np.log(2)) < 1E-12
+    assert result.function_calls == result.iterations + 1
+
+
+def test_Newton_system():
+    """Intersection of a circle and a line, with explicit and automatic Jacobian"""
+    def F(u):
+        return [u[0] ** 2 + u[1] ** 2 - 4, u[0] - u[1]]
+
+    def J(u):
+        return [[2 * u[0], 2 * u[1]], [1, -1]]
+
+    for jacobian in J, 'autodiff':
+        x, no_iterations = root_Newton_system(F, [1, 0.5], jacobian, 1E-12)
+        assert no_iterations > 0
+        assert np.allclose(x, [np.sqrt(2), np.sqrt(2)], atol=1E-12)
+    with pytest.raises(DerivativeZeroError):
+        root_Newton_system(F, [0, 0], J, 1E-12)
+
+
+def test_rate_trace_and_batch():
+    """Newton converges quadratically; rate works on traces and on batches of iterates"""
+    from nampyPrj.root.root import rate
+    from nampyPrj.utils.trace import IterationTrace
+    trace = IterationTrace()
+    result = root_NewtonRaphson(lambda x: x ** 2 - 9, 1000, lambda x: 2 * x, 1E-6, 100,
+                                return_x_list=True, full_output=True, trace=trace)
+    assert np.array_equal(trace.x, result.x_list)
+    assert np.allclose(rate(trace, 3), rate(result.x_list, 3))
+    assert abs(rate(trace, 3)[-1] - 2) < 0.1
+    batch = np.column_stack((trace.x, trace.x))
+    assert np.allclose(rate(batch, [3, 3])[:, 1], rate(trace, 3))
@@ -0,0 +1,256 @@
+import numpy as np
+from nampyPrj.utils.autodiff import derivative, jacobian
+
+
+def test_autodiff_derivative():
+    """Compare with the hand-computed derivative"""
+    def f(x):
+        return x ** 2 * np.sin(x) + 3 / x - 2 ** x + np.sqrt(np.tanh(x))
+
+    def dfdx(x):
+        return (2 * x * np.sin(x) + x ** 2 * np.cos(x) - 3 / x ** 2 - np.log(2) * 2 ** x
+                + 0.5 * (1 - np.tanh(x) ** 2) / np.sqrt(np.tanh(x)))
+
+    x = np.linspace(0.5, 3, 7)
+    value, computed = derivative(f, x)
+    assert np.allclose(value, f(x), rtol=1E-14)
+    assert np.allclose(computed, dfdx(x), rtol=1E-12)
+    value, computed = derivative(f, 1.3)
+    assert abs(computed - dfdx(1.3)) < 1E-12
+
+
+def test_autodiff_jacobian():
+    def F(u):
+        S, I, R = u
+        return [-S * I, S * I - 2 * I, 2 * I + 1]
+
+    value, J = jacobian(F, [1, 2, 3])
+    assert np.allclose(value, [-2, -2, 5])
+    assert np.allclose(J, [[-2, -1, 0], [2, -1, 0], [0, 2, 0]])
+
+
+def test_autodiff_float_conversion():
+    import pytest
+    from math import exp
+    with pytest.raises(TypeError):
+        derivative(lambda x: exp(x), 1.0)
+
+
+def test_trace_growth():
+    from nampyPrj.utils.trace import IterationTrace
+    trace = IterationTrace(capacity=2)
+    for i in range(5):
+        trace.record(i, i ** 2, 1)
+    assert len(trace) == 5 and trace.capacity >= 5
+    assert np.array_equal(trace.x, [0, 1, 2, 3, 4])
+    assert np.array_equal(trace.fx, [0, 1, 4, 9, 16])
+
+
+def test_trace_ring_buffer():
+    from nampyPrj.utils.trace import IterationTrace
+    trace = IterationTrace(keep_last=3)
+    for i in range(7):
+        trace.record([i, -i], step=0.5)
+    assert len(trace) == 3 and trace.count == 7
+    assert np.array_equal(trace.x, [[4, -4], [5, -5], [6, -6]])
+    assert trace.statistics()['max_step'] == 0.5
+
+
+def test_profiler_counts():
+    """The profiler counts the evaluations without changes to the calling code"""
+    from nampyPrj.utils.instrument import Profiler
+    from nampyPrj.integral.integral import trapezoidal, midpoint_double2
+    from nampyPrj.integral.integral_vec import trapezoidal_vec
+    from nampyPrj.root.root import root_NewtonRaphson
+
+    steps = []
+    with Profiler(on_evaluation=lambda stats, args, elapsed: steps.append(args[0])) as profiler:
+        trapezoidal(lambda x: x ** 2, 0, 1, 10)
+        trapezoidal_vec(lambda x: x ** 2, 0, 1, 10)
+        midpoint_double2(lambda x, y: x * y, 0, 1, 0, 1, 3, 4)
+        result = root_NewtonRaphson(lambda x: x ** 2 - 9, 1000, lambda x: 2 * x, 1E-6, 100,
+                                    full_output=True)
+    functions = {(s.routine, s.name): s for s in profiler.functions.values()}
+    assert functions[('trapezoidal', 'f')].calls == 11
+    assert functions[('trapezoidal_vec', 'f')].max_batch == 11
+    assert functions[('midpoint_double2', 'f')].calls == 12
+    assert ('midpoint', 'f') not in functions  # inner calls are not reported
+    assert functions[('root_NewtonRaphson', 'f')].calls == result.function_calls
+    assert functions[('root_NewtonRaphson', 'dfdx')].calls == result.iterations
+    assert profiler.routines['trapezoidal'][0] == 1
+    assert len(steps) == 11 + 1 + 12 + result.function_calls + result.iterations
+    assert 'root_NewtonRaphson' in profiler.summary()
+
+    # Outside the context nothing is recorded
+    trapezoidal(lambda x: x ** 2, 0, 1, 10)
+    assert profiler.routines['trapezoidal'][0] == 1
+
+
+def test_memoized_function_sweep():
+    """A refinement sweep of the trapezoidal rule reuses the values at the coarse nodes"""
+    from nampyPrj.utils.cache import MemoizedFunction
+    from nampyPrj.integral.integral import trapezoidal, midpoint_triple
+    from math import exp
+    g = MemoizedFunction(lambda x: exp(x))
+    for n in 10, 20, 40:
+        assert trapezoidal(g, 0, 1, n) == trapezoidal(exp, 0, 1, n)
+    stats = g.stats()
+    assert stats['misses'] == 41 and stats['hits'] == 11 + 21
+    assert stats['memory'] > 0
+
+    small = MemoizedFunction(lambda x, y, z: x + y + z, maxsize=5)
+    midpoint_triple(small, 0, 1, 0, 1, 0, 1, 2, 2, 2)
+    assert small.stats()['size'] == 5
+
+
+def test_memoized_array_function():
+    from nampyPrj.utils.cache import MemoizedArrayFunction
+    from nampyPrj.utils.instrument import Profiler
+    from nampyPrj.integral.integral_vec import trapezoidal_vec
+    calls = []
+
+    def f(x):
+        calls.append(len(x))
+        return np.sin(x)
+
+    g = MemoizedArrayFunction(f)
+    with Profiler() as profiler:
+        for n in 10, 20:
+            assert abs(trapezoidal_vec(g, 0, 1, n) - trapezoidal_vec(np.sin, 0, 1, n)) < 1E-15
+    # Second sweep: only the 10 new midpoints are evaluated, in a single call
+    assert calls == [11, 10]
+    assert profiler.events['memo_misses'] == 21
+    x = np.array([[0.123, 0.456], [0.123, 0.456]])
+    assert np.allclose(g(x), np.sin(x))
+    assert calls[-1] == 2
+
+
+def test_memoized_state_function():
+    """A system right-hand side is keyed on the whole state"""
+    import pytest
+    from nampyPrj.utils.cache import MemoizedFunction, MemoizedStateFunction
+    from nampyPrj.ode.ode import ode_system_FE
+
+    def f(u, t):
+        return [u[1], -u[0]]
+
+    u_exact = ode_system_FE(f, [1, 0], 0.1, 1)[0]
+    g = MemoizedStateFunction(f)
+    for i in range(2):
+        u, t = ode_system_FE(g, [1, 0], 0.1, 1)
+        assert np.array_equal(u, u_exact)
+    assert np.allclose(u[-1], [0.571, -0.883], atol=1E-3)
+    assert g.stats()['hits'] == g.stats()['misses'] == 10
+    with pytest.raises(TypeError):
+        ode_system_FE(MemoizedFunction(f), [1, 0], 0.1, 1)
+
+
+def test_profiler_async():
+    import asyncio
+    from nampyPrj.utils.instrument import Profiler
+    from nampyPrj.integral.integral_async import trapezoidal_async
+
+    async def f(x):
+        return x
+
+    with Profiler() as profiler:
+        asyncio.run(trapezoidal_async(f, 0, 1, 10))
+    assert profiler.functions[('trapezoidal_async', 'f')].calls == 11
+    assert profiler.routines['trapezoidal_async'][0] == 1
+
+
+def test_solve_tridiagonal():
+    import numpy as np
+    from nampyPrj.utils.linalg import solve_tridiagonal
+    A = np.diag([4.] * 5) + np.diag([1.] * 4, 1) + np.diag([2.] * 4, -1)
+    rhs = np.arange(10.).reshape(5, 2)
+    x = solve_tridiagonal([2.] * 4, [4.] * 5, [1.] * 4, rhs)
+    assert np.allclose(A @ x, rhs)
+
+
+def test_solve_factored_tridiagonal():
+    """One factorization reused for several right-hand sides, solved in place"""
+    import numpy as np
+    from nampyPrj.utils.linalg import factor_tridiagonal, solve_factored_tridiagonal
+    A = np.diag([4.] * 6) + np.diag([1.] * 5, 1) + np.diag([2.] * 5, -1)
+    factors = factor_tridiagonal([2.] * 5, [4.] * 6, [1.] * 5)
+    out = np.empty(6)
+    for rhs in np.eye(6):
+        assert solve_factored_tridiagonal(factors, rhs, out) is out
+        assert np.allclose(A @ out, rhs)
+    rhs = np.arange(18.).reshape(6, 3)
+    x = rhs.copy()
+    solve_factored_tridiagonal(factors, x, out=x)
+    assert np.allclose(A @ x, rhs)
+
+
+def test_solve_cg():
+    import numpy as np
+    from nampyPrj.utils.linalg import solve_cg
+    rng = np.random.default_rng(0)
+    B = rng.random((20, 20))
+    A = B @ B.T + 20 * np.eye(20)
+    b = rng.random(20)
+    x, iterations = solve_cg(lambda p, out: np.dot(A, p, out=out), b)
+    assert 0 < iterations <= 20 and np.allclose(A @ x, b)
+    assert solve_cg(lambda p, out: np.dot(A, p, out=out), b, max_iterations=1)[1] == -1
+
+
+def test_disk_cache(tmp_path):
+    import os
+    import pytest
+    from nampyPrj.utils.cache import DiskCache
+    from nampyPrj.utils.instrument import Profiler
+    from nampyPrj.integral.integral import midpoint_triple
+    from nampyPrj.ode.ode import ode_RK4
+    calls = []
+
+    def g(x, y, z):
+        calls.append(1)
+        return x * y * z
+
+    cache = DiskCache(tmp_path)
+    with Profiler() as profiler:
+        first = cache.call(midpoint_triple, g, 0, 1, 0, 1, 0, 1, 5, 5, 5, fingerprint='xyz')
+        # A new instance on the same directory sees the stored result
+        second = DiskCache(tmp_path).call(midpoint_triple, g, 0, 1, 0, 1, 0, 1, 5, 5, 5,
+                                          fingerprint='xyz')
+    assert first == second and len(calls) == 125
+    assert profiler.events['disk_cache_hits'] == 1 and profiler.events['disk_cache_misses'] == 1
+    # Another fingerprint is another result
+    cache.call(midpoint_triple, g, 0, 1, 0, 1, 0, 1, 5, 5, 5, fingerprint='xyz-v2')
+    assert len(calls) == 250
+    with pytest.raises(ValueError):
+        cache.call(midpoint_triple, g, 0, 1, 0, 1, 0, 1, 5, 5, 5)
+
+    rk4 = cache.wrap(ode_RK4, fingerprint='decay')
+    u, t = rk4(lambda u, t: -u, np.ones(2), 0.1, 1)
+    u_cached, t_cached = rk4(lambda u, t: -u, np.ones(2), 0.1, 1)
+    assert np.array_equal(u, u_cached) and np.array_equal(t, t_cached)
+
+    # Eviction of the least recently used files
+    before = cache.size()
+    small = DiskCache(tmp_path, max_size=before - 1)
+    small.evict()
+    assert 0 < small.size() < before
+    small.clear()
+    assert small.size() == 0
+
+    # Scalars come back as NumPy scalars, failed writes are only reported
+    assert isinstance(cache.call(np.add, 1.5, 2.0), np.float64)
+    assert isinstance(cache.call(np.add, 1.5, 2.0), np.float64)
+    with Profiler() as profiler:
+        assert cache.call(dict, a=1) == {'a': 1}
+    assert profiler.events['disk_cache_errors'] == 1
+
+    # Temporary files of killed writers are counted, then removed once stale
+    stale = tmp_path / 'killed.tmp'
+    stale.write_bytes(b'0' * 100)
+    fresh = tmp_path / 'writing.tmp'
+    fresh.write_bytes(b'0' * 100)
+    os.utime(stale, (0, 0))
+    assert cache.size() >= 200
+    cache.evict()
+    assert not stale.exists() and fresh.exists()
+    cache.clear()
+    assert cache.size() == 0 and not fresh.exists()